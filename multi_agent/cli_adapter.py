@@ -8,7 +8,9 @@ from __future__ import annotations
 import json
 import os
 from pathlib import Path
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Mapping, Tuple
+
+from .process_pool import PoolConfig
 
 
 class CLIProvider:
@@ -28,6 +30,8 @@ class CLIProvider:
         self.supports_json_output = config.get("supports_json_output", False)
         self.json_output_flag = config.get("json_output_flag", "--output-format json")
         self.error_patterns = config.get("error_patterns", {})
+        self.max_concurrent = config.get("max_concurrent")
+        self.pool = PoolConfig.from_dict(config.get("pool"))
 
     def build_command(
         self,
@@ -120,13 +124,23 @@ class CLIAdapter:
     Manages multiple CLI providers and routes commands to the appropriate provider.
     """
 
-    def __init__(self, cli_config_path: Path) -> None:
+    def __init__(self, cli_config_path: Path, config: Mapping[str, Any] | None = None) -> None:
+        """
+        Args:
+            cli_config_path: Path of cli_config.json
+            config: Already parsed contents of that file (skips reading it)
+        """
         self.config_path = cli_config_path
         self.providers: Dict[str, CLIProvider] = {}
         self.default_provider_id = "codex"
         self.timeout_multipliers: Dict[str, float] = {}
+        # Pre-rendered commands per (provider, model, timeout, params, env override)
+        self._commands: Dict[Tuple[Any, ...], Tuple[List[str], str | None, float]] = {}
 
-        self._load_config()
+        if config is None:
+            self._load_config()
+        else:
+            self._apply_config(config)
 
     def _load_config(self) -> None:
         """Load CLI provider configurations from cli_config.json."""
@@ -136,7 +150,9 @@ class CLIAdapter:
 
         with open(self.config_path, "r", encoding="utf-8") as f:
             config = json.load(f)
+        self._apply_config(config)
 
+    def _apply_config(self, config: Mapping[str, Any]) -> None:
         # Load providers
         provider_configs = config.get("cli_providers", {})
         for provider_id, provider_config in provider_configs.items():
@@ -218,8 +234,24 @@ class CLIAdapter:
 
         Returns:
             Tuple of (command_list, stdin_content, timeout_multiplier)
+
+        Without a prompt the command is a template that only depends on the
+        arguments and the provider's env override, so it is rendered once per
+        combination and copied on later calls.
         """
         provider = self.get_provider(provider_id)
+        key: Tuple[Any, ...] | None = None
+        if not prompt:
+            key = (
+                provider.id,
+                model,
+                timeout_sec,
+                json.dumps(custom_params or {}, sort_keys=True, default=str),
+                os.environ.get(provider.env_var),
+            )
+            cached = self._commands.get(key)
+            if cached is not None:
+                return list(cached[0]), cached[1], cached[2]
         cmd, stdin = provider.build_command(
             prompt=prompt,
             custom_params=custom_params,
@@ -227,6 +259,8 @@ class CLIAdapter:
             model=model
         )
         multiplier = self.get_timeout_multiplier(provider.id)
+        if key is not None:
+            self._commands[key] = (list(cmd), stdin, multiplier)
 
         return cmd, stdin, multiplier
 
@@ -246,3 +280,26 @@ class CLIAdapter:
             "supports_json_output": provider.supports_json_output,
             "available_parameters": list(provider.parameters.keys())
         }
+
+
+_ADAPTERS: Dict[str, Tuple[Tuple[int, int], CLIAdapter]] = {}
+
+
+def load_cli_adapter(cli_config_path: Path, config: Mapping[str, Any] | None = None) -> CLIAdapter:
+    """
+    Shared CLIAdapter for ``cli_config_path``.
+
+    The file is parsed again only when its mtime or size changes; ``config``
+    passes contents the caller has already parsed.
+    """
+    if not cli_config_path.exists():
+        return CLIAdapter(cli_config_path)
+    stat = cli_config_path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = str(cli_config_path.resolve())
+    cached = _ADAPTERS.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    adapter = CLIAdapter(cli_config_path, config)
+    _ADAPTERS[key] = (stamp, adapter)
+    return adapter
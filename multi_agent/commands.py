@@ -16,7 +16,7 @@ from .constants import (
     ExitCode,
 )
 from .interactive import interactive_run
-from .run_helpers import run_pipeline
+from .run_helpers import plan_pipeline, run_pipeline
 
 try:
     from creators import multi_family_creator, multi_role_agent_creator
@@ -95,6 +95,10 @@ def parse_args_task(cfg, argv: Optional[List[str]] = None) -> argparse.Namespace
         help=str(args_cfg["max_file_bytes"]["help"]),
     )
     p.add_argument("--validate-config", action="store_true", help=str(args_cfg["validate_config"]["help"]))
+    cache_help = str(args_cfg.get("cache", {}).get("help") or "Agent result cache mode.")
+    p.add_argument("--cache", choices=["off", "read", "readwrite"], default=None, help=cache_help)
+    plan_help = str(args_cfg.get("plan", {}).get("help") or "Print critical path and expected makespan, then exit.")
+    p.add_argument("--plan", action="store_true", help=plan_help)
     return p.parse_args(argv)
 
 
@@ -113,6 +117,8 @@ class TaskCommand(Command):
             return int(ExitCode.CONFIG_ERROR)
 
         args = parse_args_task(cfg, argv)
+        if args.plan:
+            return plan_pipeline(args, cfg)
         if not args.task and not args.resume_run:
             print_error("Fehler: --task ist leer.")
             return int(ExitCode.VALIDATION_ERROR)
@@ -3,9 +3,10 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Dict
 
+from .cli_adapter import load_cli_adapter
 from .common_utils import load_json, deep_merge
 from .coordination import CoordinationConfig
-from .constants import get_static_config_dir
+from .constants import SHARD_DISPATCH_MODES, get_static_config_dir
 from .models import (
     AgentOutputConfig,
     AppConfig,
@@ -20,8 +21,10 @@ from .models import (
     OutputsConfig,
     PathsConfig,
     PromptLimitsConfig,
+    ResultCacheConfig,
     RoleConfig,
     RoleDefaultsConfig,
+    SchedulerConfig,
     SnapshotConfig,
     StreamingConfig,
     TaskLimitsConfig,
@@ -57,6 +60,9 @@ def load_role_config(
     # Sharding configuration with defaults
     shard_mode = role_entry.get("shard_mode", defaults.get("shard_mode", "none"))
     shard_count = role_entry.get("shard_count", defaults.get("shard_count"))
+    shard_dispatch = str(role_entry.get("shard_dispatch", defaults.get("shard_dispatch", "static")) or "static").strip().lower()
+    if shard_dispatch not in SHARD_DISPATCH_MODES:
+        raise ValueError(f"Unbekannter shard_dispatch in {role_path}: {shard_dispatch}")
     overlap_policy = role_entry.get("overlap_policy", defaults.get("overlap_policy", "warn"))
     enforce_allowed_paths = role_entry.get("enforce_allowed_paths", defaults.get("enforce_allowed_paths", False))
     max_files_per_shard = role_entry.get("max_files_per_shard", defaults.get("max_files_per_shard", 10))
@@ -90,6 +96,7 @@ def load_role_config(
         # Sharding fields
         shard_mode=str(shard_mode),
         shard_count=int(shard_count) if shard_count is not None else None,
+        shard_dispatch=shard_dispatch,
         overlap_policy=str(overlap_policy),
         enforce_allowed_paths=bool(enforce_allowed_paths),
         max_files_per_shard=int(max_files_per_shard) if max_files_per_shard is not None else None,
@@ -122,11 +129,13 @@ def load_app_config(config_path: Path) -> AppConfig:
     family_config = load_json(config_path)
     data = deep_merge(defaults, family_config)
 
-    # Load CLI provider config if available
+    # Load CLI provider config if available (parsed once, shared with the pipeline)
     cli_providers = {}
+    cli_adapter = None
     if cli_config_path.exists():
         cli_config = load_json(cli_config_path)
         cli_providers = cli_config.get("cli_providers", {})
+        cli_adapter = load_cli_adapter(cli_config_path, cli_config)
 
     role_defaults_data = data.get("role_defaults") or {}
     role_defaults_cfg = RoleDefaultsConfig(dict(role_defaults_data or {}))
@@ -150,6 +159,8 @@ def load_app_config(config_path: Path) -> AppConfig:
     task_limits_cfg = TaskLimitsConfig(dict(task_limits or {}))
     task_split_cfg = TaskSplitConfig(dict(task_split or {}))
     streaming_cfg = StreamingConfig(dict(streaming or {}))
+    scheduler_cfg = SchedulerConfig(dict(data.get("scheduler") or {}))
+    result_cache_cfg = ResultCacheConfig(dict(data.get("result_cache") or {}))
     diff_safety_cfg = DiffSafetyConfig(dict(data.get("diff_safety") or {}))
     diff_apply_cfg = DiffApplyConfig(dict(data.get("diff_apply") or {}))
     logging_cfg = LoggingConfig(dict(data.get("logging") or {}))
@@ -182,8 +193,11 @@ def load_app_config(config_path: Path) -> AppConfig:
         task_limits=task_limits_cfg,
         task_split=task_split_cfg,
         streaming=streaming_cfg,
+        scheduler=scheduler_cfg,
+        result_cache=result_cache_cfg,
         diff_safety=diff_safety_cfg,
         diff_apply=diff_apply_cfg,
         logging=logging_cfg,
         feedback_loop=feedback_cfg,
+        cli_adapter=cli_adapter,
     )
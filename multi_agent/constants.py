@@ -25,9 +25,14 @@ DEFAULT_MAX_OUTPUT_CHARS = 16_000
 DEFAULT_RETRIES = 1
 DEFAULT_SNAPSHOT_MAX_BYTES = 1_200_000
 DEFAULT_SNAPSHOT_CACHE = ".multi_agent_runs/snapshot_cache.json"
+DEFAULT_READ_WORKERS = 8       # Snapshot: parallele Lese-Threads
+SELECTIVE_INDEX_BYTES = 16_000  # Selective Context: max. gelesene Bytes pro Datei fuer den Term-Index
+MIN_SNAPSHOT_VIEW_CHARS = 2_000  # Snapshot-View: Mindestbudget pro Rollen-Prompt
 
 # Default prompt settings
 DEFAULT_TOKEN_CHARS = 4
+MAX_TOKEN_FIT_PASSES = 4  # Prompt-Kuerzung auf exaktes Token-Budget: max. Durchlaeufe
+SHARD_DISPATCH_MODES = ("static", "queue")  # Shard-Verteilung: fest pro Instanz oder Work-Queue
 
 
 # Path helpers
@@ -0,0 +1,61 @@
+"""Versioned, layered run context shared by all role instances."""
+from __future__ import annotations
+
+from collections import ChainMap
+from collections.abc import Iterator, Mapping
+from types import MappingProxyType
+from typing import Tuple
+
+# Beyond this many layers a write folds them into one, bounding lookup depth.
+MAX_LAYERS = 16
+
+
+class ContextStore(Mapping[str, str]):
+    """
+    Prompt context as a stack of immutable layers.
+
+    Every :meth:`update` pushes a new read-only layer and swaps in a new
+    version; existing versions are never mutated. Readers therefore need no
+    lock and no copy: :meth:`current` returns the live version and
+    :meth:`overlay` stacks a small per-instance dict on top of it. Writers only
+    hold the run's context lock for the pointer swap.
+    """
+
+    def __init__(self, initial: Mapping[str, str] | None = None) -> None:
+        self._layers: Tuple[Mapping[str, str], ...] = (MappingProxyType(dict(initial or {})),)
+        self._current: ChainMap[str, str] = ChainMap(*self._layers)
+        self.version = 0
+
+    def __getitem__(self, key: str) -> str:
+        return self._current[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._current)
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._current
+
+    @property
+    def current(self) -> Mapping[str, str]:
+        """Immutable view of the latest version."""
+        return self._current
+
+    def update(self, values: Mapping[str, str]) -> int:
+        """Publish ``values`` as a new version and return its number."""
+        layers = (MappingProxyType(dict(values)),) + self._layers
+        if len(layers) > MAX_LAYERS:
+            merged: dict[str, str] = {}
+            for layer in reversed(layers):
+                merged.update(layer)
+            layers = (MappingProxyType(merged),)
+        self._layers = layers
+        self._current = ChainMap(*layers)
+        self.version += 1
+        return self.version
+
+    def overlay(self, values: Mapping[str, str] | None = None) -> ChainMap[str, str]:
+        """Writable per-instance context; writes land in the overlay only."""
+        return ChainMap(dict(values or {}), self._current)
@@ -2,13 +2,20 @@ from __future__ import annotations
 
 import asyncio
 import json
+import math
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, Sequence, TextIO, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
 
 
 def _utc_now() -> str:
@@ -24,69 +31,390 @@ class CoordinationConfig:
     lock_timeout_sec: int
 
 
+# CoordinationLog: queued entries before append() waits for the writer.
+DEFAULT_LOG_QUEUE = 4096
+# Entries per write, and the longest an entry waits for its batch to fill.
+DEFAULT_LOG_BATCH = 256
+DEFAULT_LOG_FLUSH_SEC = 0.25
+
+
 class CoordinationLog:
-    def __init__(self, path: Path) -> None:
+    """
+    Append-only JSONL log of coordination events.
+
+    :meth:`append` only serializes the entry and puts it on a bounded queue;
+    a background task writes the queue in batches of up to ``batch_entries``
+    lines, at the latest ``flush_interval_sec`` after the first entry of a
+    batch. When the queue is full, :meth:`append` waits for the writer. The
+    file is fsynced once, on :meth:`close`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_queue: int = DEFAULT_LOG_QUEUE,
+        batch_entries: int = DEFAULT_LOG_BATCH,
+        flush_interval_sec: float = DEFAULT_LOG_FLUSH_SEC,
+    ) -> None:
         self._path = path
+        self._batch_entries = max(1, int(batch_entries))
+        self._flush_interval_sec = max(0.0, float(flush_interval_sec))
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=max(1, int(max_queue)))
+        self._batch_ready = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self._handle: TextIO | None = None
+        self._closed = False
 
-    def append(self, sender: str, kind: str, payload: Dict[str, object]) -> None:
+    async def append(self, sender: str, kind: str, payload: Dict[str, object]) -> None:
+        if self._closed:
+            raise RuntimeError(f"CoordinationLog ist geschlossen: {self._path}")
         entry = {
             "ts": _utc_now(),
             "sender": sender,
             "type": kind,
             "payload": payload,
         }
-        self._path.parent.mkdir(parents=True, exist_ok=True)
         line = json.dumps(entry, ensure_ascii=True)
-        with self._path.open("a", encoding="utf-8") as handle:
-            handle.write(line + "\n")
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._run())
+        elif self._writer.done():
+            # Surface the writer's error instead of waiting on a queue nobody drains.
+            self._writer.result()
+        await self._queue.put(line)
+        if self._queue.qsize() + 1 >= self._batch_entries:
+            self._batch_ready.set()
+
+    async def close(self) -> None:
+        """Write everything still queued, fsync and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is None:
+            return
+        if not self._writer.done():
+            await self._queue.put(None)
+            self._batch_ready.set()
+        await self._writer
+        if self._handle is not None:
+            await asyncio.to_thread(self._sync_and_close)
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if batch[0] is not None and self._queue.qsize() + 1 < self._batch_entries:
+                # Let the batch fill up; append()/close() wake us early.
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+            while batch[-1] is not None and len(batch) < self._batch_entries and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            closing = batch[-1] is None
+            lines = [line for line in batch if line is not None]
+            if lines:
+                await asyncio.to_thread(self._write_lines, lines)
+            if closing:
+                return
+
+    def _write_lines(self, lines: list[str]) -> None:
+        if self._handle is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self._path.open("a", encoding="utf-8")
+        self._handle.write("\n".join(lines) + "\n")
+        self._handle.flush()
+
+    def _sync_and_close(self) -> None:
+        assert self._handle is not None
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        self._handle = None
+
+
+# Journal deltas between two compactions of the task board snapshot.
+DEFAULT_COMPACT_EVERY = 64
+# Claims per task in work-queue mode: the first one plus one steal.
+DEFAULT_MAX_CLAIMS = 2
+# Blocked flock() calls wait here, not in the default executor: a lock holder
+# needs that one for its writes, and waiters filling it would deadlock.
+_LOCK_WAITERS = ThreadPoolExecutor(thread_name_prefix="taskboard-flock")
+
+
+def load_task_board(path: Path) -> Dict[str, object]:
+    """
+    Current board state for readers: the JSON snapshot plus its journal.
+
+    The snapshot alone is a valid (possibly slightly stale) board; journal
+    records newer than its version are replayed on top.
+    """
+    data: Dict[str, object] = {"version": 0, "tasks": []}
+    if path.exists():
+        data = json.loads(path.read_text(encoding="utf-8"))
+    tasks = {str(task.get("id")): task for task in data.get("tasks", [])}
+    version = int(data.get("version", 0))
+    journal = TaskBoard.journal_path(path)
+    if journal.exists():
+        for line in journal.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # torn last line of an interrupted write
+            if int(record["v"]) <= version:
+                continue
+            tasks.setdefault(record["id"], {"id": record["id"]}).update(record["set"])
+            version = int(record["v"])
+    return {"version": version, "tasks": list(tasks.values())}
 
 
 class TaskBoard:
-    def __init__(self, path: Path, lock_mode: str, lock_timeout_sec: int) -> None:
+    """
+    Task board held in memory and indexed by task id.
+
+    Updates are O(1): they change the in-memory entry and append one compact
+    delta record (``{"v", "id", "set"}``) to ``<board>.journal``. Every
+    ``compact_every`` updates, and on :meth:`close`, the board is written as
+    the readable JSON snapshot (atomically, under the board lock) and the
+    journal is truncated. External tools read the state with
+    :func:`load_task_board`. In work-queue mode workers take tasks with
+    :meth:`claim_next`, run them under a lease started (and paused) with
+    :meth:`renew_lease` and finish them with :meth:`complete_claim`.
+
+    Several processes may share one board path. A compaction that finds the
+    snapshot or journal changed by another writer first reloads the disk
+    state and applies this board's own updates since its last compaction on
+    top (per field, the later compaction wins), so no update is lost. Until
+    then each process works on its own in-memory view, and journal records
+    another process appends during a compaction reach the disk again only
+    with that process's next compaction.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lock_mode: str,
+        lock_timeout_sec: int,
+        compact_every: int = DEFAULT_COMPACT_EVERY,
+    ) -> None:
         self._path = path
         self._lock_mode = lock_mode
         self._lock_timeout_sec = lock_timeout_sec
+        self._compact_every = max(1, int(compact_every))
         self._lock = asyncio.Lock()
         self._lock_path = self._path.with_suffix(self._path.suffix + ".lock")
+        self._journal_path = self.journal_path(path)
+        self._journal: TextIO | None = None
+        self._tasks: Dict[str, Dict[str, object]] = {}
+        self._version = 0
+        self._pending = 0
+        # Own updates since the last compaction, merged over foreign writes.
+        self._dirty: Dict[str, Dict[str, object]] = {}
+        self._snapshot_stamp: Tuple[int, int, int] | None = None
+        self._journal_bytes = 0
+
+    @staticmethod
+    def journal_path(path: Path) -> Path:
+        return path.with_suffix(path.suffix + ".journal")
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get_task(self, task_id: str) -> Dict[str, object] | None:
+        task = self._tasks.get(task_id)
+        return dict(task) if task is not None else None
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"version": self._version, "tasks": [dict(task) for task in self._tasks.values()]}
 
     async def initialize(self, tasks: Iterable[Dict[str, object]]) -> None:
-        data = {
-            "version": 1,
-            "tasks": list(tasks),
-        }
-        await self._write(data)
+        async with self._lock:
+            self._tasks = {str(task.get("id")): dict(task) for task in tasks}
+            self._version = 1
+            self._dirty = {}
+            await self._compact(merge=False)
 
     async def update_task(self, task_id: str, updates: Dict[str, object]) -> None:
         async with self._lock:
-            async with self._acquire_lock():
-                data = await self._read()
-                tasks = data.get("tasks", [])
-                updated = False
-                for task in tasks:
-                    if task.get("id") == task_id:
-                        task.update(updates)
-                        updated = True
-                        break
-                if not updated:
-                    tasks.append({"id": task_id, **updates})
-                data["version"] = int(data.get("version", 0)) + 1
-                data["tasks"] = tasks
-                await self._write(data)
-
-    async def _read(self) -> Dict[str, object]:
-        if not self._path.exists():
-            return {"version": 0, "tasks": []}
-        raw = await asyncio.to_thread(self._path.read_text, encoding="utf-8")
-        return json.loads(raw)
+            await self._update(task_id, updates)
+
+    async def claim_next(
+        self,
+        task_ids: Sequence[str],
+        worker: str,
+        lease_sec: float | None,
+        max_claims: int = DEFAULT_MAX_CLAIMS,
+    ) -> Tuple[str, int] | None:
+        """
+        Claim the first open task of ``task_ids`` for ``worker``.
+
+        Without open tasks, a task still in progress whose lease has expired
+        is claimed again (work stealing from a straggler), as long as it has
+        fewer than ``max_claims`` claims and ``worker`` does not hold it.
+        With ``lease_sec=None`` the claim is held without a lease (never
+        stolen) until :meth:`renew_lease` starts one.
+        Returns ``(task_id, claims)`` or ``None``.
+        """
+        async with self._lock:
+            now = time.time()
+            chosen = next((task_id for task_id in task_ids if self._status(task_id) == "open"), None)
+            if chosen is None:
+                chosen = next(
+                    (
+                        task_id
+                        for task_id in task_ids
+                        if self._stealable(task_id, now, max_claims) and self._tasks[task_id].get("claimed_by") != worker
+                    ),
+                    None,
+                )
+            if chosen is None:
+                return None
+            claims = int((self._tasks.get(chosen) or {}).get("claims", 0) or 0) + 1
+            await self._update(
+                chosen,
+                {
+                    "status": "in_progress",
+                    "claimed_by": worker,
+                    "lease_until": None if lease_sec is None else now + lease_sec,
+                    "claims": claims,
+                },
+            )
+            return chosen, claims
+
+    async def renew_lease(self, task_id: str, worker: str, lease_sec: float | None) -> bool:
+        """
+        Restart the lease of ``worker``'s claim on ``task_id`` at now + ``lease_sec``.
+
+        ``None`` holds the claim without a lease, e.g. while the worker waits
+        for a scheduler slot or a retry backoff. ``False`` if ``worker`` no
+        longer holds the task (finished, or stolen by another worker).
+        """
+        async with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task.get("status") != "in_progress" or task.get("claimed_by") != worker:
+                return False
+            lease_until = None if lease_sec is None else time.time() + lease_sec
+            await self._update(task_id, {"lease_until": lease_until})
+            return True
+
+    async def complete_claim(self, task_id: str, worker: str, updates: Dict[str, object]) -> bool:
+        """Mark ``task_id`` done by ``worker``; ``False`` if another claim finished it first."""
+        async with self._lock:
+            if self._status(task_id) == "done":
+                return False
+            await self._update(task_id, {**updates, "status": "done", "claimed_by": worker, "lease_until": None})
+            return True
+
+    def next_lease_expiry(self, task_ids: Sequence[str], max_claims: int = DEFAULT_MAX_CLAIMS) -> float | None:
+        """Earliest lease expiry (``time.time()``) among tasks that may still be stolen."""
+        leases = [
+            float(self._tasks[task_id]["lease_until"])
+            for task_id in task_ids
+            if self._stealable(task_id, math.inf, max_claims)
+        ]
+        return min(leases) if leases else None
+
+    def _status(self, task_id: str) -> str:
+        task = self._tasks.get(task_id)
+        return str(task.get("status") or "open") if task is not None else "open"
+
+    def _stealable(self, task_id: str, now: float, max_claims: int) -> bool:
+        task = self._tasks.get(task_id)
+        if task is None or task.get("status") != "in_progress" or task.get("lease_until") is None:
+            return False
+        return int(task.get("claims", 0) or 0) < max_claims and float(task["lease_until"]) <= now
+
+    async def _update(self, task_id: str, updates: Dict[str, object]) -> None:
+        task = self._tasks.get(task_id)
+        if task is None:
+            self._tasks[task_id] = {"id": task_id, **updates}
+        else:
+            task.update(updates)
+        self._dirty.setdefault(task_id, {}).update(updates)
+        self._version += 1
+        self._append_journal({"v": self._version, "id": task_id, "set": updates})
+        self._pending += 1
+        if self._pending >= self._compact_every:
+            await self._compact()
+
+    async def close(self) -> None:
+        """Write the final snapshot and drop the journal."""
+        async with self._lock:
+            await self._compact()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            try:
+                self._journal_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _append_journal(self, record: Dict[str, object]) -> None:
+        if self._journal is None:
+            self._journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = self._journal_path.open("a", encoding="utf-8")
+            self._journal_bytes = os.fstat(self._journal.fileno()).st_size
+        line = json.dumps(record, ensure_ascii=True, separators=(",", ":")) + "\n"
+        self._journal.write(line)
+        self._journal.flush()
+        self._journal_bytes += len(line)
+
+    async def _compact(self, merge: bool = True) -> None:
+        async with self._acquire_lock():
+            if merge and self._foreign_writes():
+                await asyncio.to_thread(self._merge_disk_state)
+            await self._write(self.snapshot())
+            self._snapshot_stamp = self._stamp(self._path)
+            # Snapshot first: records it already covers are skipped on replay,
+            # so a crash between the two steps loses nothing.
+            if self._journal is not None:
+                self._journal.truncate(0)
+                self._journal.seek(0)
+            elif self._journal_path.exists():
+                self._journal_path.write_text("", encoding="utf-8")
+            self._journal_bytes = 0
+        self._dirty = {}
+        self._pending = 0
+
+    @staticmethod
+    def _stamp(path: Path) -> Tuple[int, int, int] | None:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _foreign_writes(self) -> bool:
+        """Whether another process wrote the snapshot or journal since our last compaction."""
+        if self._stamp(self._path) != self._snapshot_stamp:
+            return True
+        journal = self._stamp(self._journal_path)
+        return (journal[2] if journal is not None else 0) != self._journal_bytes
+
+    def _merge_disk_state(self) -> None:
+        disk = load_task_board(self._path)
+        tasks = {str(task.get("id")): dict(task) for task in disk["tasks"]}
+        for task_id, updates in self._dirty.items():
+            tasks.setdefault(task_id, {"id": task_id}).update(updates)
+        self._tasks = tasks
+        self._version = max(self._version, int(disk["version"]))
 
     async def _write(self, data: Dict[str, object]) -> None:
         self._path.parent.mkdir(parents=True, exist_ok=True)
         payload = json.dumps(data, indent=2, ensure_ascii=True) + "\n"
-        await asyncio.to_thread(self._path.write_text, payload, encoding="utf-8")
+        tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+        await asyncio.to_thread(tmp_path.write_text, payload, encoding="utf-8")
+        await asyncio.to_thread(os.replace, tmp_path, self._path)
 
     @asynccontextmanager
     async def _acquire_lock(self):
-        if self._lock_mode != "file_lock":
+        mode = self._lock_mode
+        if mode == "flock" and fcntl is None:
+            mode = "file_lock"  # no fcntl (Windows): fall back to the lock file
+        if mode == "flock":
+            async with self._flock():
+                yield
+            return
+        if mode != "file_lock":
             yield
             return
         start = time.monotonic()
@@ -108,3 +436,41 @@ class TaskBoard:
                 self._lock_path.unlink()
             except FileNotFoundError:
                 pass
+
+    @asynccontextmanager
+    async def _flock(self):
+        """
+        ``fcntl.flock`` on the lock file: no polling, released by the kernel
+        when the process dies, so a killed run leaves no stale lock behind.
+
+        The file itself is never removed (unlinking a flock file races with
+        waiters); its presence means nothing.
+        """
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self._lock_path), os.O_CREAT | os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                await self._flock_blocking(fd)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    async def _flock_blocking(self, fd: int) -> None:
+        # Own descriptor for the waiting thread: it cannot be interrupted, so on
+        # timeout it is left to finish and releases the lock on its own.
+        waiter_fd = os.dup(fd)
+        waiter = asyncio.get_running_loop().run_in_executor(_LOCK_WAITERS, fcntl.flock, waiter_fd, fcntl.LOCK_EX)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self._lock_timeout_sec)
+        except asyncio.TimeoutError:
+            waiter.add_done_callback(lambda _: os.close(waiter_fd))
+            raise TimeoutError(f"TaskBoard lock timeout: {self._lock_path}") from None
+        except BaseException:
+            waiter.add_done_callback(lambda _: os.close(waiter_fd))
+            raise
+        os.close(waiter_fd)
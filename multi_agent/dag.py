@@ -0,0 +1,193 @@
+"""Dependency-graph helpers for role scheduling."""
+from __future__ import annotations
+
+import json
+import statistics
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+from .models import RoleConfig
+
+
+def build_dependents(deps: Mapping[str, Sequence[str]]) -> Dict[str, List[str]]:
+    """Invert a role -> dependencies mapping into role -> dependents."""
+    dependents: Dict[str, List[str]] = {role_id: [] for role_id in deps}
+    for role_id, role_deps in deps.items():
+        for dep in role_deps:
+            if dep in dependents:
+                dependents[dep].append(role_id)
+    return dependents
+
+
+def critical_path_depths(
+    deps: Mapping[str, Sequence[str]],
+    weights: Mapping[str, float] | None = None,
+) -> Dict[str, float]:
+    """
+    Compute the critical-path depth of every role.
+
+    The depth of a role is its own weight plus the heaviest chain of roles that
+    (transitively) depend on it. Roles on long chains get a larger depth and
+    should be started first. Without weights every role counts as 1.
+    Cycles are cut at the first revisit so the result is always finite.
+    """
+    dependents = build_dependents(deps)
+    depths: Dict[str, float] = {}
+    visiting: set[str] = set()
+
+    def _depth(role_id: str) -> float:
+        if role_id in depths:
+            return depths[role_id]
+        if role_id in visiting:
+            return 0.0
+        visiting.add(role_id)
+        weight = float(weights.get(role_id, 1.0)) if weights is not None else 1.0
+        tail = max((_depth(child) for child in dependents.get(role_id, [])), default=0.0)
+        visiting.discard(role_id)
+        depths[role_id] = weight + tail
+        return depths[role_id]
+
+    for role_id in deps:
+        _depth(role_id)
+    return depths
+
+
+def effective_deps(roles: Sequence[RoleConfig], role_cfg: RoleConfig) -> List[str]:
+    """Explicit ``depends_on`` or, if absent, every role declared before it."""
+    if role_cfg.depends_on:
+        return list(role_cfg.depends_on)
+    deps: List[str] = []
+    for role in roles:
+        if role.id == role_cfg.id:
+            break
+        deps.append(role.id)
+    return deps
+
+
+def role_dependency_map(roles: Sequence[RoleConfig]) -> Dict[str, List[str]]:
+    return {role.id: effective_deps(roles, role) for role in roles}
+
+
+def load_historical_durations(runs_dir: Path, max_runs: int = 20) -> Dict[str, float]:
+    """
+    Median role duration over the most recent ``run.json`` files in ``runs_dir``.
+
+    Skipped roles and runs without a duration are ignored.
+    """
+    if not runs_dir.is_dir():
+        return {}
+    run_files: List[Tuple[float, Path]] = []
+    for meta_path in runs_dir.glob("*/run.json"):
+        try:
+            run_files.append((meta_path.stat().st_mtime, meta_path))
+        except OSError:
+            continue
+    run_files.sort(reverse=True)
+    samples: Dict[str, List[float]] = {}
+    for _, meta_path in run_files[: max(1, max_runs)]:
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        roles = meta.get("roles") if isinstance(meta, dict) else None
+        if not isinstance(roles, dict):
+            continue
+        for role_id, role_meta in roles.items():
+            if not isinstance(role_meta, dict) or role_meta.get("status") == "skipped":
+                continue
+            duration = role_meta.get("duration_sec")
+            if isinstance(duration, (int, float)) and duration > 0:
+                samples.setdefault(str(role_id), []).append(float(duration))
+    return {role_id: statistics.median(values) for role_id, values in samples.items()}
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    order: List[str]
+    durations: Dict[str, float]
+    estimated: Dict[str, bool]
+    start: Dict[str, float]
+    finish: Dict[str, float]
+    critical_path: List[str]
+    makespan: float
+
+
+def build_execution_plan(
+    deps: Mapping[str, Sequence[str]],
+    durations: Mapping[str, float],
+    default_duration: float | None = None,
+) -> ExecutionPlan:
+    """
+    Earliest-start schedule of the role graph with unlimited parallelism.
+
+    Roles without a historical duration use ``default_duration`` (median of the
+    known durations, or 1.0 when there is no history at all).
+    """
+    if default_duration is None:
+        known = [value for value in durations.values() if value > 0]
+        default_duration = statistics.median(known) if known else 1.0
+    role_durations: Dict[str, float] = {}
+    estimated: Dict[str, bool] = {}
+    for role_id in deps:
+        if role_id in durations:
+            role_durations[role_id] = float(durations[role_id])
+            estimated[role_id] = False
+        else:
+            role_durations[role_id] = float(default_duration)
+            estimated[role_id] = True
+
+    start: Dict[str, float] = {}
+    finish: Dict[str, float] = {}
+    order: List[str] = []
+    pending = [role_id for role_id in deps]
+    while pending:
+        progressed = False
+        for role_id in list(pending):
+            role_deps = [dep for dep in deps[role_id] if dep in deps]
+            if any(dep not in finish for dep in role_deps):
+                continue
+            start[role_id] = max((finish[dep] for dep in role_deps), default=0.0)
+            finish[role_id] = start[role_id] + role_durations[role_id]
+            order.append(role_id)
+            pending.remove(role_id)
+            progressed = True
+        if not progressed:
+            raise ValueError(f"Zyklus in Rollen-Abhaengigkeiten: {', '.join(pending)}")
+
+    critical_path: List[str] = []
+    if finish:
+        current: str | None = max(order, key=lambda role_id: finish[role_id])
+        while current is not None:
+            critical_path.append(current)
+            role_deps = [dep for dep in deps[current] if dep in finish]
+            current = max(role_deps, key=lambda dep: finish[dep]) if role_deps else None
+        critical_path.reverse()
+    makespan = max(finish.values(), default=0.0)
+    return ExecutionPlan(
+        order=order,
+        durations=role_durations,
+        estimated=estimated,
+        start=start,
+        finish=finish,
+        critical_path=critical_path,
+        makespan=makespan,
+    )
+
+
+def format_execution_plan(plan: ExecutionPlan, has_history: bool) -> str:
+    lines: List[str] = ["Ausfuehrungsplan (Dry-Run):", ""]
+    lines.append(f"  {'Rolle':<24} {'Start':>9} {'Ende':>9} {'Dauer':>9}")
+    for role_id in sorted(plan.order, key=lambda item: (plan.start[item], plan.order.index(item))):
+        marker = "*" if role_id in plan.critical_path else " "
+        note = " (geschaetzt)" if plan.estimated[role_id] else ""
+        lines.append(
+            f"{marker} {role_id:<24} {plan.start[role_id]:>8.1f}s {plan.finish[role_id]:>8.1f}s "
+            f"{plan.durations[role_id]:>8.1f}s{note}"
+        )
+    lines.append("")
+    lines.append("Kritischer Pfad: " + " -> ".join(plan.critical_path))
+    lines.append(f"Erwartete Gesamtdauer: {plan.makespan:.1f}s")
+    if not has_history:
+        lines.append("Hinweis: keine historischen run.json gefunden, Dauern sind relative Einheiten.")
+    return "\n".join(lines)
@@ -6,14 +6,25 @@ Generic subprocess execution for any CLI provider (Codex, Claude, Gemini, etc.)
 from __future__ import annotations
 
 import asyncio
+import codecs
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Dict, List, Protocol, Tuple
+from typing import Awaitable, Callable, Dict, List, Protocol, Tuple
 
 from .models import AgentResult, AgentSpec
-from .streaming import StreamCancelled, StreamTimeout, StreamingClient
-from .utils import get_status_text, write_text
+from .output_spool import OutputSpool
+from .process_pool import JsonRpcPool, PoolConfig, PoolWorkerError, PrespawnPool, ProcessPoolRegistry
+from .result_cache import ResultCache
+from .scheduler import AgentScheduler
+from .streaming import (
+    DEFAULT_REFRESH_RATE_HZ,
+    READ_CHUNK_BYTES,
+    StreamCancelled,
+    StreamTimeout,
+    StreamingClient,
+)
+from .utils import get_status_text
 
 
 class ProgressDisplay(Protocol):
@@ -36,7 +47,14 @@ class CLIClient:
     This class handles command execution with stdin support for any CLI provider.
     """
 
-    def __init__(self, cli_cmd: List[str], timeout_sec: int, stdin_mode: bool = True) -> None:
+    def __init__(
+        self,
+        cli_cmd: List[str],
+        timeout_sec: int,
+        stdin_mode: bool = True,
+        pool: PoolConfig | None = None,
+        pools: ProcessPoolRegistry | None = None,
+    ) -> None:
         """
         Initialize CLI client.
 
@@ -44,55 +62,121 @@ class CLIClient:
             cli_cmd: Full command to execute (e.g., ["codex", "exec", "-"] or ["claude", "-p"])
             timeout_sec: Timeout in seconds
             stdin_mode: If True, send prompt via stdin; if False, prompt is in cli_cmd
+            pool: Warm process pool settings of the provider (stdin mode only)
+            pools: Registry owning the pools of the current run
         """
         self._cli_cmd = cli_cmd
         self._timeout_sec = timeout_sec
         self._stdin_mode = stdin_mode
+        self._pool = pool if stdin_mode and pools is not None else None
+        self._pools = pools
+
+    @property
+    def timeout_sec(self) -> int:
+        return self._timeout_sec
+
+    @property
+    def command(self) -> List[str]:
+        """Resolved command line (env override such as ``CODEX_CMD`` applied)."""
+        return list(self._cli_cmd)
+
+    def _pooled(self, workdir: Path) -> PrespawnPool | JsonRpcPool | None:
+        if self._pool is None or self._pools is None:
+            return None
+        return self._pools.get(self._pool, self._cli_cmd, workdir)
+
+    async def _spawn(self, workdir: Path) -> asyncio.subprocess.Process:
+        pool = self._pooled(workdir)
+        if isinstance(pool, PrespawnPool):
+            return await pool.acquire()
+        return await asyncio.create_subprocess_exec(
+            *self._cli_cmd,
+            stdin=asyncio.subprocess.PIPE if self._stdin_mode else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=str(workdir),
+        )
 
-    async def run(self, prompt: str | None, workdir: Path) -> Tuple[int, str, str]:
+    async def run(self, prompt: str | None, workdir: Path, spool: OutputSpool | None = None) -> Tuple[int, str, str]:
         """
         Execute the CLI command with optional stdin prompt.
 
         Args:
             prompt: Prompt to send (via stdin or None if already in command)
             workdir: Working directory for execution
+            spool: If given, stdout/stderr are written to it as they arrive
+                and the returned strings are empty
 
         Returns:
             Tuple of (returncode, stdout, stderr)
         """
-        proc = await asyncio.create_subprocess_exec(
-            *self._cli_cmd,
-            stdin=asyncio.subprocess.PIPE if self._stdin_mode else None,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=str(workdir),
-        )
-        try:
-            if self._stdin_mode and prompt:
-                stdin_data = prompt.encode("utf-8")
-            else:
-                stdin_data = None
+        sink = _TextSink(spool)
+        pool = self._pooled(workdir)
+        if isinstance(pool, JsonRpcPool):
+            try:
+                rc, stdout, stderr = await pool.request(prompt or "", workdir, self._timeout_sec)
+            except asyncio.TimeoutError:
+                sink.write("stderr", "\nTIMEOUT")
+                return 124, sink.text("stdout"), sink.text("stderr")
+            except (PoolWorkerError, ValueError) as exc:
+                sink.write("stderr", str(exc))
+                return 1, sink.text("stdout"), sink.text("stderr")
+            sink.write("stdout", stdout)
+            sink.write("stderr", stderr)
+            return rc, sink.text("stdout"), sink.text("stderr")
 
-            stdout_b, stderr_b = await asyncio.wait_for(
-                proc.communicate(stdin_data),
-                timeout=self._timeout_sec,
-            )
+        proc = await self._spawn(workdir)
+        if self._stdin_mode and prompt:
+            stdin_data = prompt.encode("utf-8")
+        else:
+            stdin_data = None
+        try:
+            await asyncio.wait_for(self._communicate(proc, stdin_data, sink), timeout=self._timeout_sec)
             rc = proc.returncode or 0
-            return rc, stdout_b.decode("utf-8", "replace"), stderr_b.decode("utf-8", "replace")
+            return rc, sink.text("stdout"), sink.text("stderr")
         except asyncio.CancelledError:
             try:
                 proc.kill()
             except ProcessLookupError:
                 pass
-            stdout_b, stderr_b = await proc.communicate()
+            await proc.wait()
             raise
         except asyncio.TimeoutError:
             try:
                 proc.kill()
             except ProcessLookupError:
                 pass
-            stdout_b, stderr_b = await proc.communicate()
-            return 124, stdout_b.decode("utf-8", "replace"), (stderr_b.decode("utf-8", "replace") + "\nTIMEOUT")
+            await proc.wait()
+            sink.write("stderr", "\nTIMEOUT")
+            return 124, sink.text("stdout"), sink.text("stderr")
+
+    @staticmethod
+    async def _communicate(proc: asyncio.subprocess.Process, stdin_data: bytes | None, sink: "_TextSink") -> None:
+        async def _drain(stream: asyncio.StreamReader | None, source: str) -> None:
+            if stream is None:
+                return
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                data = await stream.read(READ_CHUNK_BYTES)
+                if not data:
+                    break
+                sink.write(source, decoder.decode(data))
+            sink.write(source, decoder.decode(b"", final=True))
+
+        async def _feed() -> None:
+            if proc.stdin is None:
+                return
+            try:
+                if stdin_data:
+                    proc.stdin.write(stdin_data)
+                    await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                proc.stdin.close()
+
+        await asyncio.gather(_feed(), _drain(proc.stdout, "stdout"), _drain(proc.stderr, "stderr"))
+        await proc.wait()
 
     async def run_streaming(
         self,
@@ -101,13 +185,20 @@ class CLIClient:
         progress_display: ProgressDisplay | None = None,
         cancel_event: asyncio.Event | None = None,
         token_counter: Callable[[str], int] | None = None,
+        spool: OutputSpool | None = None,
     ) -> Tuple[int, str, str]:
         """
         Execute the CLI command with streaming output.
 
+        With ``spool`` the chunks are written to it as they arrive and the
+        returned strings are empty. JSON-RPC pools answer in one piece, so
+        they run without live output.
+
         Returns:
             Tuple of (returncode, stdout, stderr)
         """
+        if isinstance(self._pooled(workdir), JsonRpcPool):
+            return await self.run(prompt, workdir, spool)
         stdin_content = prompt if self._stdin_mode and prompt else None
         progress_callback = None
         if progress_display is not None:
@@ -118,30 +209,45 @@ class CLIClient:
             progress_callback=progress_callback,
             token_counter=token_counter,
             cancel_event=cancel_event,
+            refresh_rate_hz=getattr(progress_display, "refresh_rate_hz", DEFAULT_REFRESH_RATE_HZ),
         )
 
-        stdout_chunks: List[str] = []
-        stderr_chunks: List[str] = []
+        sink = _TextSink(spool)
         try:
             async for chunk in streaming_client.stream_exec(
                 self._cli_cmd,
                 stdin_content,
                 timeout=self._timeout_sec,
                 workdir=workdir,
+                spawn=(lambda: self._spawn(workdir)) if self._pool is not None else None,
             ):
-                if chunk.source == "stdout":
-                    stdout_chunks.append(chunk.text)
-                else:
-                    stderr_chunks.append(chunk.text)
+                sink.write(chunk.source, chunk.text)
         except StreamTimeout:
-            stderr_chunks.append("\nTIMEOUT")
-            return 124, "".join(stdout_chunks), "".join(stderr_chunks)
+            sink.write("stderr", "\nTIMEOUT")
+            return 124, sink.text("stdout"), sink.text("stderr")
         except StreamCancelled:
-            stderr_chunks.append("\nCANCELLED")
-            return 130, "".join(stdout_chunks), "".join(stderr_chunks)
+            sink.write("stderr", "\nCANCELLED")
+            return 130, sink.text("stdout"), sink.text("stderr")
 
         rc = streaming_client.returncode or 0
-        return rc, "".join(stdout_chunks), "".join(stderr_chunks)
+        return rc, sink.text("stdout"), sink.text("stderr")
+
+
+class _TextSink:
+    """Routes output chunks to a spool, or collects them when there is none."""
+
+    def __init__(self, spool: OutputSpool | None) -> None:
+        self._spool = spool
+        self._chunks: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+
+    def write(self, source: str, text: str) -> None:
+        if self._spool is not None:
+            self._spool.write(source, text)
+        elif text:
+            self._chunks[source].append(text)
+
+    def text(self, source: str) -> str:
+        return "".join(self._chunks[source])
 
 
 class AgentExecutor:
@@ -150,10 +256,27 @@ class AgentExecutor:
         client: CLIClient,
         agent_output_cfg: Dict[str, str],
         messages: Dict[str, str],
+        scheduler: AgentScheduler | None = None,
+        provider_id: str = "",
+        priority: float = 0,
+        result_cache: ResultCache | None = None,
+        model: str | None = None,
+        cli_parameters: Dict[str, object] | None = None,
     ) -> None:
         self._client = client
         self._agent_output_cfg = agent_output_cfg
         self._messages = messages
+        self._scheduler = scheduler
+        self._provider_id = provider_id
+        self._priority = priority
+        self._result_cache = result_cache
+        self._model = model
+        self._cli_parameters = dict(cli_parameters or {})
+
+    @property
+    def timeout_sec(self) -> int:
+        """Timeout of one agent attempt (provider multiplier included)."""
+        return self._client.timeout_sec
 
     async def run_agent(
         self,
@@ -162,34 +285,101 @@ class AgentExecutor:
         workdir: Path,
         out_file: Path,
         streaming: StreamingContext | None = None,
+        on_start: Callable[[], Awaitable[None]] | None = None,
     ) -> AgentResult:
-        use_rich = bool(streaming and streaming.enabled and getattr(streaming.progress_display, "use_rich", False))
-        if not use_rich:
-            print(f"[Agent-Start] {agent.name} ({agent.role})")
-        if streaming and streaming.enabled:
-            rc, out, err = await self._client.run_streaming(
-                prompt,
-                workdir=workdir,
-                progress_display=streaming.progress_display,
-                cancel_event=streaming.cancel_event,
-                token_counter=streaming.token_counter,
+        """
+        Run ``agent`` (or serve it from the result cache).
+
+        ``on_start`` is awaited once the scheduler slot is granted, right
+        before the CLI process starts; queue wait is not part of the run.
+        """
+        cache_key = ""
+        if self._result_cache is not None and self._result_cache.mode != "off":
+            cache_key = ResultCache.make_key(
+                self._provider_id, self._model, self._cli_parameters, prompt, self._client.command
             )
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                print(f"[Agent-Cache] {agent.name} ({agent.role})")
+                spool = OutputSpool(out_file)
+                spool.write("stdout", cached.stdout)
+                spool.write("stderr", cached.stderr)
+                result = self._finalize_output(agent, cached.returncode, spool, out_file)
+                result.cache_hit = True
+                return result
+        if self._scheduler is None:
+            if on_start is not None:
+                await on_start()
+            result = await self._run_agent_now(agent, prompt, workdir, out_file, streaming)
         else:
-            rc, out, err = await self._client.run(prompt, workdir=workdir)
+            async with self._scheduler.slot(self._provider_id, self._priority) as wait_sec:
+                if on_start is not None:
+                    await on_start()
+                result = await self._run_agent_now(agent, prompt, workdir, out_file, streaming)
+            result.queue_wait_sec = wait_sec
+        if cache_key and self._result_cache is not None and result.returncode == 0 and result.stdout_text.has_content:
+            await self._result_cache.put(cache_key, result.returncode, result.stdout, result.stderr)
+        return result
+
+    async def _run_agent_now(
+        self,
+        agent: AgentSpec,
+        prompt: str,
+        workdir: Path,
+        out_file: Path,
+        streaming: StreamingContext | None,
+    ) -> AgentResult:
+        use_rich = bool(streaming and streaming.enabled and getattr(streaming.progress_display, "use_rich", False))
+        spool = OutputSpool(out_file)
+        try:
+            if streaming and streaming.cancel_event is not None and streaming.cancel_event.is_set():
+                # Cancelled while queued for a slot: do not spawn the process at all.
+                rc = 130
+                spool.write("stderr", "CANCELLED")
+            else:
+                if not use_rich:
+                    print(f"[Agent-Start] {agent.name} ({agent.role})")
+                if streaming and streaming.enabled:
+                    rc, _, _ = await self._client.run_streaming(
+                        prompt,
+                        workdir=workdir,
+                        progress_display=streaming.progress_display,
+                        cancel_event=streaming.cancel_event,
+                        token_counter=streaming.token_counter,
+                        spool=spool,
+                    )
+                else:
+                    rc, _, _ = await self._client.run(prompt, workdir=workdir, spool=spool)
+        except BaseException:
+            spool.discard()
+            raise
         if rc == 1:
-            error_detail = (err.strip() or out.strip() or "Keine Fehlerausgabe.")
+            error_detail = (
+                spool.tail("stderr").strip() or spool.tail("stdout").strip() or "Keine Fehlerausgabe."
+            )
             print(
                 self._messages["role_rc1_error"].format(agent_name=agent.name, error=error_detail),
                 file=sys.stderr,
             )
-        status_text = get_status_text(rc, out, self._messages)
-        content = (
+        result = self._finalize_output(agent, rc, spool, out_file)
+        if not use_rich:
+            print(f"[Agent-Ende] {agent.name} rc={rc}")
+        return result
+
+    def _finalize_output(self, agent: AgentSpec, rc: int, spool: OutputSpool, out_file: Path) -> AgentResult:
+        # Only emptiness matters for the status, so the tail is a sufficient probe.
+        status_probe = "x" if spool.has_content("stdout") else ""
+        status_text = get_status_text(rc, status_probe, self._messages)
+        header = (
             f"{self._agent_output_cfg['agent_header'].format(name=agent.name, role=agent.role)}\n\n"
             f"{self._agent_output_cfg['returncode_header']}\n{rc} ({status_text})\n\n"
-            f"{self._agent_output_cfg['stdout_header']}\n{out}\n\n"
-            f"{self._agent_output_cfg['stderr_header']}\n{err}\n"
+            f"{self._agent_output_cfg['stdout_header']}\n"
+        )
+        stdout_text, stderr_text = spool.finalize(header, f"{self._agent_output_cfg['stderr_header']}\n")
+        return AgentResult(
+            agent=agent,
+            returncode=rc,
+            stdout_text=stdout_text,
+            stderr_text=stderr_text,
+            out_file=out_file,
         )
-        write_text(out_file, content)
-        if not use_rich:
-            print(f"[Agent-Ende] {agent.name} rc={rc}")
-        return AgentResult(agent=agent, returncode=rc, stdout=out, stderr=err, out_file=out_file)
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import dataclasses
+import functools
 from collections.abc import Iterator, Mapping
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
 
+from .constants import DEFAULT_READ_WORKERS
 from .coordination import CoordinationConfig
+from .output_spool import SpooledText
+from .prompt_template import PromptTemplate
+
+if TYPE_CHECKING:
+    from .cli_adapter import CLIAdapter
 
 
 @dataclasses.dataclass(frozen=True)
@@ -83,6 +90,10 @@ class SnapshotConfig:
     delta_snapshot: bool
     max_total_bytes: int | None
     selective_context: Dict[str, object]
+    respect_gitignore: bool = True
+    use_git_ls_files: bool = False
+    read_workers: int = DEFAULT_READ_WORKERS
+    max_total_tokens: int | None = None
 
     @classmethod
     def from_dict(cls, data: Dict[str, object]) -> "SnapshotConfig":
@@ -100,6 +111,10 @@ class SnapshotConfig:
             delta_snapshot=bool(data.get("delta_snapshot", False)),
             max_total_bytes=int(data["max_total_bytes"]) if data.get("max_total_bytes") is not None else None,
             selective_context=dict(selective_context) if isinstance(selective_context, dict) else {"enabled": bool(selective_context)},
+            respect_gitignore=bool(data.get("respect_gitignore", True)),
+            use_git_ls_files=bool(data.get("use_git_ls_files", False)),
+            read_workers=max(1, int(data.get("read_workers") or DEFAULT_READ_WORKERS)),
+            max_total_tokens=int(data["max_total_tokens"]) if data.get("max_total_tokens") is not None else None,
         )
 
     def __getitem__(self, key: str) -> object:
@@ -219,6 +234,16 @@ class CliProvidersConfig(MappingConfig):
     pass
 
 
+@dataclasses.dataclass(frozen=True)
+class SchedulerConfig(MappingConfig):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class ResultCacheConfig(MappingConfig):
+    pass
+
+
 @dataclasses.dataclass(frozen=True)
 class RoleConfig:
     id: str
@@ -242,6 +267,7 @@ class RoleConfig:
     # Sharding configuration
     shard_mode: str = "none"
     shard_count: int | None = None
+    shard_dispatch: str = "static"  # "static" (instance N -> shard N) or "queue" (workers claim shards)
     overlap_policy: str = "warn"
     enforce_allowed_paths: bool = False
     max_files_per_shard: int | None = 10
@@ -249,6 +275,11 @@ class RoleConfig:
     reshard_on_timeout_124: bool = True
     max_reshard_depth: int = 2
 
+    @functools.cached_property
+    def compiled_prompt(self) -> PromptTemplate:
+        """``prompt_template`` parsed once per role (cached on the instance)."""
+        return PromptTemplate(self.prompt_template)
+
 
 @dataclasses.dataclass(frozen=True)
 class AppConfig:
@@ -288,6 +319,8 @@ class AppConfig:
     task_limits: TaskLimitsConfig
     task_split: TaskSplitConfig
     streaming: StreamingConfig
+    scheduler: SchedulerConfig
+    result_cache: ResultCacheConfig
 
     # Safety & Logging
     diff_safety: DiffSafetyConfig
@@ -295,6 +328,9 @@ class AppConfig:
     logging: LoggingConfig
     feedback_loop: FeedbackLoopConfig
 
+    # Parsed cli_config.json, shared by all roles (None: load on demand)
+    cli_adapter: CLIAdapter | None = None
+
 
 @dataclasses.dataclass(frozen=True)
 class AgentSpec:
@@ -304,16 +340,32 @@ class AgentSpec:
 
 @dataclasses.dataclass
 class AgentResult:
+    """
+    Outcome of one agent run.
+
+    ``stdout``/``stderr`` are read lazily from the agent output file; only a
+    bounded tail of each stays in memory.
+    """
     agent: AgentSpec
     returncode: int
-    stdout: str
-    stderr: str
+    stdout_text: SpooledText
+    stderr_text: SpooledText
     out_file: Path
+    queue_wait_sec: float = 0.0
+    cache_hit: bool = False
 
     @property
     def ok(self) -> bool:
         return self.returncode == 0
 
+    @property
+    def stdout(self) -> str:
+        return self.stdout_text.read()
+
+    @property
+    def stderr(self) -> str:
+        return self.stderr_text.read()
+
 
 @dataclasses.dataclass(frozen=True)
 class Shard:
@@ -0,0 +1,183 @@
+"""Incremental spooling of agent stdout/stderr to the agent output file."""
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Deque, Dict, Tuple
+
+DEFAULT_TAIL_CHARS = 16_000
+# Decoded outputs kept in memory: a result's stdout is parsed several times in a row.
+# Bounded by total size; a single span above the per-entry limit is not cached.
+DECODED_CACHE_BYTES = 8_000_000
+DECODED_CACHE_MAX_SPAN = DECODED_CACHE_BYTES // 4
+_SOURCES = ("stdout", "stderr")
+
+
+@dataclass(frozen=True)
+class SpooledText:
+    """
+    Lazy handle on agent output.
+
+    The full text lives in ``path`` at ``[offset, offset + size)`` bytes and is
+    only read on :meth:`read`; ``tail`` keeps the last characters in memory.
+    The most recently read texts up to :data:`DECODED_CACHE_BYTES` are
+    cached, so repeated reads of the same output decode it once. If the
+    output file is gone, :meth:`read` falls back to ``tail``. Handles without
+    a path hold their (small) text inline in ``tail``.
+    """
+
+    path: Path | None
+    offset: int
+    size: int
+    chars: int
+    tail: str
+    has_content: bool
+
+    @classmethod
+    def inline(cls, text: str) -> "SpooledText":
+        return cls(
+            path=None,
+            offset=0,
+            size=len(text.encode("utf-8", errors="replace")),
+            chars=len(text),
+            tail=text,
+            has_content=bool(text.strip()),
+        )
+
+    def read(self) -> str:
+        if self.path is None:
+            return self.tail
+        try:
+            return _read_span(self.path, self.offset, self.size)
+        except FileNotFoundError:
+            # Output file removed (e.g. run directory cleaned up): best effort.
+            return self.tail
+
+
+_decoded: "OrderedDict[Tuple[Path, int, int, int, int], str]" = OrderedDict()
+_decoded_bytes = 0
+_decoded_lock = threading.Lock()
+
+
+def _read_span(path: Path, offset: int, size: int) -> str:
+    global _decoded_bytes
+    stat = os.stat(path)
+    # Inode and mtime in the key: a retry may rewrite the same output file.
+    key = (path, offset, size, stat.st_ino, stat.st_mtime_ns)
+    with _decoded_lock:
+        text = _decoded.get(key)
+        if text is not None:
+            _decoded.move_to_end(key)
+            return text
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        text = handle.read(size).decode("utf-8", errors="replace")
+    if size > DECODED_CACHE_MAX_SPAN:
+        return text
+    with _decoded_lock:
+        if key not in _decoded:
+            _decoded[key] = text
+            _decoded_bytes += size
+        while _decoded_bytes > DECODED_CACHE_BYTES:
+            (_, _, evicted, _, _), _ = _decoded.popitem(last=False)
+            _decoded_bytes -= evicted
+    return text
+
+
+class OutputSpool:
+    """
+    Streams stdout/stderr chunks into ``.part`` files next to ``out_file``.
+
+    :meth:`finalize` assembles the agent output file (header, stdout, stderr)
+    by copying the parts on disk and returns :class:`SpooledText` handles
+    pointing into it, so the full output is never held in memory.
+    """
+
+    def __init__(self, out_file: Path, tail_chars: int = DEFAULT_TAIL_CHARS) -> None:
+        self.out_file = out_file
+        self._tail_chars = max(0, int(tail_chars))
+        self._parts: Dict[str, Path] = {
+            source: out_file.with_name(f"{out_file.name}.{source}.part") for source in _SOURCES
+        }
+        self._handles: Dict[str, BinaryIO] = {}
+        self._tails: Dict[str, Deque[str]] = {source: deque() for source in _SOURCES}
+        self._tail_len: Dict[str, int] = {source: 0 for source in _SOURCES}
+        self._chars: Dict[str, int] = {source: 0 for source in _SOURCES}
+        self._has_content: Dict[str, bool] = {source: False for source in _SOURCES}
+
+    def write(self, source: str, text: str) -> None:
+        if not text:
+            return
+        handle = self._handles.get(source)
+        if handle is None:
+            self.out_file.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(self._parts[source], "wb")
+            self._handles[source] = handle
+        handle.write(text.encode("utf-8", errors="replace"))
+        self._chars[source] += len(text)
+        if not self._has_content[source] and text.strip():
+            self._has_content[source] = True
+        tail = self._tails[source]
+        tail.append(text)
+        self._tail_len[source] += len(text)
+        while tail and self._tail_len[source] - len(tail[0]) >= self._tail_chars:
+            self._tail_len[source] -= len(tail.popleft())
+
+    def tail(self, source: str) -> str:
+        text = "".join(self._tails[source])
+        return text[-self._tail_chars :] if self._tail_chars else ""
+
+    def has_content(self, source: str) -> bool:
+        return self._has_content[source]
+
+    def finalize(self, header: str, stderr_header: str) -> Tuple[SpooledText, SpooledText]:
+        """
+        Write ``header + stdout + "\\n\\n" + stderr_header + stderr + "\\n"``.
+
+        ``header`` must end right where stdout starts and ``stderr_header``
+        right where stderr starts.
+        """
+        self._close_parts()
+        self.out_file.parent.mkdir(parents=True, exist_ok=True)
+        handles: Dict[str, SpooledText] = {}
+        with open(self.out_file, "wb") as out:
+            out.write(header.encode("utf-8"))
+            handles["stdout"] = self._copy_part("stdout", out)
+            out.write(("\n\n" + stderr_header).encode("utf-8"))
+            handles["stderr"] = self._copy_part("stderr", out)
+            out.write(b"\n")
+        self.discard()
+        return handles["stdout"], handles["stderr"]
+
+    def discard(self) -> None:
+        """Close and delete the part files (also used when the run is aborted)."""
+        self._close_parts()
+        for path in self._parts.values():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _copy_part(self, source: str, out: BinaryIO) -> SpooledText:
+        offset = out.tell()
+        part = self._parts[source]
+        if part.exists():
+            with open(part, "rb") as handle:
+                shutil.copyfileobj(handle, out)
+        return SpooledText(
+            path=self.out_file,
+            offset=offset,
+            size=out.tell() - offset,
+            chars=self._chars[source],
+            tail=self.tail(source),
+            has_content=self._has_content[source],
+        )
+
+    def _close_parts(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
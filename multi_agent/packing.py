@@ -0,0 +1,79 @@
+"""Budget-aware allocation of snapshot bytes across files."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+MIN_CHUNK_BYTES = 256
+
+
+@dataclass(frozen=True)
+class PackResult:
+    """Per-file byte allocation; ``dropped`` holds the bytes that did not fit."""
+
+    allocations: Dict[str, int] = field(default_factory=dict)
+    dropped: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def packed_bytes(self) -> int:
+        return sum(self.allocations.values())
+
+    @property
+    def dropped_bytes(self) -> int:
+        return sum(self.dropped.values())
+
+
+def pack_budget(
+    items: Sequence[Tuple[str, int]],
+    budget_bytes: int,
+    scores: Mapping[str, float] | None = None,
+    min_chunk: int = MIN_CHUNK_BYTES,
+) -> PackResult:
+    """
+    Split ``budget_bytes`` across ``(file_id, size)`` items.
+
+    Weighted water-filling: every file gets a share of the remaining budget
+    proportional to its relevance score (all equal without scores). Files
+    that need less than their share are packed whole and the surplus is
+    redistributed; the rest are truncated to their share. When shares would
+    fall below ``min_chunk`` the least relevant files are dropped entirely.
+    """
+    scores = scores or {}
+    budget = max(0, int(budget_bytes))
+    order = {file_id: pos for pos, (file_id, _) in enumerate(items)}
+    sizes = {file_id: max(0, int(size)) for file_id, size in items}
+    weights = {file_id: 1.0 + max(0.0, float(scores.get(file_id, 0.0))) for file_id in sizes}
+    # Most relevant first; they are the last to be dropped.
+    pending: List[str] = sorted(
+        (file_id for file_id, size in sizes.items() if size > 0),
+        key=lambda file_id: (-weights[file_id], order[file_id]),
+    )
+    allocations: Dict[str, int] = {file_id: 0 for file_id, size in sizes.items() if size == 0}
+    remaining = budget
+
+    while pending:
+        total_weight = sum(weights[file_id] for file_id in pending)
+        shares = {file_id: remaining * weights[file_id] / total_weight for file_id in pending}
+        fitting = [file_id for file_id in pending if sizes[file_id] <= shares[file_id]]
+        if fitting:
+            for file_id in fitting:
+                allocations[file_id] = sizes[file_id]
+                remaining -= sizes[file_id]
+            pending = [file_id for file_id in pending if file_id not in set(fitting)]
+            continue
+        weakest = pending[-1]
+        if shares[weakest] < min(min_chunk, sizes[weakest]):
+            pending.pop()
+            allocations[weakest] = 0
+            continue
+        for file_id in pending:
+            allocations[file_id] = int(shares[file_id])
+        break
+
+    ordered = {file_id: allocations.get(file_id, 0) for file_id, _ in items}
+    dropped = {
+        file_id: sizes[file_id] - allocated
+        for file_id, allocated in ordered.items()
+        if sizes[file_id] > allocated
+    }
+    return PackResult(allocations=ordered, dropped=dropped)
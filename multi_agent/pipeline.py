@@ -5,27 +5,39 @@ import asyncio
 import json
 import sys
 import time
+from collections import ChainMap
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List, Mapping
 
-from .cli_adapter import CLIAdapter
-from .constants import get_static_config_dir, DEFAULT_TOKEN_CHARS
+from .cli_adapter import load_cli_adapter
+from .constants import get_static_config_dir, DEFAULT_TOKEN_CHARS, MAX_TOKEN_FIT_PASSES, MIN_SNAPSHOT_VIEW_CHARS
 from .cancellation import CancellationHandler
 from .executor import AgentExecutor, CLIClient, StreamingContext
+from .context_store import ContextStore
 from .coordination import CoordinationLog, TaskBoard
+from .dag import critical_path_depths, effective_deps, load_historical_durations
 from .diff_applier import BaseDiffApplier, UnifiedDiffApplier
 from .diff_utils import detect_file_overlaps, extract_touched_files_from_unified_diff, validate_touched_files_against_allowed_paths
 from .models import AgentResult, AgentSpec, AppConfig, RoleConfig, ShardPlan
 from .progress import ProgressReporter
+from .process_pool import ProcessPoolRegistry
 from .progress_display import AgentProgressDisplay
-from .run_logger import JsonRunLogger
+from .result_cache import DEFAULT_CACHE_MAX_BYTES, ResultCache
+from .run_logger import DEFAULT_BACKPRESSURE, DEFAULT_QUEUE_SIZE, JsonRunLogger, build_log_sink
+from .scheduler import AgentScheduler
 from .sharding import create_shard_plan, save_shard_plan
-from .snapshot import BaseSnapshotter, WorkspaceSnapshotter
+from .prompt_template import PromptTemplate, render_prompt
+from .snapshot import BaseSnapshotter, SnapshotViews, WorkspaceSnapshotter
+from .token_counting import (
+    FragmentTokenCounter,
+    build_token_counter,
+    get_fragment_counter,
+    get_token_counter,
+    resolve_tokenizer,
+)
 from .utils import (
     extract_error_reason,
-    estimate_tokens,
-    format_prompt,
     get_status_text,
     normalize_output_text,
     now_stamp,
@@ -34,7 +46,6 @@ from .utils import (
     validate_output_sections,
     write_text,
 )
-from .streaming import build_token_counter
 
 
 @dataclass
@@ -55,7 +66,7 @@ class PipelineRunContext:
     meta_lock: asyncio.Lock
     run_meta: Dict[str, object]
     json_logger: JsonRunLogger
-    context: Dict[str, str] = field(default_factory=dict)
+    context: ContextStore = field(default_factory=ContextStore)
     results: Dict[str, List[AgentResult]] = field(default_factory=dict)
     apply_log_lines: List[str] = field(default_factory=list)
     task_board: TaskBoard | None = None
@@ -65,6 +76,11 @@ class PipelineRunContext:
     cancel_event: asyncio.Event | None = None
     completed_roles: set[str] = field(default_factory=set)
     resume_state: Dict[str, object] | None = None
+    scheduler: AgentScheduler | None = None
+    role_priorities: Dict[str, float] = field(default_factory=dict)
+    result_cache: ResultCache | None = None
+    snapshot_views: SnapshotViews | None = None
+    process_pools: ProcessPoolRegistry = field(default_factory=ProcessPoolRegistry)
 
 
 class Pipeline:
@@ -114,6 +130,7 @@ class Pipeline:
 
         try:
             apply_role_ids = self._resolve_apply_role_ids(args, cfg)
+            result_cache = self._build_result_cache(args, cfg, workdir)
         except ValueError as exc:
             print(str(exc), file=sys.stderr)
             return 2
@@ -161,6 +178,8 @@ class Pipeline:
             cancel_event=cancel_event,
             completed_roles=set(resume_state.get("completed_roles", [])) if resume_state else set(),
             resume_state=resume_state,
+            scheduler=AgentScheduler.from_config(cfg.scheduler, cfg.cli_providers),
+            result_cache=result_cache,
         )
 
         status = "ok"
@@ -172,7 +191,36 @@ class Pipeline:
             error_detail = str(exc)
             raise
         finally:
-            self._finalize_run(ctx, status, error_detail)
+            try:
+                await self._close_run_resources(ctx)
+                self._finalize_run(ctx, status, error_detail)
+            finally:
+                # Synchronous on purpose: the writer thread is a daemon, so queued
+                # events (run_end) must be drained even if the awaits above abort.
+                ctx.json_logger.close()
+
+    @staticmethod
+    async def _close_run_resources(ctx: PipelineRunContext) -> None:
+        """
+        Close pools, coordination log and task board.
+
+        Each step is independent: a failure (e.g. a board lock timeout) is
+        reported and logged but neither skips the other steps nor masks the
+        run's own exception.
+        """
+        steps = [("process_pools", ctx.process_pools.close)]
+        if ctx.coordination_log is not None:
+            steps.append(("coordination_log", ctx.coordination_log.close))
+        if ctx.task_board is not None:
+            steps.append(("task_board", ctx.task_board.close))
+        for name, close in steps:
+            try:
+                await close()
+            except Exception as exc:  # noqa: BLE001
+                print(f"Fehler beim Schliessen von {name}: {exc}", file=sys.stderr)
+                ctx.json_logger.log("close_error", {"resource": name, "error": str(exc)})
+                async with ctx.meta_lock:
+                    ctx.run_meta.setdefault("close_errors", {})[name] = str(exc)
 
     def _build_reporter(
         self,
@@ -257,6 +305,7 @@ class Pipeline:
             task=ctx.task_full,
         )
         snapshot_text = snapshot_result.text
+        ctx.snapshot_views = snapshot_result.views
         write_text(ctx.run_dir / str(ctx.cfg.paths.snapshot_filename), snapshot_text)
         ctx.reporter.step("Snapshot", "Snapshot gespeichert", advance=0)
 
@@ -266,7 +315,20 @@ class Pipeline:
             "delta_used": snapshot_result.delta_used,
             "max_bytes_per_file": snapshot_result.max_bytes_per_file,
             "total_bytes": snapshot_result.total_bytes,
+            "files_read": snapshot_result.files_read,
+            "files_reused": snapshot_result.files_reused,
+            "walk_sec": round(snapshot_result.walk_sec, 4),
+            "read_sec": round(snapshot_result.read_sec, 4),
+            "binary_skipped": snapshot_result.binary_skipped,
         }
+        packing = snapshot_result.packing
+        if packing is not None:
+            ctx.run_meta["snapshot"]["packed_bytes"] = packing.packed_bytes
+            ctx.run_meta["snapshot"]["dropped_bytes"] = packing.dropped_bytes
+            ctx.run_meta["snapshot"]["dropped_per_file"] = {
+                rel: {"packed": packing.allocations.get(rel, 0), "dropped": dropped}
+                for rel, dropped in packing.dropped.items()
+            }
         ctx.json_logger.log("snapshot", ctx.run_meta["snapshot"])
         return snapshot_text
 
@@ -287,7 +349,7 @@ class Pipeline:
 
         ctx.task_board = task_board
         ctx.coordination_log = coordination_log
-        ctx.context = {
+        initial_context = {
             "task": ctx.task_display,
             "task_full_path": str(ctx.task_payload.get("file_ref") or ""),
             "snapshot": snapshot_text,
@@ -297,39 +359,64 @@ class Pipeline:
             "repair_note": "",
         }
         for role in ctx.cfg.roles:
-            ctx.context.setdefault(f"{role.id}_summary", "")
-            ctx.context.setdefault(f"{role.id}_output", "")
+            initial_context.setdefault(f"{role.id}_summary", "")
+            initial_context.setdefault(f"{role.id}_output", "")
+        ctx.context = ContextStore(initial_context)
 
         await task_board.initialize(self._build_task_board(ctx.cfg))
-        coordination_log.append("orchestrator", "init", {"run_id": ctx.run_id})
+        await coordination_log.append("orchestrator", "init", {"run_id": ctx.run_id})
 
     async def _run_roles(self, ctx: PipelineRunContext) -> None:
+        """
+        Run the role graph event-driven.
+
+        Each role starts as soon as all of its effective dependencies have
+        completed, instead of waiting for every role of the same wave. Ready
+        roles are launched in critical-path order (historical durations from
+        earlier runs weight the path when available).
+        """
         completed_roles: set[str] = set(ctx.completed_roles)
         pending_roles: Dict[str, RoleConfig] = {
             role.id: role for role in ctx.cfg.roles if role.id not in completed_roles
         }
+        deps_map = {role.id: self._effective_deps(ctx.cfg, role) for role in ctx.cfg.roles}
+        history = load_historical_durations(ctx.workdir / str(ctx.cfg.paths.run_dir))
+        ctx.role_priorities = critical_path_depths(deps_map, weights=history or None)
+        running: Dict[asyncio.Task, str] = {}
 
-        while pending_roles and not ctx.abort_run:
-            ready_roles = [
-                role
-                for role in pending_roles.values()
-                if all(dep in completed_roles for dep in self._effective_deps(ctx.cfg, role))
-            ]
-            if not ready_roles:
-                ctx.reporter.error("Abhaengigkeiten blockieren die Ausfuehrung (Zyklus?)")
-                break
-            allow_rich = len(ready_roles) == 1
-            tasks = [
-                asyncio.create_task(self._run_role(ctx, role, allow_rich))
-                for role in ready_roles
-            ]
-            completed = await asyncio.gather(*tasks)
-            for role_id, completed_ok in completed:
-                if completed_ok:
-                    completed_roles.add(role_id)
-                pending_roles.pop(role_id, None)
-            ctx.completed_roles = set(completed_roles)
-            self._write_resume_state(ctx)
+        try:
+            while pending_roles or running:
+                if not ctx.abort_run:
+                    ready_roles = sorted(
+                        (
+                            role
+                            for role in pending_roles.values()
+                            if all(dep in completed_roles for dep in deps_map[role.id])
+                        ),
+                        key=lambda role: -ctx.role_priorities.get(role.id, 0),
+                    )
+                    allow_rich = len(ready_roles) == 1 and not running
+                    for role in ready_roles:
+                        pending_roles.pop(role.id, None)
+                        task = asyncio.create_task(self._run_role(ctx, role, allow_rich))
+                        running[task] = role.id
+                if not running:
+                    if pending_roles and not ctx.abort_run:
+                        ctx.reporter.error("Abhaengigkeiten blockieren die Ausfuehrung (Zyklus?)")
+                    break
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task, None)
+                    role_id, completed_ok = task.result()
+                    if completed_ok:
+                        completed_roles.add(role_id)
+                ctx.completed_roles = set(completed_roles)
+                self._write_resume_state(ctx)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
 
     async def _setup_shard_plan(
         self, ctx: PipelineRunContext, role_cfg: RoleConfig
@@ -338,8 +425,7 @@ class Pipeline:
         if role_cfg.shard_mode == "none" or role_cfg.instances <= 1:
             return None
 
-        async with ctx.context_lock:
-            current_task = ctx.context.get("task", ctx.task_display)
+        current_task = ctx.context.get("task", ctx.task_display)
 
         shard_plan = create_shard_plan(role_cfg, current_task)
         if shard_plan:
@@ -362,8 +448,7 @@ class Pipeline:
         if not role_cfg.run_if_review_critical:
             return False
 
-        async with ctx.context_lock:
-            reviewer_output = ctx.context.get("reviewer_output", "")
+        reviewer_output = ctx.context.get("reviewer_output", "")
 
         if self._review_has_critical(ctx.cfg.feedback_loop, reviewer_output):
             return False
@@ -378,21 +463,23 @@ class Pipeline:
                 "returncodes": [],
             }
         async with ctx.context_lock:
-            ctx.context[f"{role_cfg.id}_summary"] = ""
-            ctx.context[f"{role_cfg.id}_output"] = ""
+            ctx.context.update({f"{role_cfg.id}_summary": "", f"{role_cfg.id}_output": ""})
         ctx.results[role_cfg.id] = []
         return True
 
     def _validate_role_prompt(self, ctx: PipelineRunContext, role_cfg: RoleConfig) -> bool:
         """Validate that role prompt template can be formatted."""
-        validation_context = dict(ctx.context)
-        validation_context["role_id"] = role_cfg.id
-        validation_context["role_name"] = role_cfg.name
-        validation_context["role_instance_id"] = "1"
-        validation_context["role_instance"] = f"{role_cfg.id}#1"
-        validation_context["repair_note"] = ""
+        validation_context = ctx.context.overlay(
+            {
+                "role_id": role_cfg.id,
+                "role_name": role_cfg.name,
+                "role_instance_id": "1",
+                "role_instance": f"{role_cfg.id}#1",
+                "repair_note": "",
+            }
+        )
         try:
-            _ = format_prompt(role_cfg.prompt_template, validation_context, role_cfg.id, ctx.cfg.messages)
+            _ = render_prompt(role_cfg.compiled_prompt, validation_context, role_cfg.id, ctx.cfg.messages)
             return True
         except ValueError as exc:
             ctx.reporter.error(str(exc))
@@ -462,10 +549,12 @@ class Pipeline:
             )
             snapshot_name = f"snapshot_after_{role_cfg.id}.txt"
             write_text(ctx.run_dir / snapshot_name, snapshot_result.text)
+            updates = {"snapshot": snapshot_result.text}
+            if last_diff:
+                updates["last_applied_diff"] = last_diff
             async with ctx.context_lock:
-                ctx.context["snapshot"] = snapshot_result.text
-                if last_diff:
-                    ctx.context["last_applied_diff"] = last_diff
+                ctx.context.update(updates)
+                ctx.snapshot_views = snapshot_result.views
 
         if ctx.args.fail_fast and had_error:
             ctx.abort_run = True
@@ -476,14 +565,17 @@ class Pipeline:
         role_cfg: RoleConfig,
         instance_id: int,
         shard_plan: ShardPlan | None,
-    ) -> dict:
-        """Setup context for a specific role instance."""
+    ) -> ChainMap[str, str]:
+        """Per-instance overlay on top of the current shared context version."""
         instance_label = f"{role_cfg.id}#{instance_id}"
-        local_context = dict(ctx.context)
-        local_context["role_id"] = role_cfg.id
-        local_context["role_name"] = role_cfg.name
-        local_context["role_instance_id"] = str(instance_id)
-        local_context["role_instance"] = instance_label
+        local_context = ctx.context.overlay(
+            {
+                "role_id": role_cfg.id,
+                "role_name": role_cfg.name,
+                "role_instance_id": str(instance_id),
+                "role_instance": instance_label,
+            }
+        )
 
         # Add shard-specific context if sharding is enabled
         shard_index = instance_id - 1
@@ -494,9 +586,32 @@ class Pipeline:
             local_context["shard_title"] = shard.title
             local_context["shard_goal"] = shard.goal
             local_context["allowed_paths"] = ", ".join(shard.allowed_paths)
+        else:
+            shard = None
+
+        if ctx.snapshot_views is not None and "snapshot" in role_cfg.compiled_prompt.field_names:
+            query = f"{shard.goal}\n{shard.content}" if shard else None
+            allowed_paths = shard.allowed_paths if shard else None
+            budget = self._snapshot_budget_chars(role_cfg, local_context, ctx.cfg)
+            if query or allowed_paths or budget is not None:
+                local_context["snapshot"] = ctx.snapshot_views.view(query, allowed_paths, budget)
 
         return local_context
 
+    def _snapshot_budget_chars(self, role_cfg: RoleConfig, context: Mapping[str, str], cfg: AppConfig) -> int | None:
+        """Chars left for the snapshot once everything else in the role prompt is rendered."""
+        max_prompt_chars, max_prompt_tokens, token_chars = self._resolve_prompt_limits(role_cfg, cfg)
+        limit = self._effective_prompt_chars(max_prompt_chars, max_prompt_tokens, token_chars)
+        if limit <= 0:
+            return None
+        template = role_cfg.compiled_prompt
+        bare_context = ChainMap({"snapshot": "", "repair_note": ""}, context)
+        if template.missing_key(bare_context) is not None:
+            return None
+        budget = limit - len(cfg.system_rules) - 2 - template.length(bare_context)
+        # Too little room: leave it to the summarising fallback in _build_prompt.
+        return budget if budget >= MIN_SNAPSHOT_VIEW_CHARS else None
+
     async def _claim_instance_task(
         self,
         instance_label: str,
@@ -509,7 +624,7 @@ class Pipeline:
             instance_label,
             {"status": "in_progress", "claimed_by": instance_label},
         )
-        coordination_log.append(
+        await coordination_log.append(
             instance_label,
             "claim",
             {"task": instance_label, "out_file": str(out_file)},
@@ -528,7 +643,7 @@ class Pipeline:
             instance_label,
             {"status": "done", "claimed_by": instance_label, "returncode": result.returncode},
         )
-        coordination_log.append(
+        await coordination_log.append(
             instance_label,
             "complete",
             {"task": instance_label, "returncode": result.returncode},
@@ -565,25 +680,41 @@ class Pipeline:
         streaming_enabled, use_rich = self._resolve_streaming(ctx, role_cfg, allow_rich)
 
         # Execute all role instances in parallel
-        role_executor = self._build_executor(ctx.cfg, role_cfg, ctx.args.timeout)
-        tasks = [
-            asyncio.create_task(
-                self._run_role_instance(
-                    ctx,
-                    role_cfg,
-                    idx,
-                    shard_plan,
-                    role_executor,
-                    streaming_enabled,
-                    use_rich,
-                )
+        role_executor = self._build_executor(
+            ctx.cfg,
+            role_cfg,
+            ctx.args.timeout,
+            scheduler=ctx.scheduler,
+            priority=ctx.role_priorities.get(role_cfg.id, 0),
+            result_cache=ctx.result_cache,
+            process_pools=ctx.process_pools,
+        )
+        if shard_plan and role_cfg.shard_dispatch == "queue":
+            role_results = await self._run_shard_queue(
+                ctx, role_cfg, shard_plan, role_executor, streaming_enabled, use_rich
             )
-            for idx in range(1, role_cfg.instances + 1)
-        ]
-        role_results = await asyncio.gather(*tasks)
+        else:
+            tasks = [
+                asyncio.create_task(
+                    self._run_role_instance(
+                        ctx,
+                        role_cfg,
+                        idx,
+                        shard_plan,
+                        role_executor,
+                        streaming_enabled,
+                        use_rich,
+                    )
+                )
+                for idx in range(1, role_cfg.instances + 1)
+            ]
+            role_results = await asyncio.gather(*tasks)
         ctx.results[role_cfg.id] = role_results
 
-        role_cancelled = any(res.returncode == 130 for res in role_results)
+        # A cancelled work queue leaves shards without a result.
+        role_cancelled = any(res.returncode == 130 for res in role_results) or (
+            shard_plan is not None and role_cfg.shard_dispatch == "queue" and len(role_results) < shard_plan.shard_count
+        )
         if role_cancelled:
             role_end = time.monotonic()
             async with ctx.meta_lock:
@@ -611,8 +742,7 @@ class Pipeline:
         )
 
         async with ctx.context_lock:
-            ctx.context[f"{role_cfg.id}_summary"] = summary_text
-            ctx.context[f"{role_cfg.id}_output"] = output_text
+            ctx.context.update({f"{role_cfg.id}_summary": summary_text, f"{role_cfg.id}_output": output_text})
 
         # Apply diffs if configured
         await self._apply_role_diffs_if_needed(ctx, role_cfg, role_results)
@@ -627,6 +757,119 @@ class Pipeline:
         ctx.json_logger.log("role_end", {"role": role_cfg.id, "duration_sec": role_end - role_start})
         return role_cfg.id, True
 
+    async def _run_shard_queue(
+        self,
+        ctx: PipelineRunContext,
+        role_cfg: RoleConfig,
+        shard_plan: ShardPlan,
+        role_executor: AgentExecutor,
+        streaming_enabled: bool,
+        use_rich: bool,
+    ) -> List[AgentResult]:
+        """
+        Work-queue dispatch: ``instances`` workers claim shards from the task board.
+
+        Shard N runs as task ``<role>#N`` (same context and output file as in
+        static mode), so there may be more shards than instances. A claim is
+        held without a lease while its agent waits for a scheduler slot or a
+        retry backoff; each attempt starts a lease of ``claim_timeout_sec``,
+        but never less than one attempt's timeout. Only a shard whose attempt
+        overruns that lease is run again by an idle worker next to the
+        straggler. The first run to finish completes the shard and the other
+        one is cancelled. Results are returned in shard order.
+        """
+        if ctx.task_board is None or ctx.coordination_log is None:
+            raise RuntimeError("Coordination not initialized")
+        task_board = ctx.task_board
+        coordination_log = ctx.coordination_log
+        # Workers are in-process, so an expired lease never means a dead worker,
+        # only a straggler; a healthy attempt must not be stolen.
+        lease_sec = max(float(ctx.cfg.coordination.claim_timeout_sec), float(role_executor.timeout_sec))
+        shard_ids = [f"{role_cfg.id}#{idx}" for idx in range(1, len(shard_plan.shards) + 1)]
+        for task_id, shard in zip(shard_ids, shard_plan.shards):
+            await task_board.update_task(task_id, {"title": shard.title, "status": "open", "claimed_by": ""})
+
+        results: Dict[int, AgentResult] = {}
+        running: Dict[str, set[asyncio.Task]] = {}
+        changed = asyncio.Event()
+
+        async def renew_lease(task_id: str, worker_label: str, active: bool) -> None:
+            if await task_board.renew_lease(task_id, worker_label, lease_sec if active else None) and active:
+                changed.set()
+
+        async def worker(worker_id: int) -> None:
+            worker_label = f"{role_cfg.id}@{worker_id}"
+            while not ctx.cancelled:
+                claim = await task_board.claim_next(shard_ids, worker_label, None)
+                if claim is None:
+                    expiry = task_board.next_lease_expiry(shard_ids)
+                    if expiry is None and all(
+                        (task_board.get_task(task_id) or {}).get("status") == "done" for task_id in shard_ids
+                    ):
+                        return
+                    # Wait for a lease to expire (or to start, or a shard to finish first).
+                    changed.clear()
+                    try:
+                        await asyncio.wait_for(
+                            changed.wait(), None if expiry is None else max(0.0, expiry - time.time())
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task_id, claims = claim
+                shard_no = shard_ids.index(task_id) + 1
+                await coordination_log.append(
+                    worker_label, "claim" if claims == 1 else "steal", {"task": task_id, "claims": claims}
+                )
+                run = asyncio.create_task(
+                    self._run_role_instance(
+                        ctx,
+                        role_cfg,
+                        shard_no,
+                        shard_plan,
+                        role_executor,
+                        streaming_enabled,
+                        use_rich,
+                        worker=worker_label,
+                        claim_no=claims,
+                        renew_lease=lambda active, task_id=task_id: renew_lease(task_id, worker_label, active),
+                    )
+                )
+                running.setdefault(task_id, set()).add(run)
+                try:
+                    await asyncio.wait({run})
+                except asyncio.CancelledError:
+                    run.cancel()
+                    raise
+                finally:
+                    running[task_id].discard(run)
+                if not run.cancelled():
+                    res = run.result()
+                    if await task_board.complete_claim(task_id, worker_label, {"returncode": res.returncode}):
+                        results[shard_no] = res
+                        for other in running[task_id]:
+                            other.cancel()
+                        await coordination_log.append(
+                            worker_label, "complete", {"task": task_id, "returncode": res.returncode}
+                        )
+                        async with ctx.report_lock:
+                            ctx.reporter.step("Agent-Ende", f"Rolle: {task_id}, rc={res.returncode}", advance=0)
+                changed.set()
+
+        await asyncio.gather(*(worker(idx) for idx in range(1, role_cfg.instances + 1)))
+        ctx.json_logger.log(
+            "shard_queue_done",
+            {
+                "role": role_cfg.id,
+                "shard_count": len(shard_ids),
+                "workers": role_cfg.instances,
+                "steals": sum(
+                    int((task_board.get_task(task_id) or {}).get("claims", 1) or 1) - 1 for task_id in shard_ids
+                ),
+            },
+        )
+        return [results[idx] for idx in sorted(results)]
+
     async def _run_role_instance(
         self,
         ctx: PipelineRunContext,
@@ -636,8 +879,18 @@ class Pipeline:
         role_executor: AgentExecutor,
         streaming_enabled: bool,
         use_rich: bool,
+        worker: str | None = None,
+        claim_no: int = 1,
+        renew_lease: Callable[[bool], Awaitable[None]] | None = None,
     ) -> AgentResult:
-        """Execute a single instance of a role with retry logic."""
+        """
+        Execute a single instance of a role with retry logic.
+
+        With ``worker`` the instance runs a shard claimed from the work queue,
+        which owns the task board entry; ``claim_no`` > 1 marks a stolen run.
+        ``renew_lease(True)`` is awaited when an attempt gets its scheduler
+        slot, ``renew_lease(False)`` before a retry backoff.
+        """
         if ctx.task_board is None or ctx.coordination_log is None:
             raise RuntimeError("Coordination not initialized")
         task_board = ctx.task_board
@@ -646,8 +899,7 @@ class Pipeline:
         # Setup instance context
         instance_label = f"{role_cfg.id}#{instance_id}"
         agent = AgentSpec(f"{role_cfg.name}#{instance_id}", role_cfg.role)
-        async with ctx.context_lock:
-            local_context = self._setup_instance_context(ctx, role_cfg, instance_id, shard_plan)
+        local_context = self._setup_instance_context(ctx, role_cfg, instance_id, shard_plan)
 
         # Build initial prompt
         prompt, prompt_chars, truncated, prompt_tokens, max_prompt_tokens = self._build_prompt(
@@ -656,9 +908,15 @@ class Pipeline:
             ctx.cfg,
         )
         out_file = ctx.run_dir / self._build_output_filename(ctx.cfg, role_cfg, instance_id)
+        if claim_no > 1:
+            # The straggler may still be writing the first file.
+            out_file = out_file.with_name(f"{out_file.stem}.claim{claim_no}{out_file.suffix}")
 
         # Claim task in coordination system
-        await self._claim_instance_task(instance_label, task_board, coordination_log, out_file)
+        if worker is None:
+            await self._claim_instance_task(instance_label, task_board, coordination_log, out_file)
+
+        on_start = (lambda: renew_lease(True)) if renew_lease is not None else None
 
         # Execute with retry logic
         retries_left = max(0, role_cfg.retries)
@@ -678,7 +936,7 @@ class Pipeline:
                 refresh_rate = int(streaming_cfg.get("refresh_rate_hz", 4) or 4)
                 output_preview_lines = int(streaming_cfg.get("output_preview_lines", 10) or 10)
                 buffer_max_lines = int(streaming_cfg.get("buffer_max_lines", 1000) or 1000)
-                token_mode = str(streaming_cfg.get("token_counting", "heuristic") or "heuristic")
+                token_mode = str(streaming_cfg.get("token_counting", "auto") or "auto")
                 token_chars = int(ctx.cfg.prompt_limits.get("token_chars", DEFAULT_TOKEN_CHARS) or DEFAULT_TOKEN_CHARS)
                 expected_chars = role_cfg.max_output_chars or int(ctx.cfg.role_defaults.get("max_output_chars", 0) or 0)
                 expected_tokens = int(expected_chars / max(1, token_chars)) if expected_chars else 0
@@ -717,6 +975,7 @@ class Pipeline:
                             ctx.workdir,
                             out_file,
                             streaming=streaming_ctx,
+                            on_start=on_start,
                         )
                 else:
                     res = await role_executor.run_agent(
@@ -725,9 +984,10 @@ class Pipeline:
                         ctx.workdir,
                         out_file,
                         streaming=streaming_ctx,
+                        on_start=on_start,
                     )
             else:
-                res = await role_executor.run_agent(agent, prompt, ctx.workdir, out_file)
+                res = await role_executor.run_agent(agent, prompt, ctx.workdir, out_file, on_start=on_start)
             last_result = res
 
             # Log result
@@ -741,8 +1001,10 @@ class Pipeline:
                     "prompt_tokens": prompt_tokens,
                     "prompt_max_tokens": max_prompt_tokens or 0,
                     "truncated": truncated,
-                    "stdout_chars": len(res.stdout),
-                    "stderr_chars": len(res.stderr),
+                    "stdout_chars": res.stdout_text.chars,
+                    "stderr_chars": res.stderr_text.chars,
+                    "queue_wait_sec": res.queue_wait_sec,
+                    "cache_hit": res.cache_hit,
                 },
             )
 
@@ -754,8 +1016,10 @@ class Pipeline:
                     "prompt_chars": prompt_chars,
                     "prompt_tokens": prompt_tokens,
                     "prompt_max_tokens": max_prompt_tokens or 0,
-                    "stdout_chars": len(res.stdout),
-                    "stderr_chars": len(res.stderr),
+                    "stdout_chars": res.stdout_text.chars,
+                    "stderr_chars": res.stderr_text.chars,
+                    "queue_wait_sec": res.queue_wait_sec,
+                    "cache_hit": res.cache_hit,
                     "attempts": role_cfg.retries + 1 - retries_left,
                 }
 
@@ -772,7 +1036,6 @@ class Pipeline:
             retries_left -= 1
             attempt += 1
             shrink = ctx.cfg.role_defaults.get("retry_prompt_shrink", 0.85)
-            local_context = dict(local_context)
             prompt, prompt_chars, truncated, prompt_tokens, max_prompt_tokens = self._build_prompt(
                 role_cfg,
                 local_context,
@@ -780,13 +1043,17 @@ class Pipeline:
                 shrink_factor=float(shrink),
                 repair_missing=self._repair_note(role_cfg, res.stdout),
             )
+            if renew_lease is not None:
+                # Backoff is not part of an attempt: nobody may steal the shard meanwhile.
+                await renew_lease(False)
             await asyncio.sleep(backoff_sec)
 
         if last_result is None:
             raise RuntimeError("Agent did not run")
 
         # Finalize task
-        await self._finalize_instance_task(ctx, instance_label, task_board, coordination_log, last_result)
+        if worker is None:
+            await self._finalize_instance_task(ctx, instance_label, task_board, coordination_log, last_result)
         return last_result
 
     def _apply_end_diffs(self, ctx: PipelineRunContext) -> None:
@@ -890,6 +1157,11 @@ class Pipeline:
         ctx.run_meta["status"] = status_value
         if error_detail:
             ctx.run_meta["error"] = error_detail
+        if ctx.scheduler is not None:
+            ctx.run_meta["scheduler"] = ctx.scheduler.stats()
+        if ctx.result_cache is not None:
+            ctx.run_meta["result_cache"] = ctx.result_cache.stats()
+        ctx.run_meta["event_log"] = ctx.json_logger.stats()
         ctx.run_meta["end_time"] = time.time()
         ctx.run_meta["duration_sec"] = ctx.run_meta["end_time"] - ctx.run_meta["start_time"]
         write_text(ctx.run_dir / "run.json", json.dumps(ctx.run_meta, indent=2, ensure_ascii=True) + "\n")
@@ -972,8 +1244,7 @@ class Pipeline:
             return
         resume_context = ctx.resume_state.get("context") or {}
         if isinstance(resume_context, dict):
-            for key, value in resume_context.items():
-                ctx.context[str(key)] = str(value)
+            ctx.context.update({str(key): str(value) for key, value in resume_context.items()})
 
     @staticmethod
     def _resolve_coordination_path(
@@ -1086,7 +1357,7 @@ class Pipeline:
     def _output_ok(res: AgentResult, role_cfg: RoleConfig) -> bool:
         if res.returncode != 0:
             return False
-        if not res.stdout.strip():
+        if not res.stdout_text.has_content:
             return False
         if role_cfg.expected_sections:
             ok, _ = validate_output_sections(res.stdout, role_cfg.expected_sections)
@@ -1097,7 +1368,7 @@ class Pipeline:
     def _should_retry(res: AgentResult, role_cfg: RoleConfig) -> bool:
         if res.returncode == 124:
             return True
-        if not res.stdout.strip():
+        if not res.stdout_text.has_content:
             return True
         if role_cfg.expected_sections:
             ok, _ = validate_output_sections(res.stdout, role_cfg.expected_sections)
@@ -1174,11 +1445,113 @@ class Pipeline:
     def _build_prompt(
         self,
         role_cfg: RoleConfig,
-        context: Dict[str, str],
+        context: Mapping[str, str],
         cfg: AppConfig,
         shrink_factor: float = 1.0,
         repair_missing: str = "",
     ) -> tuple[str, int, bool, int, int]:
+        """
+        Render the role prompt within its char/token limits.
+
+        Sizes come from the compiled template, so compression and truncation
+        are planned on placeholder lengths and the prompt is rendered once.
+        """
+        max_prompt_chars, max_prompt_tokens, token_chars = self._resolve_prompt_limits(role_cfg, cfg)
+        template = role_cfg.compiled_prompt
+        # Flattened once: instance contexts are layered ChainMaps, and sizing
+        # looks every placeholder up several times per pass.
+        prompt_context: Dict[str, str] = {**context, "repair_note": repair_missing or ""}
+        missing = template.missing_key(prompt_context)
+        if missing is not None:
+            raise ValueError(cfg.messages["error_prompt_missing_key"].format(role_id=role_cfg.id, key=missing))
+        prefix = cfg.system_rules + "\n\n"
+        token_mode, tokenizer_file = resolve_tokenizer(cfg.prompt_limits or {}, role_cfg.model)
+        counter = get_fragment_counter(token_mode, role_cfg.model, tokenizer_file) if max_prompt_tokens > 0 else None
+        if counter is None:
+            limit = self._effective_prompt_chars(max_prompt_chars, max_prompt_tokens, token_chars)
+            truncated = limit > 0 and len(prefix) + template.length(prompt_context) > limit
+            if truncated:
+                prompt_context = self._fit_prompt_context(
+                    template, prompt_context, cfg, limit, limit - len(prefix), shrink_factor
+                )
+            prompt = prefix + template.render(prompt_context)
+            prompt_tokens = get_token_counter("heuristic", None, token_chars)(prompt) if max_prompt_tokens > 0 else 0
+            return prompt, len(prompt), truncated, prompt_tokens, max_prompt_tokens
+
+        prompt_context, truncated, prompt_tokens = self._fit_prompt_tokens(
+            template, prompt_context, cfg, prefix, counter, max_prompt_chars, max_prompt_tokens, shrink_factor
+        )
+        prompt = prefix + template.render(prompt_context)
+        return prompt, len(prompt), truncated, prompt_tokens, max_prompt_tokens
+
+    def _fit_prompt_tokens(
+        self,
+        template: PromptTemplate,
+        values: Mapping[str, str],
+        cfg: AppConfig,
+        prefix: str,
+        counter: FragmentTokenCounter,
+        max_chars: int,
+        max_tokens: int,
+        shrink_factor: float,
+    ) -> tuple[Mapping[str, str], bool, int]:
+        """
+        Fit the prompt to an exact token budget.
+
+        Token counts come from the memoized fragment counter, so each pass only
+        tokenizes the placeholders that were cut. The char limit for the next
+        pass is scaled by the measured chars per token.
+        """
+        chars = len(prefix) + template.length(values)
+        tokens = counter.count_prompt(prefix, template, values)
+        if (max_chars <= 0 or chars <= max_chars) and tokens <= max_tokens:
+            return values, False, tokens
+        limit = chars
+        if max_chars > 0:
+            limit = min(limit, max_chars)
+        fitted = values
+        for _ in range(MAX_TOKEN_FIT_PASSES):
+            if tokens > max_tokens:
+                limit = min(limit, int(chars * max_tokens / tokens))
+            fitted = self._fit_prompt_context(template, values, cfg, limit, limit - len(prefix), shrink_factor)
+            chars = len(prefix) + template.length(fitted)
+            tokens = counter.count_prompt(prefix, template, fitted)
+            if tokens <= max_tokens:
+                break
+        return fitted, True, tokens
+
+    @staticmethod
+    def _fit_prompt_context(
+        template: PromptTemplate,
+        values: Mapping[str, str],
+        cfg: AppConfig,
+        limit: int,
+        body_limit: int,
+        shrink_factor: float,
+    ) -> Mapping[str, str]:
+        """Summarise outputs/snapshot, then cut snapshot and task by the remaining overflow."""
+        fitted: Dict[str, str] = dict(values)
+        for key in template.field_names:
+            if key.endswith("_output"):
+                fitted[key] = summarize_text(fitted[key], max_chars=cfg.summary_max_chars)
+        snapshot_limit = int(cfg.role_defaults.get("snapshot_max_chars", 0) or 0)
+        if snapshot_limit > 0 and "snapshot" in fitted:
+            fitted["snapshot"] = summarize_text(fitted["snapshot"], max_chars=snapshot_limit)
+        if shrink_factor < 1.0 and "snapshot" in fitted:
+            fitted["snapshot"] = summarize_text(fitted["snapshot"], max_chars=int(limit * shrink_factor))
+        for key in ("snapshot", "task"):
+            occurrences = template.field_counts.get(key, 0)
+            overflow = template.length(fitted) - body_limit
+            if overflow <= 0:
+                break
+            if not occurrences:
+                continue
+            per_occurrence = -(-overflow // occurrences)
+            fitted[key] = truncate_text(fitted[key], max(len(fitted[key]) - per_occurrence, 256))
+        return fitted
+
+    @staticmethod
+    def _resolve_prompt_limits(role_cfg: RoleConfig, cfg: AppConfig) -> tuple[int, int, int]:
         max_prompt_chars = role_cfg.max_prompt_chars or int(cfg.role_defaults.get("max_prompt_chars", 0) or 0)
         prompt_limits = cfg.prompt_limits or {}
         token_chars = int(prompt_limits.get("token_chars", DEFAULT_TOKEN_CHARS) or DEFAULT_TOKEN_CHARS)
@@ -1190,55 +1563,7 @@ class Pipeline:
                 max_prompt_tokens = int(model_max_tokens)
             else:
                 max_prompt_tokens = int(prompt_limits.get("default_max_tokens", 0) or 0)
-        prompt_context = dict(context)
-        if repair_missing:
-            prompt_context["repair_note"] = repair_missing
-        else:
-            prompt_context["repair_note"] = ""
-        prompt_body = format_prompt(role_cfg.prompt_template, prompt_context, role_cfg.id, cfg.messages)
-        prompt = cfg.system_rules + "\n\n" + prompt_body
-        prompt_tokens = estimate_tokens(prompt, token_chars) if max_prompt_tokens > 0 else 0
-        if max_prompt_chars <= 0 and max_prompt_tokens <= 0:
-            return prompt, len(prompt), False, prompt_tokens, max_prompt_tokens
-        if self._prompt_within_limits(prompt, max_prompt_chars, max_prompt_tokens, token_chars):
-            return prompt, len(prompt), False, prompt_tokens, max_prompt_tokens
-
-        compressed = dict(prompt_context)
-        for key, value in list(compressed.items()):
-            if key.endswith("_output"):
-                compressed[key] = summarize_text(value, max_chars=cfg.summary_max_chars)
-        snapshot_limit = int(cfg.role_defaults.get("snapshot_max_chars", 0) or 0)
-        if snapshot_limit > 0 and "snapshot" in compressed:
-            compressed["snapshot"] = summarize_text(compressed["snapshot"], max_chars=snapshot_limit)
-        prompt_body = format_prompt(role_cfg.prompt_template, compressed, role_cfg.id, cfg.messages)
-        prompt = cfg.system_rules + "\n\n" + prompt_body
-        prompt_tokens = estimate_tokens(prompt, token_chars) if max_prompt_tokens > 0 else 0
-
-        if shrink_factor < 1.0:
-            target = int(self._effective_prompt_chars(max_prompt_chars, max_prompt_tokens, token_chars) * shrink_factor)
-            if "snapshot" in compressed:
-                compressed["snapshot"] = summarize_text(compressed["snapshot"], max_chars=target)
-            prompt_body = format_prompt(role_cfg.prompt_template, compressed, role_cfg.id, cfg.messages)
-            prompt = cfg.system_rules + "\n\n" + prompt_body
-            prompt_tokens = estimate_tokens(prompt, token_chars) if max_prompt_tokens > 0 else 0
-
-        if self._prompt_within_limits(prompt, max_prompt_chars, max_prompt_tokens, token_chars):
-            return prompt, len(prompt), True, prompt_tokens, max_prompt_tokens
-
-        overflow = self._prompt_overflow(prompt, max_prompt_chars, max_prompt_tokens, token_chars)
-        if "snapshot" in compressed and overflow > 0:
-            compressed["snapshot"] = truncate_text(compressed["snapshot"], max(len(compressed["snapshot"]) - overflow, 256))
-            prompt_body = format_prompt(role_cfg.prompt_template, compressed, role_cfg.id, cfg.messages)
-            prompt = cfg.system_rules + "\n\n" + prompt_body
-        prompt_tokens = estimate_tokens(prompt, token_chars) if max_prompt_tokens > 0 else 0
-        if not self._prompt_within_limits(prompt, max_prompt_chars, max_prompt_tokens, token_chars):
-            overflow = self._prompt_overflow(prompt, max_prompt_chars, max_prompt_tokens, token_chars)
-            if "task" in compressed and overflow > 0:
-                compressed["task"] = truncate_text(compressed["task"], max(len(compressed["task"]) - overflow, 256))
-                prompt_body = format_prompt(role_cfg.prompt_template, compressed, role_cfg.id, cfg.messages)
-                prompt = cfg.system_rules + "\n\n" + prompt_body
-                prompt_tokens = estimate_tokens(prompt, token_chars) if max_prompt_tokens > 0 else 0
-        return prompt, len(prompt), True, prompt_tokens, max_prompt_tokens
+        return max_prompt_chars, max_prompt_tokens, token_chars
 
     @staticmethod
     def _effective_prompt_chars(max_prompt_chars: int, max_prompt_tokens: int, token_chars: int) -> int:
@@ -1248,43 +1573,32 @@ class Pipeline:
         return max_prompt_chars or token_limit_chars
 
     @staticmethod
-    def _prompt_within_limits(
-        prompt: str, max_prompt_chars: int, max_prompt_tokens: int, token_chars: int
-    ) -> bool:
-        if max_prompt_chars > 0 and len(prompt) > max_prompt_chars:
-            return False
-        if max_prompt_tokens > 0 and estimate_tokens(prompt, token_chars) > max_prompt_tokens:
-            return False
-        return True
-
-    @staticmethod
-    def _prompt_overflow(
-        prompt: str, max_prompt_chars: int, max_prompt_tokens: int, token_chars: int
-    ) -> int:
-        overflow_chars = 0
-        if max_prompt_chars > 0 and len(prompt) > max_prompt_chars:
-            overflow_chars = len(prompt) - max_prompt_chars
-        if max_prompt_tokens > 0:
-            prompt_tokens = estimate_tokens(prompt, token_chars)
-            if prompt_tokens > max_prompt_tokens:
-                overflow_chars = max(overflow_chars, (prompt_tokens - max_prompt_tokens) * max(1, token_chars))
-        return overflow_chars
-
-    @staticmethod
-    def _build_executor(cfg: AppConfig, role_cfg: RoleConfig, default_timeout: int) -> AgentExecutor:
+    def _build_executor(
+        cfg: AppConfig,
+        role_cfg: RoleConfig,
+        default_timeout: int,
+        scheduler: AgentScheduler | None = None,
+        priority: float = 0,
+        result_cache: ResultCache | None = None,
+        process_pools: ProcessPoolRegistry | None = None,
+    ) -> AgentExecutor:
         """
         Build executor for a role using CLIAdapter.
 
         All CLI providers (codex, claude, gemini) are configured via cli_config.json.
         The role can specify cli_provider, model, and cli_parameters.
+        When a scheduler is given, every agent run of the role waits for a slot
+        of its provider, ordered by the role's critical-path priority.
+        A result cache short-circuits byte-identical prompts for the same
+        provider, model and cli_parameters. Providers with a ``pool`` section
+        take warm processes from the run's ``process_pools``.
         """
         timeout_sec = role_cfg.timeout_sec or int(default_timeout)
         if timeout_sec <= 0:
             timeout_sec = int(cfg.role_defaults.get("timeout_sec", 1200))
 
-        # Load CLI adapter (single source of truth for all providers)
-        cli_config_path = get_static_config_dir() / "cli_config.json"
-        cli_adapter = CLIAdapter(cli_config_path)
+        # CLI adapter (single source of truth for all providers), parsed at config load
+        cli_adapter = cfg.cli_adapter or load_cli_adapter(get_static_config_dir() / "cli_config.json")
 
         # Determine provider: role-specific or default
         provider_id = role_cfg.cli_provider  # None means use default from cli_config.json
@@ -1303,8 +1617,35 @@ class Pipeline:
         provider = cli_adapter.get_provider(provider_id)
         stdin_mode = stdin_content is not None or provider.input_mode != "flag"
 
-        client = CLIClient(cmd, timeout_sec=adjusted_timeout, stdin_mode=stdin_mode)
-        return AgentExecutor(client, cfg.agent_output, cfg.messages)
+        client = CLIClient(
+            cmd,
+            timeout_sec=adjusted_timeout,
+            stdin_mode=stdin_mode,
+            pool=provider.pool,
+            pools=process_pools,
+        )
+        return AgentExecutor(
+            client,
+            cfg.agent_output,
+            cfg.messages,
+            scheduler=scheduler,
+            provider_id=provider.id,
+            priority=priority,
+            result_cache=result_cache,
+            model=role_cfg.model,
+            cli_parameters=role_cfg.cli_parameters,
+        )
+
+    @staticmethod
+    def _build_result_cache(args: argparse.Namespace, cfg: AppConfig, workdir: Path) -> ResultCache:
+        cache_cfg = cfg.result_cache or {}
+        mode = str(getattr(args, "cache", None) or cache_cfg.get("mode") or "off")
+        raw_dir = str(cache_cfg.get("dir") or "").strip()
+        cache_dir = Path(raw_dir) if raw_dir else Path(str(cfg.paths.run_dir)) / "cache"
+        if not cache_dir.is_absolute():
+            cache_dir = workdir / cache_dir
+        max_bytes = int(cache_cfg.get("max_bytes", DEFAULT_CACHE_MAX_BYTES) or 0)
+        return ResultCache(cache_dir, mode=mode, max_bytes=max_bytes)
 
     @staticmethod
     def _streaming_runtime_enabled(ctx: PipelineRunContext) -> bool:
@@ -1344,7 +1685,7 @@ class Pipeline:
                 instance_label,
                 {"status": "skipped", "claimed_by": ""},
             )
-            coordination_log.append(
+            await coordination_log.append(
                 instance_label,
                 "skip",
                 {"task": instance_label},
@@ -1352,14 +1693,7 @@ class Pipeline:
 
     @staticmethod
     def _effective_deps(cfg: AppConfig, role_cfg: RoleConfig) -> List[str]:
-        if role_cfg.depends_on:
-            return role_cfg.depends_on
-        deps = []
-        for role in cfg.roles:
-            if role.id == role_cfg.id:
-                break
-            deps.append(role.id)
-        return deps
+        return effective_deps(cfg.roles, role_cfg)
 
     @staticmethod
     def _confirm_diff(label: str, diff_text: str) -> bool:
@@ -1378,7 +1712,20 @@ class Pipeline:
                 path = workdir / path
         else:
             path = run_dir / "events.jsonl"
-        return JsonRunLogger(path, enabled=enabled)
+        sinks = [
+            build_log_sink(
+                {key: str(value).replace("<run_id>", run_id) if key == "path" else value for key, value in options.items()},
+                workdir,
+            )
+            for options in logging_cfg.get("sinks") or []
+        ]
+        return JsonRunLogger(
+            path,
+            enabled=enabled,
+            sinks=sinks,
+            queue_size=int(logging_cfg.get("queue_size") or DEFAULT_QUEUE_SIZE),
+            backpressure=str(logging_cfg.get("backpressure") or DEFAULT_BACKPRESSURE),
+        )
 
     @staticmethod
     async def _validate_shard_results(
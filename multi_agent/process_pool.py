@@ -0,0 +1,298 @@
+"""
+Warm worker processes for CLI providers.
+
+Two pool modes, configured per provider via ``pool`` in ``cli_config.json``:
+
+- ``prespawn``: keeps ``size`` processes of the provider command started and
+  blocked on stdin. A run takes one, writes its prompt and closes stdin, so the
+  interpreter/runtime startup and auth handshake overlap with earlier work. A
+  replacement is spawned in the background. Works for every stdin provider.
+- ``jsonrpc``: keeps ``size`` long-lived workers that accept one JSON-RPC 2.0
+  request per line on stdin and answer with one line on stdout::
+
+      -> {"jsonrpc": "2.0", "id": 1, "method": "run", "params": {"prompt": "...", "cwd": "..."}}
+      <- {"jsonrpc": "2.0", "id": 1, "result": {"returncode": 0, "stdout": "...", "stderr": ""}}
+
+  Only for providers (or wrapper commands, ``worker_cmd``) that speak it.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, List, Mapping, Tuple
+
+POOL_MODES = ("prespawn", "jsonrpc")
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class PoolWorkerError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    mode: str = "prespawn"
+    size: int = 1
+    worker_cmd: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object] | None) -> "PoolConfig | None":
+        """``None`` when pooling is not configured or disabled."""
+        if not data or not data.get("enabled", True):
+            return None
+        mode = str(data.get("mode") or "prespawn").strip().lower()
+        if mode not in POOL_MODES:
+            raise ValueError(f"Unbekannter Pool-Modus: {mode} (erlaubt: {', '.join(POOL_MODES)})")
+        size = max(1, int(data.get("size", 1) or 1))
+        worker_cmd = tuple(str(part) for part in (data.get("worker_cmd") or ()))
+        return cls(mode=mode, size=size, worker_cmd=worker_cmd)
+
+
+async def _spawn(cmd: List[str], workdir: Path) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=str(workdir),
+    )
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+
+class PrespawnPool:
+    """Keeps ``size`` processes of ``cmd`` started and waiting for their prompt on stdin."""
+
+    def __init__(self, cmd: List[str], workdir: Path, size: int) -> None:
+        self._cmd = list(cmd)
+        self._workdir = workdir
+        self._size = max(1, int(size))
+        self._idle: Deque[asyncio.subprocess.Process] = deque()
+        self._refills: set[asyncio.Task] = set()
+        self._closed = False
+        self.spawned = 0
+        self.hits = 0
+        self._refill()
+
+    async def acquire(self) -> asyncio.subprocess.Process:
+        """A started process (warm if one is idle); the caller owns it from here."""
+        proc = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.returncode is None:
+                proc = candidate
+                break
+            await candidate.wait()
+        if proc is None:
+            proc = await self._spawn()
+        else:
+            self.hits += 1
+        self._refill()
+        return proc
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._refills):
+            task.cancel()
+        await asyncio.gather(*self._refills, return_exceptions=True)
+        while self._idle:
+            await _kill(self._idle.popleft())
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        self.spawned += 1
+        return await _spawn(self._cmd, self._workdir)
+
+    def _refill(self) -> None:
+        while not self._closed and len(self._idle) + len(self._refills) < self._size:
+            task = asyncio.get_running_loop().create_task(self._add_idle())
+            self._refills.add(task)
+            task.add_done_callback(self._refills.discard)
+
+    async def _add_idle(self) -> None:
+        try:
+            proc = await self._spawn()
+        except OSError:
+            return
+        if self._closed:
+            await _kill(proc)
+        else:
+            self._idle.append(proc)
+
+
+class _JsonRpcWorker:
+    def __init__(self, proc: asyncio.subprocess.Process) -> None:
+        self.proc = proc
+        self._buffer = bytearray()
+        self._stderr_drain = asyncio.get_running_loop().create_task(self._drain_stderr())
+
+    async def call(self, request: Dict[str, object]) -> Dict[str, object]:
+        assert self.proc.stdin is not None
+        self.proc.stdin.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.proc.stdin.drain()
+        while True:
+            response = json.loads(await self._read_line())
+            if response.get("id") == request["id"]:
+                return response
+
+    async def close(self) -> None:
+        self._stderr_drain.cancel()
+        await _kill(self.proc)
+
+    async def _read_line(self) -> bytes:
+        # Own line splitting: responses can exceed StreamReader's line limit.
+        assert self.proc.stdout is not None
+        while True:
+            idx = self._buffer.find(b"\n")
+            if idx >= 0:
+                line = bytes(self._buffer[:idx])
+                del self._buffer[: idx + 1]
+                return line
+            data = await self.proc.stdout.read(READ_CHUNK_BYTES)
+            if not data:
+                raise PoolWorkerError("Pool-Worker hat stdout geschlossen")
+            self._buffer.extend(data)
+
+    async def _drain_stderr(self) -> None:
+        if self.proc.stderr is None:
+            return
+        while await self.proc.stderr.read(READ_CHUNK_BYTES):
+            pass
+
+
+def _remaining(deadline: float | None) -> float | None:
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+class JsonRpcPool:
+    """Persistent workers answering one JSON-RPC ``run`` request at a time each."""
+
+    def __init__(self, cmd: List[str], workdir: Path, size: int) -> None:
+        self._cmd = list(cmd)
+        self._workdir = workdir
+        self._size = max(1, int(size))
+        # ``None`` marks the slot of a discarded worker for the next caller to refill.
+        self._idle: asyncio.Queue[_JsonRpcWorker | None] = asyncio.Queue()
+        self._workers: List[_JsonRpcWorker] = []
+        self._start_lock = asyncio.Lock()
+        self._next_id = 0
+        self.spawned = 0
+
+    async def request(self, prompt: str, workdir: Path, timeout_sec: float | None) -> Tuple[int, str, str]:
+        """
+        Run ``prompt`` on an idle worker.
+
+        Raises ``asyncio.TimeoutError`` on timeout, which includes the wait
+        for a free worker; a worker that timed out is then replaced.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout_sec is None else loop.time() + timeout_sec
+        worker = await self._acquire(deadline)
+        if deadline is not None:
+            timeout_sec = max(0.0, deadline - loop.time())
+        self._next_id += 1
+        request = {
+            "jsonrpc": "2.0",
+            "id": self._next_id,
+            "method": "run",
+            "params": {"prompt": prompt, "cwd": str(workdir)},
+        }
+        try:
+            response = await asyncio.wait_for(worker.call(request), timeout=timeout_sec)
+        except BaseException:
+            await self._discard(worker)
+            raise
+        self._idle.put_nowait(worker)
+        if "error" in response:
+            error = response.get("error") or {}
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            return 1, "", str(message or "Pool-Worker-Fehler")
+        result = response.get("result") or {}
+        return (
+            int(result.get("returncode", 0) or 0),
+            str(result.get("stdout") or ""),
+            str(result.get("stderr") or ""),
+        )
+
+    async def close(self) -> None:
+        workers, self._workers = self._workers, []
+        await asyncio.gather(*(worker.close() for worker in workers), return_exceptions=True)
+
+    async def _acquire(self, deadline: float | None) -> _JsonRpcWorker:
+        while True:
+            async with self._start_lock:
+                while len(self._workers) < self._size and self._idle.empty():
+                    try:
+                        proc = await asyncio.wait_for(_spawn(self._cmd, self._workdir), timeout=_remaining(deadline))
+                    except BaseException:
+                        # Wake a waiter so it retries (or fails) instead of hanging.
+                        self._idle.put_nowait(None)
+                        raise
+                    worker = _JsonRpcWorker(proc)
+                    self.spawned += 1
+                    self._workers.append(worker)
+                    self._idle.put_nowait(worker)
+            worker = await self._next_idle(deadline)
+            if worker is not None:
+                return worker
+
+    async def _next_idle(self, deadline: float | None) -> _JsonRpcWorker | None:
+        """
+        Take the next queue item by ``deadline``.
+
+        An item the getter already took when the caller is cancelled (or times
+        out) goes back to the queue; ``wait_for(queue.get())`` could drop it.
+        """
+        getter = asyncio.ensure_future(self._idle.get())
+        try:
+            done, _ = await asyncio.wait({getter}, timeout=_remaining(deadline))
+            if not done:
+                raise asyncio.TimeoutError
+            return getter.result()
+        except BaseException:
+            if getter.done() and not getter.cancelled():
+                self._idle.put_nowait(getter.result())
+            else:
+                getter.cancel()
+            raise
+
+    async def _discard(self, worker: _JsonRpcWorker) -> None:
+        if worker in self._workers:
+            self._workers.remove(worker)
+            # Callers blocked in _acquire only wake up through the queue.
+            self._idle.put_nowait(None)
+        await worker.close()
+
+
+class ProcessPoolRegistry:
+    """Pools of one pipeline run, keyed by command and working directory."""
+
+    def __init__(self) -> None:
+        self._pools: Dict[Tuple[str, Tuple[str, ...], str], PrespawnPool | JsonRpcPool] = {}
+
+    def get(self, config: PoolConfig, cmd: List[str], workdir: Path) -> PrespawnPool | JsonRpcPool:
+        pool_cmd = list(config.worker_cmd) if config.mode == "jsonrpc" and config.worker_cmd else list(cmd)
+        key = (config.mode, tuple(pool_cmd), str(workdir))
+        pool = self._pools.get(key)
+        if pool is None:
+            if config.mode == "jsonrpc":
+                pool = JsonRpcPool(pool_cmd, workdir, config.size)
+            else:
+                pool = PrespawnPool(pool_cmd, workdir, config.size)
+            self._pools[key] = pool
+        return pool
+
+    async def close(self) -> None:
+        pools, self._pools = list(self._pools.values()), {}
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
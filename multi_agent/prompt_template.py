@@ -0,0 +1,105 @@
+"""Pre-parsed prompt templates with per-placeholder size accounting."""
+from __future__ import annotations
+
+import re
+import string
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Tuple
+
+_FORMATTER = string.Formatter()
+_FIELD_NAME_RE = re.compile(r"[^.\[]*")
+
+
+@dataclass(frozen=True)
+class _Field:
+    expression: str
+    name: str
+    conversion: str | None
+    format_spec: str
+    simple: bool
+
+
+class PromptTemplate:
+    """
+    A ``str.format`` template parsed once.
+
+    Rendering is equivalent to ``template.format(**context)``, but the literal
+    parts are measured up front, so the length of a rendered prompt (and each
+    placeholder's share of it) can be computed without building the string.
+    """
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        parts: List[Tuple[str, _Field | None]] = []
+        for literal, expression, format_spec, conversion in _FORMATTER.parse(template):
+            field: _Field | None = None
+            if expression is not None:
+                name = _FIELD_NAME_RE.match(expression).group()
+                simple = expression == name and not conversion and not format_spec
+                field = _Field(expression, name, conversion, format_spec or "", simple)
+            parts.append((literal, field))
+        self._parts = parts
+        self.literals: Tuple[str, ...] = tuple(literal for literal, _ in parts if literal)
+        self.literal_chars = sum(len(literal) for literal in self.literals)
+        self.field_names: Tuple[str, ...] = tuple(
+            dict.fromkeys(field.name for _, field in parts if field is not None)
+        )
+        counts: Dict[str, int] = {}
+        for _, field in parts:
+            if field is not None:
+                counts[field.name] = counts.get(field.name, 0) + 1
+        self.field_counts: Dict[str, int] = counts
+        self._all_simple = all(field.simple for _, field in parts if field is not None)
+
+    def missing_key(self, context: Mapping[str, object]) -> str | None:
+        for name in self.field_names:
+            if name not in context:
+                return name
+        return None
+
+    def field_texts(self, context: Mapping[str, object]) -> List[str]:
+        """Rendered text of every placeholder occurrence, in template order."""
+        texts: List[str] = []
+        for _, field in self._parts:
+            if field is None:
+                continue
+            if field.simple:
+                value = context[field.name]
+                texts.append(value if isinstance(value, str) else format(value))
+            else:
+                value, _ = _FORMATTER.get_field(field.expression, (), context)
+                value = _FORMATTER.convert_field(value, field.conversion)
+                spec = _FORMATTER.vformat(field.format_spec, (), context) if field.format_spec else ""
+                texts.append(format(value, spec))
+        return texts
+
+    def length(self, context: Mapping[str, object]) -> int:
+        if self._all_simple:
+            total = self.literal_chars
+            for name, count in self.field_counts.items():
+                value = context[name]
+                total += count * len(value if isinstance(value, str) else format(value))
+            return total
+        return self.literal_chars + sum(len(text) for text in self.field_texts(context))
+
+    def render(self, context: Mapping[str, object]) -> str:
+        texts = iter(self.field_texts(context))
+        pieces: List[str] = []
+        for literal, field in self._parts:
+            pieces.append(literal)
+            if field is not None:
+                pieces.append(next(texts))
+        return "".join(pieces)
+
+
+def render_prompt(
+    template: PromptTemplate,
+    context: Mapping[str, object],
+    role_id: str,
+    messages: Mapping[str, str],
+) -> str:
+    """Like :func:`utils.format_prompt`, for a compiled template."""
+    missing = template.missing_key(context)
+    if missing is not None:
+        raise ValueError(messages["error_prompt_missing_key"].format(role_id=role_id, key=missing))
+    return template.render(context)
@@ -0,0 +1,127 @@
+"""BM25 relevance ranking of workspace files for selective context."""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+MIN_TOKEN_LEN = 3
+# Path tokens live in their own field; a path match is a much stronger signal
+# than a word somewhere in the body, so it is weighted up and not length-normalised.
+PATH_PREFIX = "path:"
+PATH_FIELD_WEIGHT = 3.0
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; ``camelCase`` and ``snake_case`` are split into parts."""
+    tokens: List[str] = []
+    for word in _WORD_RE.findall(text or ""):
+        lowered = word.lower()
+        if len(lowered) >= MIN_TOKEN_LEN:
+            tokens.append(lowered)
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if len(part) >= MIN_TOKEN_LEN)
+    return tokens
+
+
+def document_terms(rel_path: str, text: str) -> Dict[str, int]:
+    """Term frequencies of a file: content tokens plus ``path:``-prefixed path tokens."""
+    counts = Counter(tokenize(text))
+    for token in set(tokenize(rel_path)):
+        counts[PATH_PREFIX + token] = 1
+    return dict(counts)
+
+
+class RelevanceIndex:
+    """
+    Inverted index scoring documents with Okapi BM25.
+
+    Documents are added as precomputed term frequencies (see
+    :func:`document_terms`), so the expensive tokenisation happens once per
+    file read and is persisted alongside the snapshot index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    @classmethod
+    def from_documents(cls, documents: Mapping[str, Mapping[str, int]]) -> "RelevanceIndex":
+        index = cls()
+        for doc_id, terms in documents.items():
+            index.add(doc_id, terms)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: str, terms: Mapping[str, int]) -> None:
+        if doc_id in self._lengths:
+            raise ValueError(f"Dokument bereits im Index: {doc_id}")
+        length = 0
+        for term, freq in terms.items():
+            if freq <= 0:
+                continue
+            self._postings.setdefault(term, {})[doc_id] = int(freq)
+            if not term.startswith(PATH_PREFIX):
+                length += int(freq)
+        self._lengths[doc_id] = length
+        self._total_length += length
+
+    def score(self, query: str) -> Dict[str, float]:
+        """BM25 score per document for ``query``; documents without a match are omitted."""
+        doc_count = len(self._lengths)
+        if not doc_count:
+            return {}
+        avg_length = self._total_length / doc_count or 1.0
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            for term, weight, b in ((token, 1.0, self.b), (PATH_PREFIX + token, PATH_FIELD_WEIGHT, 0.0)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, freq in postings.items():
+                    norm = self.k1 * (1.0 - b + b * self._lengths[doc_id] / avg_length)
+                    gain = weight * idf * freq * (self.k1 + 1.0) / (freq + norm)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + gain
+        return scores
+
+    def rank(self, query: str, candidates: Iterable[str] | None = None) -> List[Tuple[str, float]]:
+        """Matching documents ordered by descending score (ties by id)."""
+        scores = self.score(query)
+        if candidates is not None:
+            allowed = set(candidates)
+            scores = {doc_id: value for doc_id, value in scores.items() if doc_id in allowed}
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def select_ranked(
+    ranked: List[Tuple[str, float]],
+    all_ids: List[str],
+    min_files: int,
+    max_files: int,
+) -> List[str]:
+    """
+    Pick files for selective context.
+
+    Relevant files come first (best score first). With fewer than
+    ``min_files`` hits the remaining files follow in their original order, so
+    vague tasks still see the whole workspace; without any hit (e.g. an empty
+    task) the files keep their original order.
+    """
+    selected = [doc_id for doc_id, _ in ranked]
+    if not selected:
+        return all_ids[: max(0, max_files)]
+    if len(selected) < min_files:
+        chosen = set(selected)
+        selected.extend(doc_id for doc_id in all_ids if doc_id not in chosen)
+        return selected
+    return selected[: max(0, max_files)]
@@ -0,0 +1,184 @@
+"""Content-addressed cache of agent results keyed by provider, command, model and prompt."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Sequence
+
+CACHE_MODES = ("off", "read", "readwrite")
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class ResultCache:
+    """
+    Stores successful agent outputs under ``<root>/<key[:2]>/<key>.json``.
+
+    ``read`` only serves hits, ``readwrite`` also stores new results. Entries
+    are evicted least-recently-used once the cache grows beyond ``max_bytes``:
+    the existing entries are listed once (ordered by file mtime, which every
+    hit refreshes), after that order and total size are kept in memory.
+    Writes and evictions run in a worker thread.
+    """
+
+    def __init__(self, root: Path, mode: str = "off", max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        mode = (mode or "off").strip().lower()
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unbekannter Cache-Modus: {mode} (erlaubt: {', '.join(CACHE_MODES)})")
+        self._root = root
+        self._mode = mode
+        self._max_bytes = max(0, int(max_bytes))
+        self._sizes: "OrderedDict[Path, int] | None" = None
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @property
+    def readable(self) -> bool:
+        return self._mode in {"read", "readwrite"}
+
+    @property
+    def writable(self) -> bool:
+        return self._mode == "readwrite"
+
+    @staticmethod
+    def make_key(
+        provider_id: str,
+        model: str | None,
+        cli_parameters: Mapping[str, object] | None,
+        prompt: str,
+        command: Sequence[str] | None = None,
+    ) -> str:
+        """``command`` is the resolved CLI command (e.g. from ``CODEX_CMD``)."""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8", errors="replace")).hexdigest()
+        material = json.dumps(
+            {
+                "provider": provider_id or "",
+                "command": [str(part) for part in command or ()],
+                "model": model or "",
+                "cli_parameters": dict(cli_parameters or {}),
+                "prompt_sha256": prompt_hash,
+            },
+            sort_keys=True,
+            ensure_ascii=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> CachedResult | None:
+        if not self.readable:
+            return None
+        path = self._entry_path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        if self._sizes is not None and path in self._sizes:
+            self._sizes.move_to_end(path)
+        self.hits += 1
+        return CachedResult(
+            returncode=int(data.get("returncode", 0)),
+            stdout=str(data.get("stdout") or ""),
+            stderr=str(data.get("stderr") or ""),
+        )
+
+    async def put(self, key: str, returncode: int, stdout: str, stderr: str) -> None:
+        if not self.writable or returncode != 0 or not stdout.strip():
+            return
+        path = self._entry_path(key)
+        payload = json.dumps(
+            {
+                "key": key,
+                "created": time.time(),
+                "returncode": returncode,
+                "stdout": stdout,
+                "stderr": stderr,
+            },
+            ensure_ascii=True,
+        )
+        await asyncio.to_thread(self._write_entry, path, payload)
+        self.stores += 1
+        if self._sizes is None:
+            self._sizes = await asyncio.to_thread(self._load_sizes)
+            self._total = sum(self._sizes.values())
+        # ensure_ascii: characters == bytes
+        self._total += len(payload) - self._sizes.pop(path, 0)
+        self._sizes[path] = len(payload)
+        victims = self._evict()
+        if victims:
+            await asyncio.to_thread(self._unlink_all, victims)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "mode": self._mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def _entry_path(self, key: str) -> Path:
+        return self._root / key[:2] / f"{key}.json"
+
+    @staticmethod
+    def _write_entry(path: Path, payload: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _load_sizes(self) -> "OrderedDict[Path, int]":
+        """Existing entries, least recently used first."""
+        entries: List[tuple[float, Path, int]] = []
+        if self._root.is_dir():
+            for path in self._root.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        return OrderedDict((path, size) for _, path, size in entries)
+
+    def _evict(self) -> List[Path]:
+        """Drop least recently used entries until under ``max_bytes``; returns their paths."""
+        victims: List[Path] = []
+        if self._max_bytes <= 0 or self._sizes is None:
+            return victims
+        while self._total > self._max_bytes and self._sizes:
+            path, size = self._sizes.popitem(last=False)
+            self._total -= size
+            victims.append(path)
+            self.evictions += 1
+        return victims
+
+    @staticmethod
+    def _unlink_all(paths: List[Path]) -> None:
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
@@ -5,9 +5,10 @@ import asyncio
 import sys
 from pathlib import Path
 
-from .cli_adapter import CLIAdapter
+from .cli_adapter import load_cli_adapter
 from .cli_errors import print_error
 from .constants import ExitCode, get_static_config_dir
+from .dag import build_execution_plan, format_execution_plan, load_historical_durations, role_dependency_map
 from .pipeline import build_pipeline
 from .task_split import (
     build_chunk_payload,
@@ -24,6 +25,7 @@ from .task_split import (
     split_task_markdown,
     write_base_chunks,
 )
+from .token_counting import get_encoder, get_token_counter, resolve_tokenizer
 from .utils import now_stamp, parse_cmd, summarize_text
 
 
@@ -36,7 +38,11 @@ async def run_split(pipeline, args: argparse.Namespace, cfg) -> int:
         return int(ExitCode.VALIDATION_ERROR)
     split_cfg = cfg.task_split
     decision_mode = str(split_cfg.get("decision_mode", "auto") or "auto").lower()
-    if decision_mode != "always" and not needs_split(task_text, split_cfg):
+    token_mode, tokenizer_file = resolve_tokenizer(cfg.prompt_limits or {}, None)
+    token_counter = None
+    if get_encoder(token_mode, None, tokenizer_file) is not None:
+        token_counter = get_token_counter(token_mode, None, tokenizer_file=tokenizer_file)
+    if decision_mode != "always" and not needs_split(task_text, split_cfg, token_counter):
         print("Task-Split: nicht notwendig, starte Single-Run.")
         return await pipeline.run(args, cfg)
 
@@ -64,8 +70,7 @@ async def run_split(pipeline, args: argparse.Namespace, cfg) -> int:
             if raw_cmd:
                 codex_cmd = parse_cmd(raw_cmd)
             else:
-                cli_config_path = get_static_config_dir() / "cli_config.json"
-                cli_adapter = CLIAdapter(cli_config_path)
+                cli_adapter = cfg.cli_adapter or load_cli_adapter(get_static_config_dir() / "cli_config.json")
                 codex_cmd, _, _ = cli_adapter.build_command_for_role(
                     provider_id=None,
                     prompt=None,
@@ -139,6 +144,19 @@ async def run_split(pipeline, args: argparse.Namespace, cfg) -> int:
     return 1 if any_fail else 0
 
 
+def plan_pipeline(args: argparse.Namespace, cfg) -> int:
+    """Print the critical path and expected makespan without running agents."""
+    workdir = Path(args.dir).resolve()
+    history = load_historical_durations(workdir / str(cfg.paths.run_dir))
+    try:
+        plan = build_execution_plan(role_dependency_map(cfg.roles), history)
+    except ValueError as exc:
+        print_error(str(exc))
+        return int(ExitCode.CONFIG_ERROR)
+    print(format_execution_plan(plan, has_history=bool(history)))
+    return int(ExitCode.SUCCESS)
+
+
 def run_pipeline(args: argparse.Namespace, cfg) -> int:
     pipeline = build_pipeline()
     try:
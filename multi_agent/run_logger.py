@@ -1,19 +1,266 @@
+"""
+Structured run events (``events.jsonl`` and optional further sinks).
+
+:meth:`JsonRunLogger.log` only serializes the event and hands it to a
+bounded queue; a writer thread passes the queued lines in batches to every
+sink. Sinks are selected in ``logging.sinks`` by ``type``:
+
+- ``jsonl``: append to a file (the default ``jsonl_path`` sink).
+- ``rotating``: like ``jsonl``, rotated to ``<path>.1`` ... ``<path>.<backups>``
+  once the file exceeds ``max_bytes``.
+- ``udp``: one datagram per event to ``host:port``, as the JSON line or, with
+  ``format: "statsd"``, as statsd counter/timer (a local metrics stand-in).
+
+Further types can be added with :func:`register_log_sink`.
+"""
 from __future__ import annotations
 
 import json
+import os
+import queue
+import socket
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Mapping, Protocol, Sequence, TextIO
 
+BACKPRESSURE_POLICIES = ("block", "drop_new", "drop_old")
+# log() runs on the event loop: never block it by default, keep the newest events (run_end).
+DEFAULT_BACKPRESSURE = "drop_old"
+DEFAULT_QUEUE_SIZE = 10000
+# Lines handed to the sinks per write.
+WRITE_BATCH = 512
+DEFAULT_ROTATE_BYTES = 10 * 1024 * 1024
+DEFAULT_ROTATE_BACKUPS = 3
 
-class JsonRunLogger:
-    def __init__(self, path: Path, enabled: bool = True) -> None:
+
+class LogSink(Protocol):
+    def write(self, lines: Sequence[str]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class JsonlSink:
+    def __init__(self, path: Path) -> None:
         self._path = path
-        self._enabled = enabled
+        self._handle: TextIO | None = None
+
+    def write(self, lines: Sequence[str]) -> None:
+        if self._handle is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self._path.open("a", encoding="utf-8")
+        self._handle.write("\n".join(lines) + "\n")
+        self._handle.flush()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class RotatingJsonlSink(JsonlSink):
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_ROTATE_BYTES, backups: int = DEFAULT_ROTATE_BACKUPS) -> None:
+        super().__init__(path)
+        self._max_bytes = max(1, int(max_bytes))
+        self._backups = max(0, int(backups))
+
+    def write(self, lines: Sequence[str]) -> None:
+        super().write(lines)
+        assert self._handle is not None
+        if self._handle.tell() >= self._max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self.close()
+        if self._backups == 0:
+            self._path.unlink()
+            return
+        for idx in range(self._backups - 1, 0, -1):
+            older = self._path.with_name(f"{self._path.name}.{idx}")
+            if older.exists():
+                os.replace(older, self._path.with_name(f"{self._path.name}.{idx + 1}"))
+        os.replace(self._path, self._path.with_name(f"{self._path.name}.1"))
+
+
+class UdpSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8125, fmt: str = "json", prefix: str = "multi_agent") -> None:
+        self._address = (host, int(port))
+        self._format = fmt
+        self._prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, lines: Sequence[str]) -> None:
+        for line in lines:
+            for datagram in self._datagrams(line):
+                try:
+                    self._socket.sendto(datagram, self._address)
+                except OSError:
+                    # Nobody listening (or buffer full): metrics are best effort.
+                    pass
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _datagrams(self, line: str) -> List[bytes]:
+        if self._format != "statsd":
+            return [line.encode("utf-8")]
+        entry = json.loads(line)
+        name = f"{self._prefix}.{entry.get('event')}"
+        datagrams = [f"{name}:1|c".encode("ascii", "replace")]
+        payload = entry.get("payload")
+        duration = payload.get("duration_sec") if isinstance(payload, dict) else None
+        if isinstance(duration, (int, float)):
+            datagrams.append(f"{name}.duration:{duration * 1000:.0f}|ms".encode("ascii", "replace"))
+        return datagrams
+
+
+SinkFactory = Callable[[Mapping[str, object], Path], LogSink]
+
+
+def _path_option(options: Mapping[str, object], workdir: Path) -> Path:
+    raw = str(options.get("path") or "")
+    if not raw:
+        raise ValueError(f"Log-Sink {options.get('type')} braucht einen path")
+    path = Path(raw)
+    return path if path.is_absolute() else workdir / path
+
+
+LOG_SINKS: Dict[str, SinkFactory] = {
+    "jsonl": lambda options, workdir: JsonlSink(_path_option(options, workdir)),
+    "rotating": lambda options, workdir: RotatingJsonlSink(
+        _path_option(options, workdir),
+        max_bytes=int(options.get("max_bytes") or DEFAULT_ROTATE_BYTES),
+        backups=int(options.get("backups", DEFAULT_ROTATE_BACKUPS)),
+    ),
+    "udp": lambda options, workdir: UdpSink(
+        host=str(options.get("host") or "127.0.0.1"),
+        port=int(options.get("port") or 8125),
+        fmt=str(options.get("format") or "json"),
+        prefix=str(options.get("prefix") or "multi_agent"),
+    ),
+}
+
+
+def register_log_sink(name: str, factory: SinkFactory) -> None:
+    """Make ``factory`` selectable as ``{"type": <name>}`` in ``logging.sinks``."""
+    LOG_SINKS[name.strip().lower()] = factory
+
+
+def build_log_sink(options: Mapping[str, object], workdir: Path) -> LogSink:
+    kind = str(options.get("type") or "jsonl").strip().lower()
+    factory = LOG_SINKS.get(kind)
+    if factory is None:
+        raise ValueError(f"Unbekannter Log-Sink: {kind} (erlaubt: {', '.join(LOG_SINKS)})")
+    return factory(options, workdir)
+
+
+class JsonRunLogger:
+    """
+    Run event log with a writer thread.
+
+    ``backpressure`` decides what :meth:`log` does when ``queue_size``
+    events are pending: ``drop_old`` (default) discards the oldest queued
+    event, ``drop_new`` the new one, and ``block`` waits for the writer -
+    which blocks the calling thread, i.e. the whole event loop and every
+    agent on it. Dropped events are counted and reported as a final
+    ``log_dropped`` event on :meth:`close`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        enabled: bool = True,
+        sinks: Sequence[LogSink] | None = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        backpressure: str = DEFAULT_BACKPRESSURE,
+    ) -> None:
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                f"Unbekannte Backpressure-Policy: {backpressure} (erlaubt: {', '.join(BACKPRESSURE_POLICIES)})"
+            )
+        self._sinks: List[LogSink] = [JsonlSink(path)] if enabled else []
+        self._sinks.extend(sinks or ())
+        self._enabled = bool(self._sinks)
+        self._backpressure = backpressure
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.logged = 0
+        self.dropped = 0
+        self.sink_errors = 0
 
     def log(self, event: str, payload: Dict[str, object]) -> None:
-        if not self._enabled:
+        if not self._enabled or self._closed:
+            return
+        # Serialized here: payloads may be mutated after the call.
+        line = json.dumps({"event": event, "payload": payload}, ensure_ascii=True)
+        self._ensure_writer()
+        if self._backpressure == "block":
+            self._queue.put(line)
+        elif self._backpressure == "drop_new":
+            try:
+                self._queue.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+                return
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(line)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.logged += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"logged": self.logged, "dropped": self.dropped, "sink_errors": self.sink_errors}
+
+    def close(self) -> None:
+        """Write everything still queued and close the sinks (blocking)."""
+        if self._closed:
             return
-        entry = {"event": event, "payload": payload}
-        self._path.parent.mkdir(parents=True, exist_ok=True)
-        with self._path.open("a", encoding="utf-8") as handle:
-            handle.write(json.dumps(entry, ensure_ascii=True) + "\n")
+        self._closed = True
+        if self._thread is not None:
+            if self.dropped:
+                # Always delivered, whatever the policy.
+                self._queue.put(json.dumps({"event": "log_dropped", "payload": {"dropped": self.dropped}}))
+            self._queue.put(None)
+            self._thread.join()
+        for sink in self._sinks:
+            try:
+                sink.close()
+            except Exception:  # noqa: BLE001
+                self.sink_errors += 1
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="json-run-logger", daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            lines = [line for line in batch if line is not None]
+            if lines:
+                for sink in self._sinks:
+                    try:
+                        sink.write(lines)
+                    except Exception:  # noqa: BLE001
+                        # One failing sink must neither stop the run nor the others.
+                        self.sink_errors += 1
+            if closing:
+                return
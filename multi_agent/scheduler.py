@@ -0,0 +1,163 @@
+"""Run-wide admission control for agent subprocesses."""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Mapping
+
+from .constants import DEFAULT_CONCURRENCY
+
+
+@dataclass(order=True)
+class _Waiter:
+    sort_key: tuple[float, int]
+    provider_id: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AgentScheduler:
+    """
+    Limits how many agent processes run at once.
+
+    Every agent invocation acquires a slot before its CLI process is spawned.
+    Slots are bounded globally (``max_concurrent``) and per provider
+    (``provider_limits``). Waiters are served by descending priority, FIFO
+    within the same priority; a waiter whose provider is saturated does not
+    block lower-priority waiters of other providers.
+    """
+
+    def __init__(self, max_concurrent: int = 0, provider_limits: Mapping[str, int] | None = None) -> None:
+        self._max_concurrent = max(0, int(max_concurrent))
+        self._provider_limits = {
+            str(key): int(value) for key, value in (provider_limits or {}).items() if int(value) > 0
+        }
+        self._running = 0
+        self._running_by_provider: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.total_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+        self.peak_running = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        scheduler_cfg: Mapping[str, object],
+        cli_providers: Mapping[str, object],
+    ) -> "AgentScheduler":
+        raw_max = scheduler_cfg.get("max_concurrent_agents", DEFAULT_CONCURRENCY)
+        max_concurrent = int(raw_max) if raw_max is not None else 0
+        provider_limits: Dict[str, int] = {}
+        for provider_id, provider_cfg in cli_providers.items():
+            if not isinstance(provider_cfg, Mapping):
+                continue
+            limit = provider_cfg.get("max_concurrent")
+            if limit is not None:
+                provider_limits[str(provider_id)] = int(limit)
+        overrides = scheduler_cfg.get("provider_limits") or {}
+        if isinstance(overrides, Mapping):
+            provider_limits.update({str(key): int(value) for key, value in overrides.items()})
+        return cls(max_concurrent=max_concurrent, provider_limits=provider_limits)
+
+    @property
+    def max_concurrent(self) -> int:
+        return self._max_concurrent
+
+    @property
+    def provider_limits(self) -> Dict[str, int]:
+        return dict(self._provider_limits)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, provider_id: str, priority: float = 0) -> AsyncIterator[float]:
+        """Hold one agent slot; yields the seconds spent waiting in the queue."""
+        wait_sec = await self.acquire(provider_id, priority)
+        try:
+            yield wait_sec
+        finally:
+            self.release(provider_id)
+
+    async def acquire(self, provider_id: str, priority: float = 0) -> float:
+        start = time.monotonic()
+        if not self._waiters and self._has_capacity(provider_id):
+            self._grant(provider_id)
+            return 0.0
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter((-float(priority), next(self._seq)), provider_id, future)
+        bisect.insort(self._waiters, waiter)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right before cancellation; hand it back.
+                self.release(provider_id)
+            else:
+                self._remove_waiter(waiter)
+            raise
+        wait_sec = time.monotonic() - start
+        self.total_wait_sec += wait_sec
+        self.max_wait_sec = max(self.max_wait_sec, wait_sec)
+        return wait_sec
+
+    def release(self, provider_id: str) -> None:
+        self._running = max(0, self._running - 1)
+        current = self._running_by_provider.get(provider_id, 0)
+        self._running_by_provider[provider_id] = max(0, current - 1)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "max_concurrent_agents": self._max_concurrent,
+            "provider_limits": dict(self._provider_limits),
+            "peak_running": self.peak_running,
+            "total_queue_wait_sec": self.total_wait_sec,
+            "max_queue_wait_sec": self.max_wait_sec,
+        }
+
+    def _has_capacity(self, provider_id: str) -> bool:
+        if self._max_concurrent > 0 and self._running >= self._max_concurrent:
+            return False
+        limit = self._provider_limits.get(provider_id)
+        if limit is not None and self._running_by_provider.get(provider_id, 0) >= limit:
+            return False
+        return True
+
+    def _grant(self, provider_id: str) -> None:
+        self._running += 1
+        self._running_by_provider[provider_id] = self._running_by_provider.get(provider_id, 0) + 1
+        self.peak_running = max(self.peak_running, self._running)
+
+    def _dispatch(self) -> None:
+        idx = 0
+        while idx < len(self._waiters):
+            if self._max_concurrent > 0 and self._running >= self._max_concurrent:
+                return
+            waiter = self._waiters[idx]
+            if waiter.future.done():
+                self._waiters.pop(idx)
+                continue
+            if not self._has_capacity(waiter.provider_id):
+                idx += 1
+                continue
+            self._waiters.pop(idx)
+            self._grant(waiter.provider_id)
+            waiter.future.set_result(None)
+
+    def _remove_waiter(self, waiter: _Waiter) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._dispatch()
@@ -2,13 +2,23 @@ from __future__ import annotations
 
 import abc
 import hashlib
-import json
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
 
-from .constants import DEFAULT_MAX_FILES, DEFAULT_MAX_FILE_BYTES
-from .utils import read_text_safe, select_relevant_files
+from .constants import (
+    DEFAULT_MAX_FILES,
+    DEFAULT_MAX_FILE_BYTES,
+    DEFAULT_READ_WORKERS,
+    DEFAULT_TOKEN_CHARS,
+    SELECTIVE_INDEX_BYTES,
+)
+from .snapshot_index import FileEntry, SnapshotIndex
+from .packing import PackResult, pack_budget
+from .diff_utils import check_path_matches_globs
+from .relevance import RelevanceIndex, select_ranked
+from .workspace_walk import walk_workspace
 
 
 @dataclass(frozen=True)
@@ -19,6 +29,14 @@ class SnapshotResult:
     delta_used: bool
     max_bytes_per_file: int
     total_bytes: int
+    files_read: int = 0
+    files_reused: int = 0
+    walk_sec: float = 0.0
+    read_sec: float = 0.0
+    binary_skipped: int = 0
+    relevance: Dict[str, float] = field(default_factory=dict)
+    packing: PackResult | None = None
+    views: "SnapshotViews | None" = field(default=None, compare=False, repr=False)
 
 
 class BaseSnapshotter(abc.ABC):
@@ -47,9 +65,15 @@ class WorkspaceSnapshotter(BaseSnapshotter):
         Snapshot des Workspaces:
         - Liste der Dateien
         - Inhalte von Textdateien (gekürzt)
+
+        Inhalte kommen aus einem persistenten Per-Datei-Index (``cache_file``):
+        nur Dateien mit geaenderter mtime/Groesse werden neu gelesen. Mit
+        ``selective_context`` wird jede Datei fuer den Term-Index gelesen,
+        hoechstens ``SELECTIVE_INDEX_BYTES`` pro Datei; nur ausgewaehlte
+        Dateien werden voll gelesen, vom Rest behaelt der Index nur Terme und
+        Digest.
         """
         root = root.resolve()
-        files: List[Path] = []
         skip_dirs = set(snapshot_cfg.get("skip_dirs", []))
         skip_exts = set(snapshot_cfg.get("skip_exts", []))
         cache_file = snapshot_cfg.get("cache_file")
@@ -60,73 +84,102 @@ class WorkspaceSnapshotter(BaseSnapshotter):
         selective_enabled = bool(selective_context.get("enabled", False))
         selective_min_files = int(selective_context.get("min_files", 0))
         selective_max_files = int(selective_context.get("max_files", max_files))
-        max_total_bytes = snapshot_cfg.get("max_total_bytes")
+        respect_gitignore = bool(snapshot_cfg.get("respect_gitignore", True))
+        use_git = bool(snapshot_cfg.get("use_git_ls_files", False))
+        read_workers = int(snapshot_cfg.get("read_workers", DEFAULT_READ_WORKERS) or 1)
+        cache_path = root / str(cache_file) if cache_file else None
 
-        for p in root.rglob("*"):
-            if p.is_dir():
-                continue
-            parts = set(p.parts)
-            if parts & skip_dirs:
-                continue
-            files.append(p)
+        walk_started = time.monotonic()
+        listing = walk_workspace(
+            root,
+            skip_dirs,
+            exclude={cache_path} if cache_path else set(),
+            respect_gitignore=respect_gitignore,
+            use_git=use_git,
+        )
+        walk_sec = time.monotonic() - walk_started
+        files = sorted(listing)
 
-        files = sorted(files)
-        if selective_enabled:
-            files = select_relevant_files(task or "", files, selective_min_files, selective_max_files)
-        files = files[:max_files]
+        index = SnapshotIndex.load(cache_path)
+        had_index = bool(index.entries)
+        prev_digests = index.digests()
+        prev_signature = index.signature
 
-        cache_hit, delta_used, selected_files, cached_snapshot = self._apply_cache(
+        if not selective_enabled:
+            files = files[:max_files]
+
+        read_started = time.monotonic()
+        to_read = [p for p in files if p.suffix.lower() not in skip_exts]
+        # Ranking needs the terms of every file, but only a bounded prefix of each.
+        resolved = index.get_entries(
             root,
-            files,
-            cache_file,
-            delta_snapshot,
+            [(p, *listing[p]) for p in to_read],
+            min(int(max_bytes_per_file), SELECTIVE_INDEX_BYTES) if selective_enabled else int(max_bytes_per_file),
+            workers=read_workers,
+            need_text=not selective_enabled,
         )
-        if cache_hit and cached_snapshot is not None:
-            return SnapshotResult(
-                text=str(cached_snapshot),
-                files=files,
-                cache_hit=True,
-                delta_used=False,
-                max_bytes_per_file=max_bytes_per_file,
-                total_bytes=len(str(cached_snapshot).encode("utf-8", errors="replace")),
-            )
-        if selected_files is not None:
-            files = selected_files
+        entries: Dict[Path, FileEntry] = dict(zip(to_read, resolved))
 
+        relevance: Dict[str, float] = {}
+        if selective_enabled:
+            by_rel = {p.relative_to(root).as_posix(): p for p in files}
+            ranking = index.relevance_index(entry.rel for entry in resolved).rank(task or "")
+            relevance = dict(ranking)
+            selected = select_ranked(ranking, list(by_rel), selective_min_files, selective_max_files)
+            files = [by_rel[rel] for rel in selected][:max_files]
+            kept = set(files)
+            index.drop_text(entry.rel for p, entry in entries.items() if p not in kept)
+            entries = {p: entries[p] for p in files if p in entries}
+            missing = [
+                p for p, entry in entries.items() if not index.is_fresh(entry.rel, *listing[p], int(max_bytes_per_file))
+            ]
+            if missing:
+                entries.update(
+                    zip(
+                        missing,
+                        index.get_entries(
+                            root,
+                            [(p, *listing[p]) for p in missing],
+                            int(max_bytes_per_file),
+                            workers=read_workers,
+                        ),
+                    )
+                )
+        read_sec = time.monotonic() - read_started
+        binary_skipped = sum(1 for entry in entries.values() if entry.binary)
+
+        budget_bytes = self._budget_bytes(snapshot_cfg)
+        packing: PackResult | None = None
+        limits: Dict[Path, int] = {}
         effective_max_bytes = int(max_bytes_per_file)
-        if max_total_bytes is not None and files:
-            per_file = int(max_total_bytes) // max(len(files), 1)
-            effective_max_bytes = max(256, min(effective_max_bytes, per_file))
-
-        lines: List[str] = []
-        lines.append(str(snapshot_cfg["workspace_header"]).format(root=root))
-        lines.append("")
-        lines.append(str(snapshot_cfg["files_header"]))
-        total_bytes = 0
-        for p in files:
-            rel = p.relative_to(root)
-            try:
-                size = p.stat().st_size
-            except OSError:
-                size = -1
-            lines.append(str(snapshot_cfg["file_line"]).format(rel=rel, size=size))
-
-        lines.append("")
-        lines.append(str(snapshot_cfg["content_header"]))
-        for p in files:
-            if p.suffix.lower() in skip_exts:
-                continue
-            rel = p.relative_to(root)
-            content = read_text_safe(p, limit_bytes=effective_max_bytes)
-            if not content.strip():
-                continue
-            header = str(snapshot_cfg["file_section_header"]).format(rel=rel)
-            lines.append(f"\n{header}\n")
-            lines.append(content)
-            total_bytes += len(content.encode("utf-8", errors="replace"))
-        snapshot_text = "\n".join(lines)
-
-        self._write_cache(root, files, cache_file, snapshot_text)
+        if budget_bytes is not None and files:
+            sized = [
+                (p, entry.rel, len(entry.text.encode("utf-8", errors="replace")))
+                for p in files
+                if (entry := entries.get(p)) is not None
+            ]
+            packing = pack_budget([(rel, size) for _, rel, size in sized], budget_bytes, scores=relevance)
+            limits = {p: packing.allocations[rel] for p, rel, _ in sized}
+            effective_max_bytes = max(limits.values(), default=0)
+
+        signature = self._hash_listing(root, files, listing)
+        changed = [p for p, entry in entries.items() if prev_digests.get(entry.rel) != entry.digest]
+        cache_hit = had_index and signature == prev_signature and not changed
+        delta_used = False
+        if delta_snapshot and had_index and not cache_hit:
+            files = changed
+            delta_used = True
+
+        sizes = {p: listing[p][1] for p in files}
+        snapshot_text, total_bytes = _render_snapshot(
+            root, snapshot_cfg, files, sizes, entries, limits, effective_max_bytes
+        )
+        views = SnapshotViews(root, snapshot_cfg, files, sizes, entries, relevance, limits, effective_max_bytes)
+
+        if cache_path is not None:
+            index.prune(p.relative_to(root).as_posix() for p in listing)
+            index.signature = signature
+            index.save(cache_path)
         return SnapshotResult(
             text=snapshot_text,
             files=files,
@@ -134,66 +187,155 @@ class WorkspaceSnapshotter(BaseSnapshotter):
             delta_used=delta_used,
             max_bytes_per_file=effective_max_bytes,
             total_bytes=total_bytes,
+            files_read=index.files_read,
+            files_reused=index.files_reused,
+            walk_sec=walk_sec,
+            read_sec=read_sec,
+            binary_skipped=binary_skipped,
+            relevance=relevance,
+            packing=packing,
+            views=views,
         )
 
-    def _apply_cache(
+    @staticmethod
+    def _budget_bytes(snapshot_cfg: Dict[str, object]) -> int | None:
+        """Snapshot content budget: the tighter of ``max_total_bytes`` and ``max_total_tokens``."""
+        budgets: List[int] = []
+        max_total_bytes = snapshot_cfg.get("max_total_bytes")
+        if max_total_bytes is not None:
+            budgets.append(int(max_total_bytes))
+        max_total_tokens = snapshot_cfg.get("max_total_tokens")
+        if max_total_tokens is not None:
+            token_chars = int(snapshot_cfg.get("token_chars") or DEFAULT_TOKEN_CHARS)
+            budgets.append(int(max_total_tokens) * max(1, token_chars))
+        return min(budgets) if budgets else None
+
+    @staticmethod
+    def _hash_listing(root: Path, files: List[Path], listing: Dict[Path, Tuple[int, int]]) -> str:
+        items = [f"{p.relative_to(root).as_posix()}:{listing[p][1]}" for p in files]
+        return hashlib.sha256("\n".join(items).encode("utf-8")).hexdigest()
+
+
+class SnapshotViews:
+    """
+    Filtered renderings of one snapshot for individual roles and shards.
+
+    All views share the file entries (and their cached term frequencies) of
+    the snapshot they were built from. A view keeps only files matching
+    ``allowed_paths``, orders them by relevance to ``query`` and packs their
+    contents into ``budget_chars``. Views are memoized, so role instances and
+    retries with the same parameters reuse the rendered text.
+    """
+
+    def __init__(
         self,
         root: Path,
+        snapshot_cfg: Dict[str, object],
         files: List[Path],
-        cache_file: object,
-        delta_snapshot: bool,
-    ) -> Tuple[bool, bool, List[Path] | None, str | None]:
-        if not cache_file:
-            return False, False, None, None
-        cache_path = root / str(cache_file)
-        cache = self._load_cache(cache_path)
-        current_index = self._build_file_index(root, files)
-        current_hash = self._hash_file_index(current_index)
-        if cache and cache.get("signature_hash") == current_hash and cache.get("snapshot"):
-            return True, False, files, str(cache.get("snapshot"))
-        if delta_snapshot and cache and cache.get("file_index"):
-            prev_index = cache.get("file_index", {})
-            changed = [
-                root / rel
-                for rel, meta in current_index.items()
-                if prev_index.get(rel) != meta
+        sizes: Dict[Path, int],
+        entries: Dict[Path, FileEntry],
+        scores: Dict[str, float] | None = None,
+        limits: Dict[Path, int] | None = None,
+        default_limit: int = DEFAULT_MAX_FILE_BYTES,
+    ) -> None:
+        self._root = root
+        self._snapshot_cfg = snapshot_cfg
+        self._files = list(files)
+        self._sizes = sizes
+        self._entries = entries
+        self._scores = dict(scores or {})
+        self._limits = dict(limits or {})
+        self._default_limit = default_limit
+        self._relevance: RelevanceIndex | None = None
+        self._cache: Dict[Tuple[str, Tuple[str, ...], int | None], str] = {}
+
+    def view(
+        self,
+        query: str | None = None,
+        allowed_paths: Sequence[str] | None = None,
+        budget_chars: int | None = None,
+    ) -> str:
+        key = (query or "", tuple(allowed_paths or ()), budget_chars)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        rels = {p: p.relative_to(self._root).as_posix() for p in self._files}
+        files = self._files
+        if allowed_paths and list(allowed_paths) != ["**"]:
+            patterns = list(allowed_paths)
+            files = [p for p in files if check_path_matches_globs(rels[p], patterns)]
+        scores = self._scores
+        if query:
+            if self._relevance is None:
+                self._relevance = RelevanceIndex.from_documents(
+                    {entry.rel: entry.terms for entry in self._entries.values()}
+                )
+            scores = dict(self._relevance.rank(query, candidates=(rels[p] for p in files)))
+            files = sorted(files, key=lambda p: -scores.get(rels[p], 0.0))
+
+        limits = self._limits
+        if budget_chars is not None:
+            listing_text, _ = _render_snapshot(self._root, self._snapshot_cfg, files, self._sizes, {}, {}, 0)
+            header_chars = sum(
+                len(str(self._snapshot_cfg["file_section_header"]).format(rel=p.relative_to(self._root))) + 4
+                for p in files
+                if p in self._entries
+            )
+            content_budget = max(0, budget_chars - len(listing_text) - header_chars)
+            items = [
+                (rels[p], len(self._entries[p].text.encode("utf-8", errors="replace")))
+                for p in files
+                if p in self._entries
             ]
-            return False, True, changed, None
-        return False, False, None, None
-
-    def _load_cache(self, path: Path) -> Dict[str, object]:
-        try:
-            return json.loads(path.read_text(encoding="utf-8"))
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def _write_cache(self, root: Path, files: List[Path], cache_file: object, snapshot: str) -> None:
-        if not cache_file:
-            return
-        cache_path = root / str(cache_file)
-        file_index = self._build_file_index(root, files)
-        payload = {
-            "signature_hash": self._hash_file_index(file_index),
-            "file_index": file_index,
-            "snapshot": snapshot,
-        }
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
-        cache_path.write_text(json.dumps(payload, ensure_ascii=True) + "\n", encoding="utf-8")
+            packing = pack_budget(items, content_budget, scores=scores)
+            limits = {p: packing.allocations[rels[p]] for p in files if p in self._entries}
+        text, _ = _render_snapshot(
+            self._root, self._snapshot_cfg, files, self._sizes, self._entries, limits, self._default_limit
+        )
+        self._cache[key] = text
+        return text
 
-    @staticmethod
-    def _build_file_index(root: Path, files: List[Path]) -> Dict[str, Tuple[int, int]]:
-        index: Dict[str, Tuple[int, int]] = {}
-        for p in files:
-            rel = p.relative_to(root).as_posix()
-            try:
-                stat = p.stat()
-                index[rel] = (int(stat.st_mtime), int(stat.st_size))
-            except OSError:
-                index[rel] = (0, 0)
-        return index
 
-    @staticmethod
-    def _hash_file_index(index: Dict[str, Tuple[int, int]]) -> str:
-        items = [f"{key}:{meta[0]}:{meta[1]}" for key, meta in sorted(index.items())]
-        digest = hashlib.sha256("\n".join(items).encode("utf-8")).hexdigest()
-        return digest
+def _render_snapshot(
+    root: Path,
+    snapshot_cfg: Dict[str, object],
+    files: List[Path],
+    sizes: Dict[Path, int],
+    entries: Dict[Path, FileEntry],
+    limits: Dict[Path, int],
+    default_limit: int,
+) -> Tuple[str, int]:
+    lines: List[str] = []
+    lines.append(str(snapshot_cfg["workspace_header"]).format(root=root))
+    lines.append("")
+    lines.append(str(snapshot_cfg["files_header"]))
+    total_bytes = 0
+    for p in files:
+        rel = p.relative_to(root)
+        lines.append(str(snapshot_cfg["file_line"]).format(rel=rel, size=sizes[p]))
+
+    lines.append("")
+    lines.append(str(snapshot_cfg["content_header"]))
+    for p in files:
+        entry = entries.get(p)
+        if entry is None:
+            continue
+        content = _clip_utf8(entry.text, limits.get(p, default_limit))
+        if not content.strip():
+            continue
+        rel = p.relative_to(root)
+        header = str(snapshot_cfg["file_section_header"]).format(rel=rel)
+        lines.append(f"\n{header}\n")
+        lines.append(content)
+        total_bytes += len(content.encode("utf-8", errors="replace"))
+    return "\n".join(lines), total_bytes
+
+
+def _clip_utf8(text: str, max_bytes: int) -> str:
+    """Cut ``text`` to at most ``max_bytes`` UTF-8 bytes without splitting a character."""
+    if len(text) * 4 <= max_bytes:
+        return text
+    encoded = text.encode("utf-8", errors="replace")
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode("utf-8", errors="ignore")
@@ -0,0 +1,189 @@
+"""Persistent per-file index backing incremental workspace snapshots."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .relevance import RelevanceIndex, document_terms
+from .utils import read_text_sniffed
+
+INDEX_VERSION = 5
+# Files modified this close to the last index write may share an mtime with a
+# later edit (coarse filesystem clocks); such "racy" entries are re-read.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+@dataclass
+class FileEntry:
+    rel: str
+    mtime_ns: int
+    size: int
+    digest: str
+    limit: int
+    # ``None`` once dropped: files only ranked, never rendered, keep terms and digest.
+    text: str | None
+    binary: bool = False
+    terms: Dict[str, int] = field(default_factory=dict)
+
+
+class SnapshotIndex:
+    """
+    Maps workspace-relative paths to their last read (truncated) content.
+
+    An entry is reused while the file's ``(mtime_ns, size)`` is unchanged and
+    it was read with a compatible byte limit, so unchanged files are never
+    re-read between snapshots.
+    """
+
+    def __init__(
+        self,
+        entries: Dict[str, FileEntry] | None = None,
+        written_ns: int = 0,
+        signature: str = "",
+    ) -> None:
+        self.entries: Dict[str, FileEntry] = dict(entries or {})
+        self.written_ns = written_ns
+        self.signature = signature
+        self.files_read = 0
+        self.files_reused = 0
+
+    @classmethod
+    def load(cls, path: Path | None) -> "SnapshotIndex":
+        if path is None:
+            return cls()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return cls()
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return cls()
+        entries: Dict[str, FileEntry] = {}
+        for rel, raw in (data.get("files") or {}).items():
+            try:
+                entries[rel] = FileEntry(
+                    rel=rel,
+                    mtime_ns=int(raw["mtime_ns"]),
+                    size=int(raw["size"]),
+                    digest=str(raw["digest"]),
+                    limit=int(raw["limit"]),
+                    text=None if raw["text"] is None else str(raw["text"]),
+                    binary=bool(raw.get("binary", False)),
+                    terms={str(term): int(freq) for term, freq in (raw.get("terms") or {}).items()},
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+        return cls(
+            entries,
+            written_ns=int(data.get("written_ns") or 0),
+            signature=str(data.get("signature") or ""),
+        )
+
+    def save(self, path: Path | None) -> None:
+        if path is None:
+            return
+        self.written_ns = time.time_ns()
+        payload = {
+            "version": INDEX_VERSION,
+            "written_ns": self.written_ns,
+            "signature": self.signature,
+            "files": {
+                rel: {key: value for key, value in asdict(entry).items() if key != "rel"}
+                for rel, entry in sorted(self.entries.items())
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=True) + "\n", encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def digests(self) -> Dict[str, str]:
+        return {rel: entry.digest for rel, entry in self.entries.items()}
+
+    def is_fresh(self, rel: str, mtime_ns: int, size: int, limit: int, need_text: bool = True) -> bool:
+        entry = self.entries.get(rel)
+        if entry is None or entry.mtime_ns != mtime_ns or entry.size != size:
+            return False
+        if self.written_ns and mtime_ns >= self.written_ns - RACY_WINDOW_NS:
+            return False
+        if not need_text:
+            # Terms only: any read of at least ``limit`` bytes will do.
+            return entry.limit >= limit or size <= entry.limit
+        if entry.text is None:
+            return False
+        return entry.limit == limit or size <= min(entry.limit, limit)
+
+    def get_entry(self, root: Path, path: Path, mtime_ns: int, size: int, limit: int) -> FileEntry:
+        return self.get_entries(root, [(path, mtime_ns, size)], limit)[0]
+
+    def get_entries(
+        self,
+        root: Path,
+        items: Sequence[Tuple[Path, int, int]],
+        limit: int,
+        workers: int = 1,
+        need_text: bool = True,
+    ) -> List[FileEntry]:
+        """
+        Resolve ``(path, mtime_ns, size)`` items to entries, in input order.
+
+        Stale files are read on a thread pool of ``workers`` threads (file I/O
+        releases the GIL, which matters most on network filesystems). With
+        ``need_text=False`` entries whose text was dropped are reused as well.
+        """
+        results: List[FileEntry | None] = []
+        stale: List[Tuple[int, str, Path, int, int]] = []
+        for path, mtime_ns, size in items:
+            rel = path.relative_to(root).as_posix()
+            if self.is_fresh(rel, mtime_ns, size, limit, need_text=need_text):
+                self.files_reused += 1
+                results.append(self.entries[rel])
+            else:
+                stale.append((len(results), rel, path, mtime_ns, size))
+                results.append(None)
+        if stale:
+            paths = [item[2] for item in stale]
+            if workers > 1 and len(stale) > 1:
+                with ThreadPoolExecutor(max_workers=min(workers, len(stale))) as pool:
+                    reads = list(pool.map(lambda p: read_text_sniffed(p, limit_bytes=limit), paths))
+            else:
+                reads = [read_text_sniffed(p, limit_bytes=limit) for p in paths]
+            for (pos, rel, _, mtime_ns, size), (text, binary) in zip(stale, reads):
+                entry = FileEntry(
+                    rel=rel,
+                    mtime_ns=mtime_ns,
+                    size=size,
+                    digest=hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest(),
+                    limit=limit,
+                    text=text,
+                    binary=binary,
+                    terms=document_terms(rel, text),
+                )
+                self.entries[rel] = entry
+                results[pos] = entry
+            self.files_read += len(stale)
+        return [entry for entry in results if entry is not None]
+
+    def relevance_index(self, rels: Iterable[str]) -> RelevanceIndex:
+        """BM25 index over the cached term frequencies of ``rels``."""
+        return RelevanceIndex.from_documents(
+            {rel: self.entries[rel].terms for rel in rels if rel in self.entries}
+        )
+
+    def drop_text(self, rels: Iterable[str]) -> None:
+        """Forget the content of ``rels``; terms and digest stay for ranking and change detection."""
+        for rel in rels:
+            entry = self.entries.get(rel)
+            if entry is not None:
+                entry.text = None
+
+    def prune(self, keep: Iterable[str]) -> None:
+        """Drop entries for files that no longer exist in the workspace."""
+        keep_set = set(keep)
+        for rel in [rel for rel in self.entries if rel not in keep_set]:
+            del self.entries[rel]
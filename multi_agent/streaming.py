@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 import asyncio
+import codecs
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import AsyncIterator, Callable, List
+from typing import AsyncIterator, Awaitable, Callable, List
 
+from .token_counting import TokenCounter
 from .utils import estimate_tokens
 
+# Bytes per read from a provider pipe; also the longest partial line held back.
+READ_CHUNK_BYTES = 64 * 1024
+DEFAULT_REFRESH_RATE_HZ = 4
+
 
 @dataclass(frozen=True)
 class StreamChunk:
@@ -24,26 +30,19 @@ class StreamCancelled(RuntimeError):
 
 
 ProgressCallback = Callable[[str, int, float], None]
-TokenCounter = Callable[[str], int]
-
-
-def build_token_counter(mode: str, token_chars: int, model: str | None = None) -> TokenCounter:
-    mode = (mode or "heuristic").strip().lower()
-    if mode in {"tiktoken", "auto"}:
-        try:
-            import tiktoken  # type: ignore[import-not-found]
-        except Exception:
-            return lambda text: estimate_tokens(text, token_chars)
-        try:
-            encoding = tiktoken.encoding_for_model(model or "gpt-4")
-        except Exception:
-            encoding = tiktoken.get_encoding("cl100k_base")
-        return lambda text: len(encoding.encode(text))
-    return lambda text: estimate_tokens(text, token_chars)
 
 
 class StreamingClient:
-    """Handles real-time output streaming from CLI providers."""
+    """
+    Handles real-time output streaming from CLI providers.
+
+    Output is read in fixed-size chunks rather than line by line, so a single
+    huge line cannot overrun the stream buffer. Each chunk yields the complete
+    lines it finished as one :class:`StreamChunk`; a partial line is held back
+    until its newline arrives or it exceeds ``read_chunk_bytes``. Progress
+    callbacks are coalesced to at most ``refresh_rate_hz`` per second; output
+    held back by the rate limit is flushed by a timer, not by the next chunk.
+    """
 
     def __init__(
         self,
@@ -53,12 +52,19 @@ class StreamingClient:
         token_chars: int = 4,
         encoding: str = "utf-8",
         errors: str = "replace",
+        refresh_rate_hz: float = DEFAULT_REFRESH_RATE_HZ,
+        read_chunk_bytes: int = READ_CHUNK_BYTES,
     ) -> None:
         self.progress_callback = progress_callback
         self.token_counter = token_counter or (lambda text: estimate_tokens(text, token_chars))
         self.cancel_event = cancel_event
         self.encoding = encoding
         self.errors = errors
+        self.refresh_interval = 1.0 / refresh_rate_hz if refresh_rate_hz and refresh_rate_hz > 0 else 0.0
+        self.read_chunk_bytes = max(1, int(read_chunk_bytes))
+        self._pending_progress: List[str] = []
+        self._last_progress = 0.0
+        self._progress_handle: asyncio.TimerHandle | None = None
         self.token_count = 0
         self.start_time = 0.0
         self.returncode: int | None = None
@@ -69,88 +75,94 @@ class StreamingClient:
         input_text: str | None,
         timeout: int | None = None,
         workdir: Path | None = None,
+        spawn: Callable[[], Awaitable[asyncio.subprocess.Process]] | None = None,
     ) -> AsyncIterator[StreamChunk]:
         self.start_time = time.monotonic()
         self.token_count = 0
         self.returncode = None
-
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdin=asyncio.subprocess.PIPE if input_text is not None else None,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=str(workdir) if workdir else None,
-        )
+        self._pending_progress = []
+        self._last_progress = float("-inf")
+
+        if spawn is not None:
+            # Pre-spawned process: stdin is always a pipe and must be closed.
+            proc = await spawn()
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if input_text is not None else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(workdir) if workdir else None,
+            )
 
         stdout_task: asyncio.Task | None = None
         stderr_task: asyncio.Task | None = None
+        cancel_watcher: asyncio.Task | None = None
+        timeout_handle: asyncio.TimerHandle | None = None
+        deadline = self.start_time + timeout if timeout is not None else None
         sentinel = object()
+        # Wake-up markers: cancellation and timeout are delivered through the
+        # same queue as the output, so the loop only ever awaits queue.get().
+        cancelled = object()
+        timed_out = object()
         queue: asyncio.Queue[object] = asyncio.Queue()
 
+        async def _watch_cancel(event: asyncio.Event) -> None:
+            await event.wait()
+            queue.put_nowait(cancelled)
+
         async def _pump(stream: asyncio.StreamReader, source: str) -> None:
+            decoder = codecs.getincrementaldecoder(self.encoding)(errors=self.errors)
+            partial = ""
             try:
                 while True:
-                    line = await stream.readline()
-                    if not line:
+                    data = await stream.read(self.read_chunk_bytes)
+                    if not data:
                         break
-                    text = line.decode(self.encoding, errors=self.errors)
-                    self.token_count += self.token_counter(text)
-                    elapsed = time.monotonic() - self.start_time
-                    if self.progress_callback:
-                        self.progress_callback(text, self.token_count, elapsed)
-                    await queue.put(StreamChunk(source=source, text=text))
+                    text = partial + decoder.decode(data)
+                    cut = text.rfind("\n") + 1
+                    if cut == 0 and len(text) >= self.read_chunk_bytes:
+                        cut = len(text)
+                    partial = text[cut:]
+                    if cut:
+                        await self._emit(queue, source, text[:cut])
+                rest = partial + decoder.decode(b"", final=True)
+                if rest:
+                    await self._emit(queue, source, rest)
             finally:
                 await queue.put((source, sentinel))
 
         try:
-            if input_text is not None and proc.stdin:
-                proc.stdin.write(input_text.encode(self.encoding, errors=self.errors))
-                await proc.stdin.drain()
+            if proc.stdin:
+                if input_text is not None:
+                    proc.stdin.write(input_text.encode(self.encoding, errors=self.errors))
+                    await proc.stdin.drain()
                 proc.stdin.close()
 
             stdout_task = asyncio.create_task(_pump(proc.stdout, "stdout"))
             stderr_task = asyncio.create_task(_pump(proc.stderr, "stderr"))
 
+            if self.cancel_event is not None:
+                cancel_watcher = asyncio.create_task(_watch_cancel(self.cancel_event))
+            if deadline is not None:
+                timeout_handle = asyncio.get_running_loop().call_later(
+                    max(0.0, deadline - time.monotonic()),
+                    queue.put_nowait,
+                    timed_out,
+                )
+
             finished = 0
             while finished < 2:
-                if timeout is not None:
-                    remaining = timeout - (time.monotonic() - self.start_time)
-                    if remaining <= 0:
-                        raise StreamTimeout("Timeout")
-                else:
-                    remaining = None
-
-                if self.cancel_event is not None:
-                    if self.cancel_event.is_set():
-                        raise StreamCancelled("Cancelled by user")
-                    queue_task = asyncio.create_task(queue.get())
-                    cancel_task = asyncio.create_task(self.cancel_event.wait())
-                    pending: set[asyncio.Task] = set()
-                    try:
-                        done, pending = await asyncio.wait(
-                            {queue_task, cancel_task},
-                            timeout=remaining,
-                            return_when=asyncio.FIRST_COMPLETED,
-                        )
-                    finally:
-                        for task in pending:
-                            task.cancel()
-                        if pending:
-                            await asyncio.gather(*pending, return_exceptions=True)
-                    if cancel_task in done:
-                        raise StreamCancelled("Cancelled by user")
-                    if queue_task in done:
-                        item = queue_task.result()
-                    else:
-                        raise StreamTimeout("Timeout")
-                else:
-                    if remaining is not None:
-                        try:
-                            item = await asyncio.wait_for(queue.get(), timeout=remaining)
-                        except asyncio.TimeoutError as exc:
-                            raise StreamTimeout("Timeout") from exc
-                    else:
-                        item = await queue.get()
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise StreamCancelled("Cancelled by user")
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise StreamTimeout("Timeout")
+
+                item = await queue.get()
+                if item is cancelled:
+                    raise StreamCancelled("Cancelled by user")
+                if item is timed_out:
+                    raise StreamTimeout("Timeout")
 
                 if isinstance(item, tuple) and len(item) == 2 and item[1] is sentinel:
                     finished += 1
@@ -163,6 +175,10 @@ class StreamingClient:
                 await stdout_task
             if stderr_task:
                 await stderr_task
+            flush_tokens = getattr(self.token_counter, "flush", None)
+            if flush_tokens is not None:
+                self.token_count += flush_tokens()
+            self._flush_progress(final=True)
             self.returncode = await proc.wait()
         except (StreamTimeout, StreamCancelled):
             try:
@@ -172,6 +188,36 @@ class StreamingClient:
             await proc.wait()
             raise
         finally:
-            for task in (stdout_task, stderr_task):
+            if timeout_handle is not None:
+                timeout_handle.cancel()
+            self._cancel_progress_timer()
+            for task in (stdout_task, stderr_task, cancel_watcher):
                 if task and not task.done():
                     task.cancel()
+
+    async def _emit(self, queue: asyncio.Queue[object], source: str, text: str) -> None:
+        self.token_count += self.token_counter(text)
+        if self.progress_callback:
+            self._pending_progress.append(text)
+            wait = self._last_progress + self.refresh_interval - time.monotonic()
+            if wait <= 0:
+                self._flush_progress()
+            elif self._progress_handle is None:
+                # Output may stall for long: deliver what is pending once the interval is up.
+                self._progress_handle = asyncio.get_running_loop().call_later(wait, self._flush_progress)
+        await queue.put(StreamChunk(source=source, text=text))
+
+    def _cancel_progress_timer(self) -> None:
+        if self._progress_handle is not None:
+            self._progress_handle.cancel()
+            self._progress_handle = None
+
+    def _flush_progress(self, final: bool = False) -> None:
+        self._cancel_progress_timer()
+        if not self.progress_callback or not (self._pending_progress or final):
+            return
+        text = "".join(self._pending_progress)
+        self._pending_progress = []
+        now = time.monotonic()
+        self._last_progress = now
+        self.progress_callback(text, self.token_count, now - self.start_time)
@@ -6,7 +6,7 @@ import re
 import subprocess
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Callable, Dict, Iterable, List, Tuple
 
 from .utils import estimate_tokens, now_stamp, truncate_text, write_text
 
@@ -53,7 +53,11 @@ def build_split_id(task_source: str, task_text: str) -> str:
     return f"{slug}_{digest}"
 
 
-def needs_split(task_text: str, split_cfg: Dict[str, object]) -> bool:
+def needs_split(
+    task_text: str,
+    split_cfg: Dict[str, object],
+    token_counter: Callable[[str], int] | None = None,
+) -> bool:
     text = (task_text or "").strip()
     if not text:
         return False
@@ -62,8 +66,11 @@ def needs_split(task_text: str, split_cfg: Dict[str, object]) -> bool:
     max_headings = int(split_cfg.get("heuristic_max_headings", 8) or 8)
     heading_level = int(split_cfg.get("heading_level", 2) or 2)
     heading_count = len(extract_headings(text, heading_level))
-    token_chars = int(split_cfg.get("heuristic_token_chars", 4) or 4)
-    token_estimate = estimate_tokens(text, token_chars)
+    if token_counter is None:
+        token_chars = int(split_cfg.get("heuristic_token_chars", 4) or 4)
+        token_estimate = estimate_tokens(text, token_chars)
+    else:
+        token_estimate = token_counter(text)
     if max_chars > 0 and len(text) > max_chars:
         return True
     if max_tokens > 0 and token_estimate > max_tokens:
@@ -0,0 +1,246 @@
+"""Process-wide token counters keyed by tokenizer backend and model."""
+from __future__ import annotations
+
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Mapping, Sequence
+
+from .utils import estimate_tokens
+
+if TYPE_CHECKING:
+    from .prompt_template import PromptTemplate
+
+TokenCounter = Callable[[str], int]
+Encoder = Callable[[str], Sequence[int]]
+# (model, tokenizer_file) -> encoder, or None when the backend is unavailable.
+TokenizerBackend = Callable[[str | None, str | None], Encoder | None]
+
+DEFAULT_TOKENIZER_MODEL = "gpt-4"
+FALLBACK_ENCODING = "cl100k_base"
+# Buffered characters before an exact (tokenizer) recount of streamed text.
+TOKEN_FLUSH_CHARS = 32 * 1024
+# Memoized fragments per FragmentTokenCounter.
+FRAGMENT_CACHE_ENTRIES = 1024
+
+
+def _tiktoken_backend(model: str | None, tokenizer_file: str | None) -> Encoder | None:
+    try:
+        import tiktoken  # type: ignore[import-not-found]
+    except Exception:
+        return None
+    try:
+        encoding = tiktoken.encoding_for_model(model or DEFAULT_TOKENIZER_MODEL)
+    except Exception:
+        try:
+            encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+        except Exception:
+            # BPE files are downloaded on first use: offline means heuristic counting.
+            return None
+    return encoding.encode_ordinary
+
+
+def _tokenizer_file_backend(model: str | None, tokenizer_file: str | None) -> Encoder | None:
+    """Local ``tokenizer.json`` (HuggingFace ``tokenizers``, optional dependency)."""
+    if not tokenizer_file:
+        return None
+    path = Path(tokenizer_file).expanduser()
+    if not path.is_file():
+        return None
+    try:
+        from tokenizers import Tokenizer  # type: ignore[import-not-found]
+    except Exception:
+        return None
+    try:
+        tokenizer = Tokenizer.from_file(str(path))
+    except Exception:
+        return None
+    return lambda text: tokenizer.encode(text, add_special_tokens=False).ids
+
+
+def _auto_backend(model: str | None, tokenizer_file: str | None) -> Encoder | None:
+    return _tokenizer_file_backend(model, tokenizer_file) or _tiktoken_backend(model, tokenizer_file)
+
+
+TOKENIZER_BACKENDS: Dict[str, TokenizerBackend] = {
+    "heuristic": lambda model, tokenizer_file: None,
+    "tiktoken": _tiktoken_backend,
+    "tokenizer_file": _tokenizer_file_backend,
+    "auto": _auto_backend,
+}
+
+
+def register_tokenizer_backend(name: str, backend: TokenizerBackend) -> None:
+    """Make ``backend`` selectable as ``token_counting: <name>``."""
+    TOKENIZER_BACKENDS[normalize_mode(name)] = backend
+    get_encoder.cache_clear()
+    get_token_counter.cache_clear()
+    get_fragment_counter.cache_clear()
+
+
+def normalize_mode(mode: str | None) -> str:
+    return (mode or "heuristic").strip().lower()
+
+
+def resolve_tokenizer(limits: Mapping[str, object], model: str | None, default_mode: str = "auto") -> tuple[str, str | None]:
+    """
+    ``(mode, tokenizer_file)`` from a ``prompt_limits``-style section.
+
+    ``model_tokenizer_files`` maps model names to local tokenizer files and
+    takes precedence over the global ``tokenizer_file``.
+    """
+    mode = normalize_mode(str(limits.get("token_counting") or default_mode))
+    per_model = limits.get("model_tokenizer_files") or {}
+    tokenizer_file = per_model.get(model or "") if isinstance(per_model, Mapping) else None
+    tokenizer_file = tokenizer_file or limits.get("tokenizer_file") or None
+    return mode, str(tokenizer_file) if tokenizer_file else None
+
+
+@lru_cache(maxsize=None)
+def get_encoder(mode: str, model: str | None = None, tokenizer_file: str | None = None) -> Encoder | None:
+    """
+    Encoder of the ``mode`` backend for ``model``, or ``None``.
+
+    ``None`` means heuristic counting: the mode asks for it, is unknown, or
+    its tokenizer is not installed. Backends are loaded once per
+    (mode, model, tokenizer_file) for the whole process.
+    """
+    backend = TOKENIZER_BACKENDS.get(normalize_mode(mode))
+    if backend is None:
+        return None
+    return backend(model or None, tokenizer_file or None)
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(
+    mode: str,
+    model: str | None = None,
+    token_chars: int = 4,
+    tokenizer_file: str | None = None,
+) -> TokenCounter:
+    """Stateless counter for whole texts (prompts), shared across instances and retries."""
+    encode = get_encoder(normalize_mode(mode), model or None, tokenizer_file or None)
+    if encode is None:
+        return lambda text: estimate_tokens(text, token_chars)
+    return lambda text: len(encode(text)) if text else 0
+
+
+class FragmentTokenCounter:
+    """
+    Exact token counts for prompts, memoized per fragment.
+
+    A prompt is counted as the sum of its parts (prefix, template literals,
+    placeholder values), each tokenized once and cached by a digest of its
+    text, so large fragments (file contents) are not kept alive. While a
+    prompt is fitted to its budget only the fragments that actually changed
+    are re-tokenized. Tokens merging across a fragment boundary can make the
+    sum differ from a full encode by a few tokens per fragment.
+    """
+
+    def __init__(self, count: TokenCounter, max_entries: int = FRAGMENT_CACHE_ENTRIES) -> None:
+        self._count = count
+        self._max_entries = max(1, int(max_entries))
+        self._memo: Dict[bytes, int] = {}
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        cached = self._memo.get(key)
+        if cached is None:
+            cached = self._count(text)
+            if len(self._memo) >= self._max_entries:
+                del self._memo[next(iter(self._memo))]
+            self._memo[key] = cached
+        return cached
+
+    def count_prompt(self, prefix: str, template: "PromptTemplate", context: Mapping[str, object]) -> int:
+        total = self.count(prefix)
+        total += sum(self.count(literal) for literal in template.literals)
+        total += sum(self.count(text) for text in template.field_texts(context))
+        return total
+
+
+@lru_cache(maxsize=None)
+def get_fragment_counter(
+    mode: str,
+    model: str | None = None,
+    tokenizer_file: str | None = None,
+) -> FragmentTokenCounter | None:
+    """Shared fragment counter for an exact backend; ``None`` for the heuristic."""
+    encode = get_encoder(normalize_mode(mode), model or None, tokenizer_file or None)
+    if encode is None:
+        return None
+    return FragmentTokenCounter(lambda text: len(encode(text)))
+
+
+class IncrementalTokenCounter:
+    """
+    Token counter for streamed text that calls the tokenizer in batches.
+
+    Each call returns the number of tokens added by ``text``. Text is buffered
+    and counted with the heuristic until ``flush_chars`` have accumulated;
+    the buffer up to its last newline is then encoded in one call and the
+    difference to the estimate is returned as a correction. Encoding whole
+    lines also avoids miscounting tokens that straddle a chunk boundary.
+    :meth:`flush` encodes whatever is left at the end of the stream.
+    """
+
+    def __init__(
+        self,
+        encode: Encoder,
+        token_chars: int = 4,
+        flush_chars: int = TOKEN_FLUSH_CHARS,
+    ) -> None:
+        self._encode = encode
+        self._token_chars = token_chars
+        self._flush_chars = max(1, int(flush_chars))
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._estimated = 0
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        estimate = estimate_tokens(text, self._token_chars)
+        self._estimated += estimate
+        if self._buffered_chars < self._flush_chars:
+            return estimate
+        pending = "".join(self._buffer)
+        cut = pending.rfind("\n") + 1 or len(pending)
+        head, rest = pending[:cut], pending[cut:]
+        rest_estimate = estimate_tokens(rest, self._token_chars)
+        correction = len(self._encode(head)) - (self._estimated - rest_estimate)
+        self._buffer = [rest] if rest else []
+        self._buffered_chars = len(rest)
+        self._estimated = rest_estimate
+        return estimate + correction
+
+    def flush(self) -> int:
+        """Encode the remaining buffer and return the correction to the estimate."""
+        pending = "".join(self._buffer)
+        correction = len(self._encode(pending)) - self._estimated if pending else -self._estimated
+        self._buffer = []
+        self._buffered_chars = 0
+        self._estimated = 0
+        return correction
+
+
+def build_token_counter(
+    mode: str,
+    token_chars: int,
+    model: str | None = None,
+    tokenizer_file: str | None = None,
+) -> TokenCounter:
+    """
+    Counter for one output stream.
+
+    Incremental counters keep per-stream state, so a fresh one is returned on
+    every call; the encoding behind it comes from the shared registry.
+    """
+    encode = get_encoder(normalize_mode(mode), model or None, tokenizer_file or None)
+    if encode is None:
+        return get_token_counter("heuristic", None, token_chars)
+    return IncrementalTokenCounter(encode, token_chars=token_chars)
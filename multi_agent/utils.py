@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import codecs
 import math
+import mmap
 import os
 import re
 import shlex
@@ -18,13 +20,53 @@ def write_text(path: Path, content: str) -> None:
     path.write_text(content, encoding="utf-8")
 
 
+BINARY_SNIFF_BYTES = 8192
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+_TEXT_CONTROL_BYTES = frozenset(b"\t\n\r\f\b\x1b")
+
+
+def looks_binary(block: bytes) -> bool:
+    """Heuristik wie bei git/grep: NUL-Bytes oder viele Steuerzeichen => binaer."""
+    if not block:
+        return False
+    if b"\0" in block:
+        return True
+    control = sum(1 for byte in block if byte < 32 and byte not in _TEXT_CONTROL_BYTES)
+    return control / len(block) > 0.3
+
+
+def read_text_sniffed(path: Path, limit_bytes: int) -> Tuple[str, bool]:
+    """
+    Liest hoechstens ``limit_bytes`` einer Datei als Text.
+
+    Gibt ``(text, is_binary)`` zurueck; Binaerdateien liefern leeren Text.
+    Grosse Dateien werden per ``mmap`` gelesen, damit nur der benoetigte
+    Anfang in den Speicher kommt. Ein am Limit abgeschnittenes
+    UTF-8-Zeichen wird verworfen statt als Ersatzzeichen ausgegeben.
+    """
+    limit_bytes = max(0, int(limit_bytes))
+    try:
+        with open(path, "rb") as handle:
+            size = os.fstat(handle.fileno()).st_size
+            if size == 0 or limit_bytes == 0:
+                return "", False
+            if size > MMAP_THRESHOLD_BYTES and size > limit_bytes:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if looks_binary(mapped[:BINARY_SNIFF_BYTES]):
+                        return "", True
+                    data = mapped[:limit_bytes]
+            else:
+                data = handle.read(limit_bytes)
+                if looks_binary(data[:BINARY_SNIFF_BYTES]):
+                    return "", True
+    except (OSError, ValueError):
+        return "", False
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return decoder.decode(data, final=len(data) >= size), False
+
+
 def read_text_safe(path: Path, limit_bytes: int) -> str:
-    if not path.exists() or not path.is_file():
-        return ""
-    data = path.read_bytes()
-    if len(data) > limit_bytes:
-        data = data[:limit_bytes]
-    return data.decode("utf-8", errors="replace")
+    return read_text_sniffed(path, limit_bytes)[0]
 
 
 def parse_cmd(raw_cmd: str) -> List[str]:
@@ -121,23 +163,3 @@ def validate_output_sections(text: str, expected_sections: Iterable[str]) -> Tup
         if section and section not in text:
             missing.append(section)
     return len(missing) == 0, missing
-
-
-def select_relevant_files(
-    task: str,
-    files: Iterable[Path],
-    min_files: int,
-    max_files: int,
-) -> List[Path]:
-    tokens = [t for t in re.split(r"[^A-Za-z0-9_./-]+", task or "") if len(t) >= 3]
-    lowered = [t.lower() for t in tokens]
-    if not lowered:
-        return list(files)
-    matches: List[Path] = []
-    for path in files:
-        rel = path.as_posix().lower()
-        if any(tok in rel for tok in lowered):
-            matches.append(path)
-    if len(matches) < min_files:
-        return list(files)
-    return matches[:max_files]
@@ -0,0 +1,216 @@
+"""Workspace file discovery with traversal-time pruning."""
+from __future__ import annotations
+
+import os
+import re
+import stat
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+FileListing = Dict[Path, Tuple[int, int]]
+
+
+@dataclass(frozen=True)
+class _IgnoreRule:
+    base: str
+    pattern: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+    basename_only: bool
+
+
+def _glob_to_regex(glob: str) -> str:
+    parts: List[str] = []
+    idx = 0
+    while idx < len(glob):
+        char = glob[idx]
+        if glob.startswith("**/", idx):
+            parts.append("(?:.*/)?")
+            idx += 3
+            continue
+        if glob.startswith("/**", idx) and idx + 3 == len(glob):
+            parts.append("/.*")
+            idx += 3
+            continue
+        if glob.startswith("**", idx):
+            parts.append(".*")
+            idx += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = glob.find("]", idx + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = glob[idx + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                idx = end
+        else:
+            parts.append(re.escape(char))
+        idx += 1
+    return "".join(parts)
+
+
+class GitIgnore:
+    """
+    Minimal ``.gitignore`` matcher.
+
+    Supports comments, negation (``!``), directory-only patterns (trailing
+    ``/``), anchored patterns (containing ``/``) and ``**``. Rules from nested
+    ``.gitignore`` files apply relative to their directory; the last matching
+    rule wins, as in git.
+    """
+
+    def __init__(self) -> None:
+        self._rules: List[_IgnoreRule] = []
+
+    def add_file(self, path: Path, base: str) -> None:
+        try:
+            raw = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return
+        self.add_lines(raw.splitlines(), base)
+
+    def add_lines(self, lines: Iterable[str], base: str = "") -> None:
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            basename_only = "/" not in line
+            line = line.lstrip("/")
+            self._rules.append(
+                _IgnoreRule(
+                    base=base,
+                    pattern=re.compile(_glob_to_regex(line) + r"\Z"),
+                    negate=negate,
+                    dir_only=dir_only,
+                    basename_only=basename_only,
+                )
+            )
+
+    def is_ignored(self, rel: str, is_dir: bool) -> bool:
+        ignored = False
+        for rule in self._rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.base:
+                prefix = rule.base + "/"
+                if not rel.startswith(prefix):
+                    continue
+                candidate = rel[len(prefix) :]
+            else:
+                candidate = rel
+            if rule.basename_only:
+                candidate = candidate.rsplit("/", 1)[-1]
+            if rule.pattern.match(candidate):
+                ignored = not rule.negate
+        return ignored
+
+
+def walk_workspace(
+    root: Path,
+    skip_dirs: Iterable[str],
+    exclude: Iterable[Path] = (),
+    respect_gitignore: bool = True,
+    use_git: bool = False,
+) -> FileListing:
+    """
+    List regular files below ``root`` as ``path -> (mtime_ns, size)``.
+
+    Directories named in ``skip_dirs`` (and, optionally, ignored by
+    ``.gitignore``) are pruned before descending. With ``use_git`` the file
+    list comes from ``git ls-files`` when ``root`` is inside a git work tree;
+    otherwise an ``os.scandir`` walk is used.
+    """
+    skip = set(skip_dirs)
+    excluded = set(exclude)
+    if use_git:
+        listing = _walk_git(root, skip, excluded)
+        if listing is not None:
+            return listing
+    return _walk_scandir(root, skip, excluded, respect_gitignore)
+
+
+def _walk_scandir(root: Path, skip_dirs: set[str], exclude: set[Path], respect_gitignore: bool) -> FileListing:
+    listing: FileListing = {}
+    ignore = GitIgnore() if respect_gitignore else None
+    stack: List[Tuple[str, str]] = [(str(root), "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        if ignore is not None:
+            gitignore_path = os.path.join(dir_path, ".gitignore")
+            if os.path.isfile(gitignore_path):
+                ignore.add_file(Path(gitignore_path), rel_dir)
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in skip_dirs:
+                        continue
+                    if ignore is not None and ignore.is_ignored(rel, is_dir=True):
+                        continue
+                    stack.append((entry.path, rel))
+                    continue
+                if ignore is not None and ignore.is_ignored(rel, is_dir=False):
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            path = Path(entry.path)
+            if path in exclude:
+                continue
+            listing[path] = (st.st_mtime_ns, st.st_size)
+    return listing
+
+
+def _walk_git(root: Path, skip_dirs: set[str], exclude: set[Path]) -> FileListing | None:
+    try:
+        proc = subprocess.run(
+            ["git", "-C", str(root), "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True,
+            check=False,
+        )
+    except (OSError, ValueError):
+        return None
+    if proc.returncode != 0:
+        return None
+    listing: FileListing = {}
+    for raw in proc.stdout.split(b"\0"):
+        if not raw:
+            continue
+        rel = os.fsdecode(raw)
+        if skip_dirs.intersection(rel.split("/")[:-1]):
+            continue
+        path = root / rel
+        if path in exclude:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            listing[path] = (st.st_mtime_ns, st.st_size)
+    return listing
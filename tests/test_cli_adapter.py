@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from multi_agent.cli_adapter import CLIAdapter, load_cli_adapter
+from multi_agent.config_loader import load_app_config
+
+CLI_CONFIG = {
+    "cli_providers": {
+        "codex": {
+            "env_var": "TEST_CODEX_CMD",
+            "default_cmd": ["codex", "exec", "-"],
+            "parameters": {"model": {"flag": "--model", "type": "string"}},
+        }
+    },
+    "default_provider": "codex",
+    "timeout_multiplier": {"codex": 1.5},
+}
+
+
+class CLIAdapterCacheTest(unittest.TestCase):
+    def test_adapter_is_shared_until_file_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cli_config.json"
+            path.write_text(json.dumps(CLI_CONFIG), encoding="utf-8")
+            first = load_cli_adapter(path)
+            self.assertIs(first, load_cli_adapter(path))
+            changed = dict(CLI_CONFIG, default_provider="other")
+            path.write_text(json.dumps(changed, indent=2), encoding="utf-8")
+            self.assertIsNot(first, load_cli_adapter(path))
+
+    def test_role_commands_are_rendered_once_per_combination(self) -> None:
+        adapter = CLIAdapter(Path("unused.json"), CLI_CONFIG)
+        provider = adapter.get_provider("codex")
+        with mock.patch.object(provider, "build_command", wraps=provider.build_command) as build:
+            first = adapter.build_command_for_role("codex", None, model="gpt-4o", timeout_sec=60)
+            first[0].append("mutated")
+            second = adapter.build_command_for_role("codex", None, model="gpt-4o", timeout_sec=60)
+            adapter.build_command_for_role("codex", None, model="gpt-4.1", timeout_sec=60)
+            with mock.patch.dict(os.environ, {"TEST_CODEX_CMD": "my-codex -"}):
+                override = adapter.build_command_for_role("codex", None, model="gpt-4o", timeout_sec=60)
+        self.assertEqual(second, (["codex", "exec", "-", "--model", "gpt-4o"], None, 1.5))
+        self.assertEqual(override[0], ["my-codex", "-", "--model", "gpt-4o"])
+        self.assertEqual(build.call_count, 3)
+
+    def test_app_config_carries_the_adapter(self) -> None:
+        family = Path(__file__).resolve().parents[1] / "agent_families"
+        config_path = next(iter(sorted(family.glob("*_main.json"))), None)
+        if config_path is None:
+            self.skipTest("keine Familien-Konfiguration gefunden")
+        cfg = load_app_config(config_path)
+        self.assertIsNotNone(cfg.cli_adapter)
+        self.assertEqual(set(cfg.cli_adapter.list_providers()), set(cfg.cli_providers))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from multi_agent.context_store import MAX_LAYERS, ContextStore
+
+
+class ContextStoreTest(unittest.TestCase):
+    def test_overlay_is_isolated_from_store(self) -> None:
+        store = ContextStore({"task": "t", "architect_output": "A" * 1000})
+        local = store.overlay({"role_id": "impl"})
+        local["task"] = "shard"
+        self.assertEqual(local["task"], "shard")
+        self.assertEqual(store["task"], "t")
+        self.assertIs(local["architect_output"], store["architect_output"])
+        self.assertNotIn("role_id", store)
+
+    def test_versions_are_immutable(self) -> None:
+        store = ContextStore({"task": "t"})
+        before = store.current
+        version = store.update({"reviewer_output": "ok"})
+        self.assertEqual(version, 1)
+        self.assertNotIn("reviewer_output", before)
+        self.assertEqual(store["reviewer_output"], "ok")
+        with self.assertRaises(TypeError):
+            store.current["task"] = "x"  # type: ignore[index]
+
+    def test_layers_are_compacted(self) -> None:
+        store = ContextStore({"task": "t"})
+        for idx in range(MAX_LAYERS * 2):
+            store.update({"counter": str(idx), f"key{idx}": "v"})
+        self.assertEqual(store["counter"], str(MAX_LAYERS * 2 - 1))
+        self.assertEqual(store["task"], "t")
+        self.assertEqual(len(store), 2 + MAX_LAYERS * 2)
+        self.assertLessEqual(len(store.current.maps), MAX_LAYERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
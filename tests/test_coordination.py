@@ -0,0 +1,386 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from types import SimpleNamespace
+from unittest import mock
+
+from multi_agent.coordination import CoordinationLog, TaskBoard, fcntl, load_task_board
+from multi_agent.pipeline import Pipeline
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# One updater process of the lock benchmark: waits for the start file, then
+# writes through its own board (compact_every=1: every update takes the lock).
+_BOARD_UPDATER = """
+import asyncio, sys, time
+from pathlib import Path
+from multi_agent.coordination import TaskBoard
+
+path, mode, worker, updates, start = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]), Path(sys.argv[5])
+
+async def main():
+    board = TaskBoard(Path(path), mode, lock_timeout_sec=120, compact_every=1)
+    while not start.exists():
+        time.sleep(0.001)
+    for step in range(updates):
+        await board.update_task("task#" + worker, {"step": step})
+
+asyncio.run(main())
+"""
+
+
+class TaskBoardTest(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_are_journaled_and_compacted(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            board = TaskBoard(path, lock_mode="file_lock", lock_timeout_sec=5, compact_every=3)
+            await board.initialize([{"id": "arch#1", "status": "pending"}, {"id": "impl#1", "status": "pending"}])
+            await board.update_task("arch#1", {"status": "in_progress", "claimed_by": "arch#1"})
+            await board.update_task("extra#1", {"status": "skipped"})
+
+            snapshot = json.loads(path.read_text(encoding="utf-8"))
+            self.assertEqual(snapshot["version"], 1)
+            self.assertEqual(snapshot["tasks"][0]["status"], "pending")
+            journal = TaskBoard.journal_path(path).read_text(encoding="utf-8").splitlines()
+            self.assertEqual(json.loads(journal[0]), {"v": 2, "id": "arch#1", "set": {"status": "in_progress", "claimed_by": "arch#1"}})
+
+            state = load_task_board(path)
+            self.assertEqual(state["version"], 3)
+            self.assertEqual(
+                [(task["id"], task["status"]) for task in state["tasks"]],
+                [("arch#1", "in_progress"), ("impl#1", "pending"), ("extra#1", "skipped")],
+            )
+            self.assertEqual(board.snapshot(), state)
+
+            await board.update_task("arch#1", {"status": "done"})
+            self.assertEqual(TaskBoard.journal_path(path).read_text(encoding="utf-8"), "")
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8"))["version"], 4)
+
+            await board.update_task("impl#1", {"status": "done"})
+            await board.close()
+            self.assertFalse(TaskBoard.journal_path(path).exists())
+            final = json.loads(path.read_text(encoding="utf-8"))
+            self.assertEqual(final, board.snapshot())
+            self.assertEqual(board.get_task("impl#1"), {"id": "impl#1", "status": "done"})
+
+    async def test_replay_skips_records_covered_by_snapshot(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            path.write_text(json.dumps({"version": 5, "tasks": [{"id": "a", "status": "done"}]}), encoding="utf-8")
+            TaskBoard.journal_path(path).write_text(
+                '{"v":5,"id":"a","set":{"status":"in_progress"}}\n'
+                '{"v":6,"id":"b","set":{"status":"pending"}}\n'
+                '{"v":7,"id":"b","se',
+                encoding="utf-8",
+            )
+            state = load_task_board(path)
+            self.assertEqual(state["version"], 6)
+            self.assertEqual(state["tasks"], [{"id": "a", "status": "done"}, {"id": "b", "status": "pending"}])
+
+    async def test_boards_sharing_a_path_merge_instead_of_overwriting(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            first = TaskBoard(path, lock_mode="file_lock", lock_timeout_sec=5, compact_every=1)
+            second = TaskBoard(path, lock_mode="file_lock", lock_timeout_sec=5, compact_every=1)
+            await first.initialize([{"id": "a", "status": "open"}, {"id": "b", "status": "open"}])
+
+            await second.update_task("b", {"status": "done"})
+            await first.update_task("a", {"status": "done", "claimed_by": "first"})
+            await second.update_task("a", {"claimed_by": "second"})
+            state = load_task_board(path)
+            self.assertEqual(
+                state["tasks"],
+                [{"id": "a", "status": "done", "claimed_by": "second"}, {"id": "b", "status": "done"}],
+            )
+
+            # Journaled but not yet compacted updates of the other board survive too.
+            first._compact_every = second._compact_every = 10
+            await first.update_task("c", {"status": "open"})
+            await second.update_task("d", {"status": "open"})
+            await first.close()
+            await second.close()
+            self.assertEqual([task["id"] for task in load_task_board(path)["tasks"]], ["a", "b", "c", "d"])
+
+
+class ClaimTest(unittest.IsolatedAsyncioTestCase):
+    async def test_claims_open_tasks_then_steals_expired_leases(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            board = TaskBoard(Path(tmp) / "task_board.json", lock_mode="none", lock_timeout_sec=5)
+            await board.initialize([{"id": "impl#1", "status": "open"}, {"id": "impl#2", "status": "open"}])
+            ids = ["impl#1", "impl#2"]
+
+            self.assertEqual(await board.claim_next(ids, "impl@1", lease_sec=60), ("impl#1", 1))
+            self.assertEqual(await board.claim_next(ids, "impl@2", lease_sec=0), ("impl#2", 1))
+            # impl#1 still holds its lease; impl@2 does not steal its own claim.
+            self.assertIsNone(await board.claim_next(ids, "impl@2", lease_sec=60))
+            self.assertEqual(await board.claim_next(ids, "impl@1", lease_sec=60), ("impl#2", 2))
+            # Two claims used up: no further steal, nothing left to wait for.
+            self.assertIsNotNone(board.next_lease_expiry(ids))
+            await board.update_task("impl#1", {"lease_until": 0})
+            self.assertIsNone(await board.claim_next(["impl#2"], "impl@3", lease_sec=60))
+
+            self.assertTrue(await board.complete_claim("impl#2", "impl@1", {"returncode": 0}))
+            self.assertFalse(await board.complete_claim("impl#2", "impl@2", {"returncode": 1}))
+            task = board.get_task("impl#2")
+            self.assertEqual((task["status"], task["claimed_by"], task["returncode"]), ("done", "impl@1", 0))
+            await board.close()
+
+    async def test_held_claim_is_not_stolen_until_its_lease_starts(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            board = TaskBoard(Path(tmp) / "task_board.json", lock_mode="none", lock_timeout_sec=5)
+            await board.initialize([{"id": "impl#1", "status": "open"}])
+            ids = ["impl#1"]
+
+            self.assertEqual(await board.claim_next(ids, "impl@1", lease_sec=None), ("impl#1", 1))
+            self.assertIsNone(board.next_lease_expiry(ids))
+            self.assertIsNone(await board.claim_next(ids, "impl@2", lease_sec=60))
+            self.assertTrue(await board.renew_lease("impl#1", "impl@1", 0))
+            self.assertIsNotNone(board.next_lease_expiry(ids))
+            # Retry backoff: held again.
+            self.assertTrue(await board.renew_lease("impl#1", "impl@1", None))
+            self.assertIsNone(await board.claim_next(ids, "impl@2", lease_sec=60))
+            self.assertFalse(await board.renew_lease("impl#1", "impl@2", 60))
+            await board.close()
+
+
+class _QueuePipeline(Pipeline):
+    def __init__(self, durations: dict, queued: dict | None = None) -> None:
+        super().__init__(None, None)
+        self.durations = durations
+        self.queued = queued or {}
+        self.cancelled_runs = []
+
+    async def _run_role_instance(self, ctx, role_cfg, instance_id, shard_plan, role_executor, streaming_enabled,
+                                 use_rich, worker=None, claim_no=1, renew_lease=None):
+        try:
+            # Waiting for a scheduler slot, then the attempt itself.
+            await asyncio.sleep(self.queued.get((instance_id, claim_no), 0))
+            await renew_lease(True)
+            await asyncio.sleep(self.durations.get((instance_id, claim_no), 0.01))
+        except asyncio.CancelledError:
+            self.cancelled_runs.append((instance_id, claim_no))
+            raise
+        return SimpleNamespace(returncode=0, shard=instance_id, claim=claim_no, worker=worker)
+
+
+class ShardQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def test_more_shards_than_workers_and_straggler_is_stolen(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            board = TaskBoard(Path(tmp) / "task_board.json", lock_mode="none", lock_timeout_sec=5)
+            log = CoordinationLog(Path(tmp) / "coordination.log")
+            events = []
+            ctx = SimpleNamespace(
+                cfg=SimpleNamespace(coordination=SimpleNamespace(claim_timeout_sec=0.1)),
+                task_board=board,
+                coordination_log=log,
+                cancelled=False,
+                report_lock=asyncio.Lock(),
+                reporter=SimpleNamespace(step=lambda *args, **kwargs: None),
+                json_logger=SimpleNamespace(log=lambda event, payload: events.append((event, payload))),
+            )
+            role_cfg = SimpleNamespace(id="impl", instances=2)
+            shard_plan = SimpleNamespace(shards=[SimpleNamespace(title=f"S{idx}") for idx in range(1, 6)])
+            pipeline = _QueuePipeline({(1, 1): 10.0})
+
+            started = time.perf_counter()
+            executor = SimpleNamespace(timeout_sec=0.05)
+            results = await pipeline._run_shard_queue(ctx, role_cfg, shard_plan, executor, False, False)
+            self.assertLess(time.perf_counter() - started, 2.0)
+
+            self.assertEqual([res.shard for res in results], [1, 2, 3, 4, 5])
+            self.assertEqual(results[0].claim, 2)
+            self.assertEqual(pipeline.cancelled_runs, [(1, 1)])
+            self.assertEqual({res.worker for res in results[1:]}, {"impl@2"})
+            self.assertTrue(all(board.get_task(f"impl#{idx}")["status"] == "done" for idx in range(1, 6)))
+            self.assertEqual(events[-1][1]["steals"], 1)
+            await log.close()
+            entries = [json.loads(line) for line in (Path(tmp) / "coordination.log").read_text().splitlines()]
+            self.assertIn(("steal", "impl#1"), [(entry["type"], entry["payload"]["task"]) for entry in entries])
+            await board.close()
+
+    async def test_shard_within_attempt_timeout_is_not_stolen(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            board = TaskBoard(Path(tmp) / "task_board.json", lock_mode="none", lock_timeout_sec=5)
+            ctx = SimpleNamespace(
+                cfg=SimpleNamespace(coordination=SimpleNamespace(claim_timeout_sec=0.01)),
+                task_board=board,
+                coordination_log=CoordinationLog(Path(tmp) / "coordination.log"),
+                cancelled=False,
+                report_lock=asyncio.Lock(),
+                reporter=SimpleNamespace(step=lambda *args, **kwargs: None),
+                json_logger=SimpleNamespace(log=lambda event, payload: None),
+            )
+            role_cfg = SimpleNamespace(id="impl", instances=2)
+            shard_plan = SimpleNamespace(shards=[SimpleNamespace(title="S1"), SimpleNamespace(title="S2")])
+            pipeline = _QueuePipeline({(1, 1): 0.2})
+
+            executor = SimpleNamespace(timeout_sec=5)
+            results = await pipeline._run_shard_queue(ctx, role_cfg, shard_plan, executor, False, False)
+
+            self.assertEqual([(res.shard, res.claim) for res in results], [(1, 1), (2, 1)])
+            self.assertEqual(pipeline.cancelled_runs, [])
+            await ctx.coordination_log.close()
+            await board.close()
+
+
+    async def test_shard_waiting_for_a_slot_is_not_stolen(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            board = TaskBoard(Path(tmp) / "task_board.json", lock_mode="none", lock_timeout_sec=5)
+            ctx = SimpleNamespace(
+                cfg=SimpleNamespace(coordination=SimpleNamespace(claim_timeout_sec=0.01)),
+                task_board=board,
+                coordination_log=CoordinationLog(Path(tmp) / "coordination.log"),
+                cancelled=False,
+                report_lock=asyncio.Lock(),
+                reporter=SimpleNamespace(step=lambda *args, **kwargs: None),
+                json_logger=SimpleNamespace(log=lambda event, payload: None),
+            )
+            role_cfg = SimpleNamespace(id="impl", instances=2)
+            shard_plan = SimpleNamespace(shards=[SimpleNamespace(title="S1"), SimpleNamespace(title="S2")])
+            # Shard 1 queues far longer than its lease, then runs well within it.
+            pipeline = _QueuePipeline({(1, 1): 0.02}, queued={(1, 1): 0.3})
+
+            executor = SimpleNamespace(timeout_sec=0.1)
+            results = await pipeline._run_shard_queue(ctx, role_cfg, shard_plan, executor, False, False)
+
+            self.assertEqual([(res.shard, res.claim) for res in results], [(1, 1), (2, 1)])
+            self.assertEqual(pipeline.cancelled_runs, [])
+            await ctx.coordination_log.close()
+            await board.close()
+
+
+class CloseRunResourcesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failing_close_is_reported_and_later_steps_still_run(self) -> None:
+        closed = []
+
+        async def fail() -> None:
+            raise TimeoutError("TaskBoard lock timeout: task_board.json.lock")
+
+        async def close_log() -> None:
+            closed.append("coordination_log")
+
+        events = []
+        ctx = SimpleNamespace(
+            process_pools=SimpleNamespace(close=fail),
+            coordination_log=SimpleNamespace(close=close_log),
+            task_board=SimpleNamespace(close=fail),
+            json_logger=SimpleNamespace(log=lambda event, payload: events.append((event, payload["resource"]))),
+            meta_lock=asyncio.Lock(),
+            run_meta={},
+        )
+        with mock.patch("sys.stderr"):
+            await Pipeline._close_run_resources(ctx)
+        self.assertEqual(closed, ["coordination_log"])
+        self.assertEqual(events, [("close_error", "process_pools"), ("close_error", "task_board")])
+        self.assertEqual(set(ctx.run_meta["close_errors"]), {"process_pools", "task_board"})
+
+
+@unittest.skipIf(fcntl is None, "fcntl nicht verfuegbar")
+class FlockTest(unittest.IsolatedAsyncioTestCase):
+    async def test_stale_lock_file_does_not_block(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            Path(str(path) + ".lock").write_text("", encoding="utf-8")
+            board = TaskBoard(path, lock_mode="flock", lock_timeout_sec=1, compact_every=1)
+            started = time.monotonic()
+            await board.initialize([{"id": "a"}])
+            await board.update_task("a", {"status": "done"})
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(load_task_board(path)["tasks"], [{"id": "a", "status": "done"}])
+
+    async def test_waits_for_holder_and_times_out(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            lock_path = Path(str(path) + ".lock")
+            holder = os.open(str(lock_path), os.O_CREAT | os.O_RDWR)
+            fcntl.flock(holder, fcntl.LOCK_EX)
+            board = TaskBoard(path, lock_mode="flock", lock_timeout_sec=1, compact_every=1)
+            with self.assertRaises(TimeoutError):
+                await board.initialize([{"id": "a"}])
+
+            async def release_later() -> None:
+                await asyncio.sleep(0.2)
+                fcntl.flock(holder, fcntl.LOCK_UN)
+                os.close(holder)
+
+            releaser = asyncio.create_task(release_later())
+            await board.update_task("a", {"status": "done"})
+            await releaser
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8"))["version"], 2)
+
+
+class CoordinationLogTest(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_entries_and_fsyncs_on_close(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "run" / "coordination.log"
+            log = CoordinationLog(path, max_queue=4, batch_entries=3, flush_interval_sec=60)
+            with mock.patch("multi_agent.coordination.os.fsync") as fsync:
+                for idx in range(7):
+                    await log.append(f"impl#{idx}", "claim", {"task": idx})
+                await asyncio.sleep(0.05)
+                # Two full batches are written; the seventh entry waits for its batch.
+                self.assertEqual(len(path.read_text(encoding="utf-8").splitlines()), 6)
+                fsync.assert_not_called()
+                await log.close()
+                fsync.assert_called_once()
+            entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+            self.assertEqual([entry["sender"] for entry in entries], [f"impl#{idx}" for idx in range(7)])
+            self.assertEqual(entries[0]["type"], "claim")
+            self.assertEqual(entries[0]["payload"], {"task": 0})
+            with self.assertRaises(RuntimeError):
+                await log.append("impl#9", "claim", {})
+
+    async def test_flush_interval_writes_partial_batch(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "coordination.log"
+            log = CoordinationLog(path, batch_entries=100, flush_interval_sec=0.01)
+            await log.append("orchestrator", "init", {"run_id": "r1"})
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(path.read_text(encoding="utf-8").splitlines()), 1)
+            await log.close()
+
+
+
+@unittest.skipUnless(os.environ.get("MULTI_AGENT_BENCH"), "Benchmark: MULTI_AGENT_BENCH=1 setzen")
+class TaskBoardLockBenchmark(unittest.TestCase):
+    def _contended(self, lock_mode: str, processes: int, updates: int) -> float:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "task_board.json"
+            start = Path(tmp) / "start"
+            env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+            procs = [
+                subprocess.Popen(
+                    [sys.executable, "-c", _BOARD_UPDATER, str(path), lock_mode, str(idx), str(updates), str(start)],
+                    env=env,
+                )
+                for idx in range(processes)
+            ]
+            time.sleep(1.0)  # interpreter startup is not part of the measurement
+            started = time.perf_counter()
+            start.touch()
+            for proc in procs:
+                self.assertEqual(proc.wait(timeout=300), 0)
+            elapsed = time.perf_counter() - started
+            steps = {task["id"]: task["step"] for task in load_task_board(path)["tasks"]}
+            self.assertEqual(steps, {f"task#{idx}": updates - 1 for idx in range(processes)})
+            return elapsed
+
+    def test_flock_vs_lock_file_across_processes(self) -> None:
+        updates = 50
+        for processes in (4, 8, 16):
+            results = {mode: self._contended(mode, processes, updates) for mode in ("file_lock", "flock")}
+            total = processes * updates
+            print(
+                f"\n{processes} Prozesse: "
+                + ", ".join(f"{mode}: {total / sec:,.0f} Updates/s ({sec:.2f}s)" for mode, sec in results.items())
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
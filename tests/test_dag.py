@@ -0,0 +1,111 @@
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from multi_agent.dag import build_execution_plan, critical_path_depths, load_historical_durations
+from multi_agent.models import RoleConfig
+from multi_agent.pipeline import Pipeline
+
+
+def _role(role_id: str, depends_on: list[str]) -> RoleConfig:
+    return RoleConfig(
+        id=role_id,
+        name=role_id,
+        role=role_id,
+        prompt_template="{task}",
+        apply_diff=False,
+        instances=1,
+        depends_on=depends_on,
+        timeout_sec=None,
+        retries=0,
+        max_prompt_chars=None,
+        max_prompt_tokens=None,
+        max_output_chars=None,
+        expected_sections=[],
+        run_if_review_critical=False,
+        model=None,
+    )
+
+
+class CriticalPathTest(unittest.TestCase):
+    def test_depths_follow_longest_chain(self) -> None:
+        deps = {
+            "architect": [],
+            "implementer": ["architect"],
+            "tester": ["implementer"],
+            "docs": ["architect"],
+        }
+        depths = critical_path_depths(deps)
+        self.assertEqual(depths["architect"], 3)
+        self.assertEqual(depths["implementer"], 2)
+        self.assertEqual(depths["tester"], 1)
+        self.assertEqual(depths["docs"], 1)
+
+    def test_cycle_is_finite(self) -> None:
+        depths = critical_path_depths({"a": ["b"], "b": ["a"]})
+        self.assertTrue(all(value >= 1 for value in depths.values()))
+
+    def test_execution_plan_uses_history(self) -> None:
+        deps = {"a": [], "fast": ["a"], "slow": ["a"], "join": ["fast", "slow"]}
+        plan = build_execution_plan(deps, {"a": 2.0, "fast": 1.0, "slow": 5.0, "join": 1.0})
+        self.assertEqual(plan.critical_path, ["a", "slow", "join"])
+        self.assertEqual(plan.makespan, 8.0)
+        self.assertEqual(plan.start["fast"], 2.0)
+
+    def test_load_historical_durations_median(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            runs_dir = Path(tmp)
+            for idx, duration in enumerate([10.0, 30.0, 20.0]):
+                run_dir = runs_dir / f"run{idx}"
+                run_dir.mkdir()
+                meta = {"roles": {"architect": {"duration_sec": duration}, "skip": {"status": "skipped"}}}
+                (run_dir / "run.json").write_text(json.dumps(meta), encoding="utf-8")
+            durations = load_historical_durations(runs_dir)
+        self.assertEqual(durations, {"architect": 20.0})
+
+
+class _FakePipeline(Pipeline):
+    def __init__(self, delays: dict[str, float]) -> None:
+        super().__init__(snapshotter=None, diff_applier=None)
+        self.delays = delays
+        self.started: dict[str, float] = {}
+
+    async def _run_role(self, ctx, role_cfg, allow_rich):
+        self.started[role_cfg.id] = time.monotonic()
+        await asyncio.sleep(self.delays.get(role_cfg.id, 0.0))
+        return role_cfg.id, True
+
+    @staticmethod
+    def _write_resume_state(ctx) -> None:
+        return None
+
+
+class EventDrivenRunRolesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_dependent_starts_before_slow_sibling_finishes(self) -> None:
+        roles = [
+            _role("a", []),
+            _role("fast", ["a"]),
+            _role("slow", ["a"]),
+            _role("after_fast", ["fast"]),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            ctx = SimpleNamespace(
+                cfg=SimpleNamespace(roles=roles, paths=SimpleNamespace(run_dir=".runs")),
+                workdir=Path(tmp),
+                completed_roles=set(),
+                abort_run=False,
+                reporter=SimpleNamespace(error=lambda msg: None),
+                role_priorities={},
+            )
+            pipeline = _FakePipeline({"slow": 0.3, "fast": 0.01})
+            await pipeline._run_roles(ctx)
+        self.assertEqual(ctx.completed_roles, {"a", "fast", "slow", "after_fast"})
+        self.assertLess(pipeline.started["after_fast"], pipeline.started["slow"] + 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from multi_agent.executor import AgentExecutor, CLIClient
+from multi_agent.models import AgentSpec
+from multi_agent.output_spool import OutputSpool
+
+AGENT_OUTPUT = {
+    "agent_header": "## AGENT: {name} ({role})",
+    "returncode_header": "### Returncode",
+    "stdout_header": "### STDOUT",
+    "stderr_header": "### STDERR",
+}
+MESSAGES = {"status_error": "Fehler", "status_no_output": "Keine Ausgabe", "status_ok": "OK", "role_rc1_error": "{agent_name}: {error}"}
+
+
+class OutputSpoolTest(unittest.TestCase):
+    def test_finalize_layout_and_lazy_handles(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = Path(tmp) / "agent.md"
+            spool = OutputSpool(out_file, tail_chars=5)
+            for idx in range(100):
+                spool.write("stdout", f"line {idx}\n")
+            spool.write("stderr", "warn ä")
+            stdout, stderr = spool.finalize("HEAD\n", "ERR\n")
+            expected_out = "".join(f"line {idx}\n" for idx in range(100))
+            self.assertEqual(out_file.read_text(encoding="utf-8"), f"HEAD\n{expected_out}\n\nERR\nwarn ä\n")
+            self.assertEqual(stdout.read(), expected_out)
+            self.assertEqual(stderr.read(), "warn ä")
+            # Parsed several times per result, decoded once.
+            with mock.patch("builtins.open", wraps=open) as opened:
+                for _ in range(3):
+                    self.assertEqual(stdout.read(), expected_out)
+            self.assertEqual(opened.call_count, 0)
+            self.assertEqual(stdout.tail, expected_out[-5:])
+            self.assertEqual(stdout.chars, len(expected_out))
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ["agent.md"])
+
+    def test_large_spans_are_not_cached_and_removed_file_falls_back_to_tail(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = Path(tmp) / "agent.md"
+            spool = OutputSpool(out_file, tail_chars=8)
+            spool.write("stdout", "x" * 3000 + "end")
+            stdout, _ = spool.finalize("HEAD\n", "ERR\n")
+            with mock.patch("multi_agent.output_spool.DECODED_CACHE_MAX_SPAN", 1000):
+                self.assertEqual(stdout.read(), "x" * 3000 + "end")
+                with mock.patch("builtins.open", wraps=open) as opened:
+                    stdout.read()
+                self.assertEqual(opened.call_count, 1)
+            out_file.unlink()
+            self.assertEqual(stdout.read(), "xxxxxend")
+
+
+class ExecutorSpoolTest(unittest.IsolatedAsyncioTestCase):
+    async def test_output_written_to_file_with_bounded_tail(self) -> None:
+        script = "import sys\nfor i in range(5000):\n    print('x' * 50, i)\nsys.stderr.write('done')\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            client = CLIClient([sys.executable, "-c", script], timeout_sec=30, stdin_mode=False)
+            executor = AgentExecutor(client, AGENT_OUTPUT, MESSAGES)
+            result = await executor.run_agent(AgentSpec("Impl#1", "implementer"), "", root, root / "impl.md")
+            content = (root / "impl.md").read_text(encoding="utf-8")
+            self.assertIn("0 (OK)", content)
+            self.assertEqual(result.stderr, "done")
+            self.assertEqual(len(result.stdout.splitlines()), 5000)
+            self.assertLessEqual(len(result.stdout_text.tail), 16_000)
+            self.assertGreater(result.stdout_text.chars, 16_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
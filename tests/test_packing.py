@@ -0,0 +1,30 @@
+import unittest
+
+from multi_agent.packing import pack_budget
+
+
+class PackBudgetTest(unittest.TestCase):
+    def test_small_files_packed_whole_surplus_to_large(self) -> None:
+        result = pack_budget([("small.py", 100), ("big.py", 10_000), ("tiny.md", 50)], budget_bytes=2_000)
+        self.assertEqual(result.allocations["small.py"], 100)
+        self.assertEqual(result.allocations["tiny.md"], 50)
+        self.assertEqual(result.allocations["big.py"], 1_850)
+        self.assertEqual(result.dropped, {"big.py": 8_150})
+        self.assertLessEqual(result.packed_bytes, 2_000)
+
+    def test_relevance_weights_share(self) -> None:
+        result = pack_budget([("a", 5_000), ("b", 5_000)], budget_bytes=3_000, scores={"a": 2.0, "b": 0.0})
+        self.assertEqual(result.allocations["a"], 2_250)
+        self.assertEqual(result.allocations["b"], 750)
+
+    def test_drops_least_relevant_below_min_chunk(self) -> None:
+        items = [(f"f{idx}", 1_000) for idx in range(10)]
+        result = pack_budget(items, budget_bytes=600)
+        kept = [file_id for file_id, value in result.allocations.items() if value > 0]
+        self.assertEqual(kept, ["f0", "f1"])
+        self.assertLessEqual(result.packed_bytes, 600)
+        self.assertEqual(result.dropped_bytes, 10_000 - result.packed_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from multi_agent.executor import CLIClient
+from multi_agent.process_pool import JsonRpcPool, PoolConfig, ProcessPoolRegistry
+
+# Fake provider: pays a startup cost, then answers prompts on stdin either once
+# (like `codex exec -`) or as a JSON-RPC worker (`--jsonrpc`).
+FAKE_PROVIDER = """
+import json, os, sys, time
+time.sleep(float(os.environ.get("FAKE_STARTUP_SEC", "0.2")))
+if "--jsonrpc" in sys.argv:
+    for line in sys.stdin:
+        request = json.loads(line)
+        prompt = request["params"]["prompt"]
+        if prompt == "hang":
+            time.sleep(30)
+        result = {"returncode": 0, "stdout": prompt.upper(), "stderr": ""}
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result}) + "\\n")
+        sys.stdout.flush()
+else:
+    sys.stdout.write(sys.stdin.read().upper())
+"""
+
+
+def _cmd(*extra: str) -> list[str]:
+    return [sys.executable, "-c", FAKE_PROVIDER, *extra]
+
+
+class PoolConfigTest(unittest.TestCase):
+    def test_from_dict(self) -> None:
+        self.assertIsNone(PoolConfig.from_dict(None))
+        self.assertIsNone(PoolConfig.from_dict({"enabled": False, "size": 3}))
+        cfg = PoolConfig.from_dict({"mode": "jsonrpc", "size": 2, "worker_cmd": ["w", "--rpc"]})
+        self.assertEqual(cfg, PoolConfig(mode="jsonrpc", size=2, worker_cmd=("w", "--rpc")))
+        with self.assertRaises(ValueError):
+            PoolConfig.from_dict({"mode": "telepathy"})
+
+
+class ProcessPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def test_prespawned_processes_serve_prompts_and_refill(self) -> None:
+        os.environ["FAKE_STARTUP_SEC"] = "0"
+        self.addCleanup(os.environ.pop, "FAKE_STARTUP_SEC", None)
+        pools = ProcessPoolRegistry()
+        self.addAsyncCleanup(pools.close)
+        client = CLIClient(_cmd(), timeout_sec=10, stdin_mode=True, pool=PoolConfig(size=2), pools=pools)
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            outputs = []
+            for prompt in ("eins", "zwei", "drei"):
+                rc, out, _ = await client.run(prompt, workdir)
+                self.assertEqual(rc, 0)
+                outputs.append(out)
+            rc, out, _ = await client.run_streaming("vier", workdir)
+            outputs.append(out)
+            pool = pools.get(PoolConfig(size=2), _cmd(), workdir)
+            self.assertEqual(outputs, ["EINS", "ZWEI", "DREI", "VIER"])
+            self.assertGreaterEqual(pool.hits, 1)
+
+    async def test_jsonrpc_workers_are_reused_and_replaced_after_timeout(self) -> None:
+        os.environ["FAKE_STARTUP_SEC"] = "0"
+        self.addCleanup(os.environ.pop, "FAKE_STARTUP_SEC", None)
+        pools = ProcessPoolRegistry()
+        self.addAsyncCleanup(pools.close)
+        config = PoolConfig(mode="jsonrpc", size=1, worker_cmd=tuple(_cmd("--jsonrpc")))
+        client = CLIClient(["unused"], timeout_sec=1, stdin_mode=True, pool=config, pools=pools)
+        workdir = Path(".")
+        self.assertEqual(await client.run("a" * 200_000, workdir), (0, "A" * 200_000, ""))
+        self.assertEqual((await client.run("hang", workdir))[0], 124)
+        self.assertEqual(await client.run("wieder da", workdir), (0, "WIEDER DA", ""))
+        self.assertEqual(pools.get(config, ["unused"], workdir).spawned, 2)
+
+    async def test_jsonrpc_waiter_gets_replacement_for_discarded_worker(self) -> None:
+        os.environ["FAKE_STARTUP_SEC"] = "0"
+        self.addCleanup(os.environ.pop, "FAKE_STARTUP_SEC", None)
+        pool = JsonRpcPool(_cmd("--jsonrpc"), Path("."), 1)
+        self.addAsyncCleanup(pool.close)
+        workdir = Path(".")
+        hung, waiting, queued = await asyncio.wait_for(
+            asyncio.gather(
+                pool.request("hang", workdir, 0.5),
+                pool.request("danach", workdir, 10),
+                pool.request("hang", workdir, 0.2),
+                return_exceptions=True,
+            ),
+            timeout=10,
+        )
+        self.assertIsInstance(hung, asyncio.TimeoutError)
+        self.assertEqual(waiting, (0, "DANACH", ""))
+        # Timed out while waiting for the single worker.
+        self.assertIsInstance(queued, asyncio.TimeoutError)
+        self.assertEqual(pool.spawned, 2)
+
+    async def test_jsonrpc_worker_handed_to_cancelled_waiter_is_not_lost(self) -> None:
+        os.environ["FAKE_STARTUP_SEC"] = "0"
+        self.addCleanup(os.environ.pop, "FAKE_STARTUP_SEC", None)
+        pool = JsonRpcPool(_cmd("--jsonrpc"), Path("."), 1)
+        self.addAsyncCleanup(pool.close)
+        worker = await pool._acquire(None)
+        waiter = asyncio.ensure_future(pool.request("x", Path("."), 10))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        # The worker comes back and the waiter is cancelled in the same loop step.
+        pool._idle.put_nowait(worker)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(await pool.request("wieder da", Path("."), 1), (0, "WIEDER DA", ""))
+        self.assertEqual(pool.spawned, 1)
+
+
+@unittest.skipUnless(os.environ.get("MULTI_AGENT_BENCH"), "Benchmark: MULTI_AGENT_BENCH=1 setzen")
+class ProcessPoolBenchmark(unittest.IsolatedAsyncioTestCase):
+    async def _latency(self, client: CLIClient, runs: int) -> float:
+        total = 0.0
+        for idx in range(runs):
+            started = time.perf_counter()
+            rc, out, _ = await client.run(f"prompt {idx}", Path("."))
+            total += time.perf_counter() - started
+            self.assertEqual((rc, out), (0, f"PROMPT {idx}"))
+            # Work between agent runs (prompt building, diff apply, ...).
+            await asyncio.sleep(0.3)
+        return total / runs
+
+    async def test_spawn_vs_pooled_latency(self) -> None:
+        os.environ["FAKE_STARTUP_SEC"] = "0.2"
+        self.addCleanup(os.environ.pop, "FAKE_STARTUP_SEC", None)
+        pools = ProcessPoolRegistry()
+        self.addAsyncCleanup(pools.close)
+        spawn = await self._latency(CLIClient(_cmd(), timeout_sec=10), 5)
+        prespawn = await self._latency(CLIClient(_cmd(), 10, True, PoolConfig(size=1), pools), 5)
+        jsonrpc_cfg = PoolConfig(mode="jsonrpc", size=1, worker_cmd=tuple(_cmd("--jsonrpc")))
+        jsonrpc = await self._latency(CLIClient(_cmd(), 10, True, jsonrpc_cfg, pools), 5)
+        print(f"\nLatenz pro Agent: spawn {spawn:.3f}s, prespawn {prespawn:.3f}s, jsonrpc {jsonrpc:.3f}s")
+        self.assertLess(prespawn, spawn)
+
+
+if __name__ == "__main__":
+    unittest.main()
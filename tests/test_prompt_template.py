@@ -0,0 +1,171 @@
+import json
+import os
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from multi_agent.context_store import ContextStore
+from multi_agent.models import RoleConfig
+from multi_agent.pipeline import Pipeline
+from multi_agent.prompt_template import PromptTemplate, render_prompt
+from multi_agent.utils import estimate_tokens, format_prompt, summarize_text, truncate_text
+
+FAMILIES_DIR = Path(__file__).resolve().parents[1] / "agent_families"
+MESSAGES = {"error_prompt_missing_key": "missing {key} in {role_id}"}
+
+
+def _shipped_templates() -> list[str]:
+    templates = []
+    for path in sorted(FAMILIES_DIR.glob("*_agents/*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(data, dict) and data.get("prompt_template"):
+            templates.append(str(data["prompt_template"]))
+    return templates
+
+
+def _context_for(template: PromptTemplate, snapshot_chars: int = 200) -> dict[str, str]:
+    context = {name: f"<{name}>" * 5 for name in template.field_names}
+    context["snapshot"] = "s" * snapshot_chars
+    context["task"] = "Implementiere das Feature. " * 20
+    return context
+
+
+def _role(template: str, max_prompt_chars: int | None = None) -> RoleConfig:
+    return RoleConfig(
+        id="impl",
+        name="Implementer",
+        role="implementer",
+        prompt_template=template,
+        apply_diff=False,
+        instances=1,
+        depends_on=[],
+        timeout_sec=None,
+        retries=0,
+        max_prompt_chars=max_prompt_chars,
+        max_prompt_tokens=None,
+        max_output_chars=None,
+        expected_sections=[],
+        run_if_review_critical=False,
+        model=None,
+    )
+
+
+def _cfg() -> SimpleNamespace:
+    return SimpleNamespace(
+        system_rules="RULES",
+        role_defaults={},
+        prompt_limits={"token_chars": 4},
+        messages=MESSAGES,
+        summary_max_chars=100,
+    )
+
+
+class PromptTemplateTest(unittest.TestCase):
+    def test_matches_str_format_for_shipped_templates(self) -> None:
+        templates = _shipped_templates()
+        self.assertTrue(templates)
+        for raw in templates:
+            template = PromptTemplate(raw)
+            context = _context_for(template)
+            expected = raw.format(**context)
+            self.assertEqual(template.render(context), expected)
+            self.assertEqual(template.length(context), len(expected))
+
+    def test_missing_key_message(self) -> None:
+        with self.assertRaisesRegex(ValueError, "missing name in role"):
+            render_prompt(PromptTemplate("Hello {name}"), {"task": "x"}, "role", MESSAGES)
+
+    def test_escaped_braces_and_format_spec(self) -> None:
+        template = PromptTemplate("{{literal}} {task!r} {count:>4}")
+        self.assertEqual(template.render({"task": "x", "count": 7}), "{literal} 'x'    7")
+        self.assertEqual(template.field_counts, {"task": 1, "count": 1})
+
+    def test_build_prompt_within_limit_untouched(self) -> None:
+        role = _role("T: {task}\nS: {snapshot}{repair_note}", max_prompt_chars=1_000)
+        prompt, chars, truncated, _, _ = Pipeline(None, None)._build_prompt(
+            role, {"task": "do it", "snapshot": "files"}, _cfg()
+        )
+        self.assertEqual(prompt, "RULES\n\nT: do it\nS: files")
+        self.assertEqual(chars, len(prompt))
+        self.assertFalse(truncated)
+
+    def test_build_prompt_cuts_snapshot_before_task(self) -> None:
+        role = _role("T: {task}\nS: {snapshot}\nS2: {snapshot}{repair_note}", max_prompt_chars=1_200)
+        context = {"task": "t" * 300, "snapshot": "s" * 5_000}
+        prompt, chars, truncated, _, _ = Pipeline(None, None)._build_prompt(role, context, _cfg())
+        self.assertTrue(truncated)
+        self.assertLessEqual(chars, 1_200)
+        self.assertIn("t" * 300, prompt)
+
+    def test_snapshot_view_for_converted_or_formatted_field(self) -> None:
+        views = []
+        snapshot_views = SimpleNamespace(view=lambda *args: views.append(args) or "view")
+        for template in ("S: {snapshot!s}{repair_note}", "S: {snapshot:>10}{repair_note}", "T: {task}{repair_note}"):
+            ctx = SimpleNamespace(context=ContextStore({"task": "do it"}), snapshot_views=snapshot_views, cfg=_cfg())
+            local = Pipeline(None, None)._setup_instance_context(ctx, _role(template, max_prompt_chars=10_000), 1, None)
+            self.assertEqual(local.get("snapshot"), "view" if "snapshot" in template else None)
+        self.assertEqual(len(views), 2)
+
+
+def _legacy_build(template: str, context: dict[str, str], limit: int) -> str:
+    # The former multi-pass assembly: format + estimate after every step.
+    prompt = "RULES\n\n" + format_prompt(template, context, "role", MESSAGES)
+    estimate_tokens(prompt, 4)
+    if len(prompt) <= limit:
+        return prompt
+    compressed = dict(context)
+    for key, value in list(compressed.items()):
+        if key.endswith("_output"):
+            compressed[key] = summarize_text(value, max_chars=1_200)
+    prompt = "RULES\n\n" + format_prompt(template, compressed, "role", MESSAGES)
+    estimate_tokens(prompt, 4)
+    compressed["snapshot"] = summarize_text(compressed["snapshot"], max_chars=int(limit * 0.8))
+    prompt = "RULES\n\n" + format_prompt(template, compressed, "role", MESSAGES)
+    estimate_tokens(prompt, 4)
+    overflow = len(prompt) - limit
+    if overflow > 0:
+        compressed["snapshot"] = truncate_text(compressed["snapshot"], max(len(compressed["snapshot"]) - overflow, 256))
+        prompt = "RULES\n\n" + format_prompt(template, compressed, "role", MESSAGES)
+        estimate_tokens(prompt, 4)
+    overflow = len(prompt) - limit
+    if overflow > 0:
+        compressed["task"] = truncate_text(compressed["task"], max(len(compressed["task"]) - overflow, 256))
+        prompt = "RULES\n\n" + format_prompt(template, compressed, "role", MESSAGES)
+    return prompt
+
+
+@unittest.skipUnless(os.environ.get("MULTI_AGENT_BENCH"), "Benchmark: MULTI_AGENT_BENCH=1 setzen")
+class PromptAssemblyBenchmark(unittest.TestCase):
+    def test_compiled_vs_legacy(self) -> None:
+        templates = [raw for raw in _shipped_templates() if "{snapshot}" in raw]
+        rounds = 200
+        pipeline = Pipeline(None, None)
+        cfg = _cfg()
+        cfg.summary_max_chars = 1_200
+        cfg.role_defaults = {}
+        cases = []
+        for raw in templates:
+            role = _role(raw + "{repair_note}", max_prompt_chars=8_000)
+            context = _context_for(role.compiled_prompt, snapshot_chars=14_000)
+            context["repair_note"] = ""
+            cases.append((raw + "{repair_note}", role, context))
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for raw, _, context in cases:
+                _legacy_build(raw, context, 8_000)
+        legacy_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for _, role, context in cases:
+                pipeline._build_prompt(role, context, cfg, shrink_factor=0.8)
+        compiled_sec = time.perf_counter() - started
+
+        print(f"\n{len(cases)} Templates x {rounds}: legacy {legacy_sec:.3f}s, compiled {compiled_sec:.3f}s")
+        self.assertLess(compiled_sec, legacy_sec)
+
+
+if __name__ == "__main__":
+    unittest.main()
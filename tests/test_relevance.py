@@ -0,0 +1,38 @@
+import unittest
+
+from multi_agent.relevance import RelevanceIndex, document_terms, select_ranked, tokenize
+
+
+class RelevanceTest(unittest.TestCase):
+    def test_tokenize_splits_identifiers(self) -> None:
+        tokens = tokenize("TaskBoard read_text_safe")
+        self.assertIn("taskboard", tokens)
+        self.assertIn("task", tokens)
+        self.assertIn("board", tokens)
+        self.assertIn("read", tokens)
+        self.assertIn("safe", tokens)
+
+    def test_rank_prefers_path_and_content_matches(self) -> None:
+        index = RelevanceIndex.from_documents(
+            {
+                "multi_agent/coordination.py": document_terms("multi_agent/coordination.py", "class TaskBoard: lock"),
+                "multi_agent/snapshot.py": document_terms("multi_agent/snapshot.py", "def build_snapshot(): pass"),
+                "README.md": document_terms("README.md", "The snapshot feature is documented here."),
+            }
+        )
+        ranked = [doc_id for doc_id, _ in index.rank("Fix the snapshot builder")]
+        self.assertEqual(ranked, ["multi_agent/snapshot.py", "README.md"])
+        self.assertEqual(index.rank("TaskBoard locking")[0][0], "multi_agent/coordination.py")
+        self.assertEqual(index.rank("unrelated words"), [])
+
+    def test_select_ranked_falls_back_below_min_files(self) -> None:
+        ranked = [("b", 2.0)]
+        self.assertEqual(select_ranked(ranked, ["a", "b", "c"], min_files=2, max_files=1), ["b", "a", "c"])
+        self.assertEqual(select_ranked(ranked, ["a", "b", "c"], min_files=1, max_files=5), ["b"])
+
+    def test_select_ranked_without_hits_keeps_original_order(self) -> None:
+        self.assertEqual(select_ranked([], ["a", "b", "c"], min_files=0, max_files=2), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from multi_agent.executor import AgentExecutor, CLIClient
+from multi_agent.models import AgentSpec
+from multi_agent.result_cache import ResultCache
+
+AGENT_OUTPUT = {
+    "agent_header": "## AGENT: {name} ({role})",
+    "returncode_header": "### Returncode",
+    "stdout_header": "### STDOUT",
+    "stderr_header": "### STDERR",
+}
+MESSAGES = {
+    "status_ok": "OK",
+    "status_no_output": "KEIN_BEITRAG",
+    "status_error": "FEHLER",
+    "role_rc1_error": "{agent_name} {error}",
+}
+
+
+class ResultCacheTest(unittest.IsolatedAsyncioTestCase):
+    def test_key_depends_on_all_parts(self) -> None:
+        base = ResultCache.make_key("codex", "gpt-4", {"temperature": 0.1}, "prompt")
+        self.assertEqual(base, ResultCache.make_key("codex", "gpt-4", {"temperature": 0.1}, "prompt"))
+        self.assertNotEqual(base, ResultCache.make_key("claude", "gpt-4", {"temperature": 0.1}, "prompt"))
+        self.assertNotEqual(base, ResultCache.make_key("codex", "gpt-4o", {"temperature": 0.1}, "prompt"))
+        self.assertNotEqual(base, ResultCache.make_key("codex", "gpt-4", {"temperature": 0.2}, "prompt"))
+        self.assertNotEqual(base, ResultCache.make_key("codex", "gpt-4", {"temperature": 0.1}, "prompt!"))
+        # CODEX_CMD pointing at another binary must not share entries.
+        with_cmd = ResultCache.make_key("codex", "gpt-4", {"temperature": 0.1}, "prompt", ["codex", "exec"])
+        self.assertNotEqual(base, with_cmd)
+        self.assertNotEqual(
+            with_cmd, ResultCache.make_key("codex", "gpt-4", {"temperature": 0.1}, "prompt", ["codex-nightly", "exec"])
+        )
+
+    async def test_modes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            read_only = ResultCache(root, mode="read")
+            await read_only.put("ab" * 32, 0, "out", "")
+            self.assertIsNone(read_only.get("ab" * 32))
+
+            cache = ResultCache(root, mode="readwrite")
+            await cache.put("ab" * 32, 0, "out", "err")
+            await cache.put("cd" * 32, 1, "failed", "")
+            hit = cache.get("ab" * 32)
+            self.assertIsNotNone(hit)
+            self.assertEqual(hit.stdout, "out")
+            self.assertIsNone(cache.get("cd" * 32))
+            self.assertIsNotNone(ResultCache(root, mode="read").get("ab" * 32))
+            with self.assertRaises(ValueError):
+                ResultCache(root, mode="sometimes")
+
+    async def test_lru_eviction(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            probe = ResultCache(root / "probe", mode="readwrite")
+            await probe.put("ff" * 32, 0, "x" * 150, "")
+            entry_size = (root / "probe" / "ff" / f"{'ff' * 32}.json").stat().st_size
+            writer = ResultCache(root / "cache", mode="readwrite")
+            keys = [f"{idx:02d}" * 32 for idx in range(3)]
+            for idx, key in enumerate(reversed(keys)):
+                await writer.put(key, 0, "x" * 150, "")
+                path = root / "cache" / key[:2] / f"{key}.json"
+                os.utime(path, (1000 + idx, 1000 + idx))
+
+            # A new cache orders the existing entries by mtime (keys[2] oldest).
+            cache = ResultCache(root / "cache", mode="readwrite", max_bytes=entry_size * 3 + 10)
+            self.assertIsNotNone(cache.get(keys[2]))
+            with mock.patch.object(ResultCache, "_load_sizes", wraps=cache._load_sizes) as listed:
+                await cache.put("99" * 32, 0, "x" * 150, "")
+                await cache.put("98" * 32, 0, "x" * 150, "")
+            # Listed once, then tracked in memory: keys[1] and keys[0] were least recently used.
+            self.assertEqual(listed.call_count, 1)
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertIsNone(cache.get(keys[0]))
+            self.assertIsNotNone(cache.get(keys[2]))
+            self.assertEqual(cache.evictions, 2)
+
+
+class ExecutorCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_second_run_is_served_from_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            marker = root / "calls.txt"
+            script = (
+                "import sys; "
+                f"open({str(marker)!r}, 'a').write('x'); "
+                "sys.stdout.write(sys.stdin.read().upper())"
+            )
+            client = CLIClient([sys.executable, "-c", script], timeout_sec=10, stdin_mode=True)
+            cache = ResultCache(root / "cache", mode="readwrite")
+            executor = AgentExecutor(client, AGENT_OUTPUT, MESSAGES, provider_id="codex", result_cache=cache)
+            agent = AgentSpec("Arch#1", "architect")
+            first = await executor.run_agent(agent, "hello", root, root / "a.md")
+            second = await executor.run_agent(agent, "hello", root, root / "b.md")
+            calls = marker.read_text(encoding="utf-8")
+            self.assertIn("HELLO", (root / "b.md").read_text(encoding="utf-8"))
+            self.assertEqual(second.stdout, "HELLO")
+        self.assertFalse(first.cache_hit)
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(calls, "x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List, Sequence
+
+from multi_agent.run_logger import JsonRunLogger, RotatingJsonlSink, UdpSink, build_log_sink
+
+
+class _SlowSink:
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.lines: List[str] = []
+
+    def write(self, lines: Sequence[str]) -> None:
+        self.release.wait(5)
+        self.lines.extend(lines)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonRunLoggerTest(unittest.TestCase):
+    def test_writes_events_in_order_on_close(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "run" / "events.jsonl"
+            logger = JsonRunLogger(path)
+            payload = {"role": "impl"}
+            logger.log("role_start", payload)
+            payload["role"] = "changed"
+            for idx in range(100):
+                logger.log("agent_result", {"idx": idx})
+            logger.close()
+            entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+            self.assertEqual(entries[0], {"event": "role_start", "payload": {"role": "impl"}})
+            self.assertEqual([entry["payload"]["idx"] for entry in entries[1:]], list(range(100)))
+            self.assertEqual(logger.stats(), {"logged": 101, "dropped": 0, "sink_errors": 0})
+
+    def test_disabled_logger_writes_nothing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "events.jsonl"
+            logger = JsonRunLogger(path, enabled=False)
+            logger.log("run_start", {})
+            logger.close()
+            self.assertFalse(path.exists())
+
+    def test_drop_new_counts_and_reports_dropped_events(self) -> None:
+        sink = _SlowSink()
+        logger = JsonRunLogger(Path("unused"), enabled=False, sinks=[sink], queue_size=2, backpressure="drop_new")
+        for idx in range(20):
+            logger.log("tick", {"idx": idx})
+        self.assertGreater(logger.dropped, 0)
+        sink.release.set()
+        logger.close()
+        events = [json.loads(line) for line in sink.lines]
+        self.assertEqual(events[-1], {"event": "log_dropped", "payload": {"dropped": logger.dropped}})
+        self.assertEqual(len(events) - 1 + logger.dropped, 20)
+
+    def test_drop_old_keeps_newest_events(self) -> None:
+        sink = _SlowSink()
+        logger = JsonRunLogger(Path("unused"), enabled=False, sinks=[sink], queue_size=3, backpressure="drop_old")
+        for idx in range(20):
+            logger.log("tick", {"idx": idx})
+        sink.release.set()
+        logger.close()
+        ticks = [json.loads(line)["payload"]["idx"] for line in sink.lines if '"tick"' in line]
+        self.assertEqual(ticks[-3:], [17, 18, 19])
+
+    def test_default_policy_never_blocks_the_caller(self) -> None:
+        sink = _SlowSink()
+        logger = JsonRunLogger(Path("unused"), enabled=False, sinks=[sink], queue_size=2)
+        started = time.perf_counter()
+        for idx in range(20):
+            logger.log("tick", {"idx": idx})
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertGreater(logger.dropped, 0)
+        sink.release.set()
+        logger.close()
+        self.assertEqual(json.loads(sink.lines[-2])["payload"]["idx"], 19)
+
+    def test_unknown_policy_and_sink_are_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            JsonRunLogger(Path("unused"), backpressure="spill")
+        with self.assertRaises(ValueError):
+            build_log_sink({"type": "kafka"}, Path("."))
+
+
+class LogSinkTest(unittest.TestCase):
+    def test_rotating_sink_keeps_backups(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "events.jsonl"
+            sink = build_log_sink({"type": "rotating", "path": str(path), "max_bytes": 10, "backups": 2}, Path(tmp))
+            self.assertIsInstance(sink, RotatingJsonlSink)
+            for idx in range(4):
+                sink.write([f'{{"idx": {idx}}}'])
+            sink.close()
+            self.assertFalse(path.exists())
+            self.assertEqual(Path(f"{path}.1").read_text(encoding="utf-8"), '{"idx": 3}\n')
+            self.assertEqual(Path(f"{path}.2").read_text(encoding="utf-8"), '{"idx": 2}\n')
+            self.assertFalse(Path(f"{path}.3").exists())
+
+    def test_udp_sink_sends_statsd_metrics(self) -> None:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(("127.0.0.1", 0))
+            server.settimeout(2)
+            sink = UdpSink(port=server.getsockname()[1], fmt="statsd")
+            sink.write([json.dumps({"event": "role_end", "payload": {"role": "impl", "duration_sec": 1.5}})])
+            sink.close()
+            received = {server.recv(1024).decode("ascii") for _ in range(2)}
+        self.assertEqual(received, {"multi_agent.role_end:1|c", "multi_agent.role_end.duration:1500|ms"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from multi_agent.executor import AgentExecutor, CLIClient
+from multi_agent.models import AgentSpec
+from multi_agent.scheduler import AgentScheduler
+
+AGENT_OUTPUT = {
+    "agent_header": "## AGENT: {name} ({role})",
+    "returncode_header": "### Returncode",
+    "stdout_header": "### STDOUT",
+    "stderr_header": "### STDERR",
+}
+MESSAGES = {"status_error": "Fehler", "status_no_output": "Keine Ausgabe", "status_ok": "OK"}
+
+
+class AgentSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_global_limit(self) -> None:
+        scheduler = AgentScheduler(max_concurrent=2)
+        active = 0
+        peak = 0
+
+        async def job() -> None:
+            nonlocal active, peak
+            async with scheduler.slot("codex"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(job() for _ in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.peak_running, 2)
+        self.assertEqual(scheduler.running, 0)
+
+    async def test_provider_limit_does_not_block_other_providers(self) -> None:
+        scheduler = AgentScheduler(max_concurrent=3, provider_limits={"claude": 1})
+        await scheduler.acquire("claude")
+        claude_waiter = asyncio.create_task(scheduler.acquire("claude", priority=10))
+        await asyncio.sleep(0)
+        codex_wait = await asyncio.wait_for(scheduler.acquire("codex"), timeout=1)
+        self.assertLess(codex_wait, 0.5)
+        self.assertFalse(claude_waiter.done())
+        scheduler.release("claude")
+        wait_sec = await asyncio.wait_for(claude_waiter, timeout=1)
+        self.assertGreaterEqual(wait_sec, 0.0)
+
+    async def test_priority_order(self) -> None:
+        scheduler = AgentScheduler(max_concurrent=1)
+        await scheduler.acquire("codex")
+        order: list[str] = []
+
+        async def waiter(name: str, priority: float) -> None:
+            await scheduler.acquire("codex", priority=priority)
+            order.append(name)
+            scheduler.release("codex")
+
+        tasks = [
+            asyncio.create_task(waiter("low", 1)),
+            asyncio.create_task(waiter("high", 5)),
+            asyncio.create_task(waiter("mid", 3)),
+        ]
+        await asyncio.sleep(0)
+        scheduler.release("codex")
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["high", "mid", "low"])
+
+    async def test_cancelled_waiter_releases_queue(self) -> None:
+        scheduler = AgentScheduler(max_concurrent=1)
+        await scheduler.acquire("codex")
+        waiter = asyncio.create_task(scheduler.acquire("codex"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.queued, 0)
+        scheduler.release("codex")
+        self.assertEqual(scheduler.running, 0)
+
+    async def test_on_start_runs_once_the_slot_is_granted(self) -> None:
+        scheduler = AgentScheduler(max_concurrent=1)
+        client = CLIClient([sys.executable, "-c", "print('ok')"], timeout_sec=10, stdin_mode=False)
+        executor = AgentExecutor(client, AGENT_OUTPUT, MESSAGES, scheduler=scheduler, provider_id="codex")
+        started = []
+
+        async def on_start() -> None:
+            started.append(scheduler.running)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            await scheduler.acquire("codex")
+            run = asyncio.create_task(
+                executor.run_agent(AgentSpec("Impl#1", "implementer"), "", Path(tmp), Path(tmp) / "a.md", on_start=on_start)
+            )
+            await asyncio.sleep(0.05)
+            self.assertEqual(started, [])
+            scheduler.release("codex")
+            result = await asyncio.wait_for(run, timeout=10)
+        self.assertEqual(started, [1])
+        self.assertEqual(result.returncode, 0)
+
+    def test_from_config_reads_provider_caps(self) -> None:
+        scheduler = AgentScheduler.from_config(
+            {"max_concurrent_agents": 4, "provider_limits": {"gemini": 1}},
+            {"codex": {"max_concurrent": 2}, "claude": {}},
+        )
+        self.assertEqual(scheduler.max_concurrent, 4)
+        self.assertEqual(scheduler.provider_limits, {"codex": 2, "gemini": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
+import json
+import os
 import tempfile
 import unittest
 from pathlib import Path
 
+from multi_agent.constants import SELECTIVE_INDEX_BYTES
 from multi_agent.snapshot import WorkspaceSnapshotter
 
 
@@ -57,6 +60,175 @@ class SnapshotterTest(unittest.TestCase):
             self.assertTrue(delta.delta_used)
             self.assertIn("file.txt", delta.text)
 
+    def test_index_reuses_unchanged_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ("a.txt", "b.txt", "c.txt"):
+                (root / name).write_text(f"content {name}", encoding="utf-8")
+                os.utime(root / name, ns=(1_000_000_000, 1_000_000_000))
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": ".cache.json",
+                "delta_snapshot": False,
+            }
+            snapshotter = WorkspaceSnapshotter()
+            first = snapshotter.build_snapshot(root, cfg, max_files=10, max_bytes_per_file=100, task="")
+            self.assertEqual(first.files_read, 3)
+
+            second = snapshotter.build_snapshot(root, cfg, max_files=10, max_bytes_per_file=100, task="")
+            self.assertEqual(second.files_read, 0)
+            self.assertEqual(second.files_reused, 3)
+            self.assertTrue(second.cache_hit)
+            self.assertEqual(first.text, second.text)
+
+            (root / "b.txt").write_text("changed b", encoding="utf-8")
+            third = snapshotter.build_snapshot(root, cfg, max_files=10, max_bytes_per_file=100, task="")
+            self.assertEqual(third.files_read, 1)
+            self.assertFalse(third.cache_hit)
+            self.assertIn("changed b", third.text)
+            self.assertIn("content a.txt", third.text)
+
+    def test_parallel_read_preserves_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for idx in range(20):
+                (root / f"f{idx:02d}.txt").write_text(f"content {idx}", encoding="utf-8")
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": "",
+                "delta_snapshot": False,
+            }
+            snapshotter = WorkspaceSnapshotter()
+            sequential = snapshotter.build_snapshot(root, {**cfg, "read_workers": 1}, max_files=50, task="")
+            parallel = snapshotter.build_snapshot(root, {**cfg, "read_workers": 4}, max_files=50, task="")
+            self.assertEqual(sequential.text, parallel.text)
+            self.assertEqual(parallel.files_read, 20)
+            self.assertGreaterEqual(parallel.read_sec, 0.0)
+
+    def test_binary_files_are_skipped(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "code.py").write_text("print(1)", encoding="utf-8")
+            (root / "data.weird").write_bytes(b"\x00\x01\x02binary")
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": "",
+                "delta_snapshot": False,
+            }
+            result = WorkspaceSnapshotter().build_snapshot(root, cfg, max_files=10, task="")
+            self.assertEqual(result.binary_skipped, 1)
+            self.assertIn("--- code.py ---", result.text)
+            self.assertNotIn("--- data.weird ---", result.text)
+
+    def test_selective_context_ranks_by_content(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "alpha.py").write_text("def unrelated(): pass", encoding="utf-8")
+            (root / "beta.py").write_text("class PaymentGateway: refund()", encoding="utf-8")
+            (root / "gamma.py").write_text("payment helpers", encoding="utf-8")
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": "",
+                "delta_snapshot": False,
+                "selective_context": {"enabled": True, "min_files": 1, "max_files": 10},
+            }
+            result = WorkspaceSnapshotter().build_snapshot(
+                root, cfg, max_files=10, task="Add a refund method to the PaymentGateway"
+            )
+            self.assertEqual([p.name for p in result.files], ["beta.py", "gamma.py"])
+            self.assertGreater(result.relevance["beta.py"], result.relevance["gamma.py"])
+
+    def test_selective_context_indexes_every_file_and_drops_unselected_text(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for idx in range(40):
+                (root / f"mod_{idx:02d}.py").write_text(f"def helper_{idx}(): pass", encoding="utf-8")
+            # Last in the listing, no path match: only content relevance can find it.
+            (root / "zz_misc.py").write_text("def refund(): pass\n" + "x = 1\n" * 5_000, encoding="utf-8")
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": "cache.json",
+                "delta_snapshot": False,
+                "selective_context": {"enabled": True, "min_files": 0, "max_files": 2},
+            }
+            snapshotter = WorkspaceSnapshotter()
+            result = snapshotter.build_snapshot(
+                root, cfg, max_files=2, max_bytes_per_file=SELECTIVE_INDEX_BYTES * 2, task="Fix the refund"
+            )
+            self.assertEqual([p.name for p in result.files], ["zz_misc.py"])
+            # 41 bounded term reads, then the selected file in full.
+            self.assertEqual(result.files_read, 42)
+            self.assertGreater(result.total_bytes, SELECTIVE_INDEX_BYTES)
+            cached = json.loads((root / "cache.json").read_text(encoding="utf-8"))["files"]
+            self.assertTrue(cached["zz_misc.py"]["text"].startswith("def refund()"))
+            self.assertTrue(all(entry["text"] is None for rel, entry in cached.items() if rel != "zz_misc.py"))
+            self.assertIn("helper", cached["mod_00.py"]["terms"])
+
+            # Empty task: no hits, so the listing order is kept; dropped texts are read again.
+            result = snapshotter.build_snapshot(root, cfg, max_files=2, task="")
+            self.assertEqual([p.name for p in result.files], ["mod_00.py", "mod_01.py"])
+            self.assertIn("def helper_0(): pass", result.text)
+
+    def test_views_filter_by_allowed_paths_and_budget(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "api").mkdir()
+            (root / "api" / "routes.py").write_text("def list_orders(): return []\n" * 40, encoding="utf-8")
+            (root / "ui").mkdir()
+            (root / "ui" / "view.js").write_text("render()\n" * 40, encoding="utf-8")
+            cfg = {
+                "skip_dirs": [],
+                "skip_exts": [],
+                "workspace_header": "WORKSPACE: {root}",
+                "files_header": "FILES:",
+                "content_header": "FILE CONTENT (truncated):",
+                "file_line": "  - {rel} ({size} bytes)",
+                "file_section_header": "--- {rel} ---",
+                "cache_file": "",
+                "delta_snapshot": False,
+            }
+            result = WorkspaceSnapshotter().build_snapshot(root, cfg, max_files=10, task="")
+            views = result.views
+            self.assertIsNotNone(views)
+            shard_view = views.view("orders endpoint", ["api/**"])
+            self.assertIn("--- api/routes.py ---", shard_view)
+            self.assertNotIn("ui/view.js", shard_view)
+            self.assertIs(views.view("orders endpoint", ["api/**"]), shard_view)
+
+            budgeted = views.view(budget_chars=600)
+            self.assertLessEqual(len(budgeted), 600)
+            self.assertIn("ui/view.js", budgeted)
+
 
 if __name__ == "__main__":
     unittest.main()
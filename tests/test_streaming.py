@@ -1,10 +1,13 @@
 import asyncio
+import os
 import sys
+import time
 import unittest
 from pathlib import Path
 
 from multi_agent.executor import CLIClient
-from multi_agent.streaming import StreamingClient
+from multi_agent.streaming import StreamCancelled, StreamingClient
+from multi_agent.token_counting import IncrementalTokenCounter
 
 
 class StreamingClientTest(unittest.IsolatedAsyncioTestCase):
@@ -26,6 +29,60 @@ class StreamingClientTest(unittest.IsolatedAsyncioTestCase):
         self.assertIn("hello", stdout_text)
         self.assertIn("oops", stderr_text)
 
+    async def test_huge_single_line_is_not_an_overrun(self) -> None:
+        cmd = [sys.executable, "-c", "import sys; sys.stdout.write('x' * 300000 + '\\nend')"]
+        client = StreamingClient(read_chunk_bytes=4096)
+        chunks = [chunk async for chunk in client.stream_exec(cmd, input_text=None, timeout=10)]
+        self.assertEqual(client.returncode, 0)
+        self.assertEqual("".join(c.text for c in chunks), "x" * 300000 + "\nend")
+
+    async def test_lines_are_batched_and_progress_coalesced(self) -> None:
+        cmd = [sys.executable, "-c", "import sys\nfor i in range(20000):\n    print('line', i, 'ü')"]
+        calls = []
+        client = StreamingClient(
+            progress_callback=lambda text, tokens, elapsed: calls.append((text, tokens)),
+            token_counter=lambda text: text.count("\n"),
+            refresh_rate_hz=1,
+            read_chunk_bytes=1024,
+        )
+        chunks = [chunk async for chunk in client.stream_exec(cmd, input_text=None, timeout=10)]
+        expected = "".join(f"line {i} ü\n" for i in range(20000))
+        self.assertEqual("".join(c.text for c in chunks), expected)
+        self.assertTrue(all(c.text.endswith("\n") for c in chunks))
+        self.assertLess(len(chunks), 20000)
+        self.assertLess(len(calls), len(chunks))
+        self.assertEqual("".join(text for text, _ in calls), expected)
+        self.assertEqual(calls[-1][1], 20000)
+
+    async def test_held_back_progress_is_flushed_while_output_stalls(self) -> None:
+        cmd = [
+            sys.executable,
+            "-c",
+            "import sys, time\n"
+            "for text, pause in (('a', 0.1), ('b', 1.5), ('c', 0)):\n"
+            "    print(text, flush=True)\n"
+            "    time.sleep(pause)",
+        ]
+        calls = []
+        client = StreamingClient(
+            progress_callback=lambda text, tokens, elapsed: calls.append((text, elapsed)),
+            refresh_rate_hz=2,
+        )
+        [chunk async for chunk in client.stream_exec(cmd, input_text=None, timeout=10)]
+        self.assertEqual([text for text, _ in calls if text], ["a\n", "b\n", "c\n"])
+        self.assertLess(calls[1][1], calls[2][1] - 0.5)
+
+    async def test_final_progress_reports_flushed_count(self) -> None:
+        cmd = [sys.executable, "-c", "print('a b c')\nprint('d e')"]
+        calls = []
+        client = StreamingClient(
+            progress_callback=lambda text, tokens, elapsed: calls.append(tokens),
+            token_counter=IncrementalTokenCounter(str.split, token_chars=1, flush_chars=10_000),
+        )
+        [chunk async for chunk in client.stream_exec(cmd, input_text=None, timeout=10)]
+        self.assertEqual(client.token_count, 5)
+        self.assertEqual(calls[-1], 5)
+
 
 class StreamingExecutorTest(unittest.IsolatedAsyncioTestCase):
     async def test_run_streaming_timeout(self) -> None:
@@ -53,6 +110,37 @@ class StreamingExecutorTest(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(rc, 130)
         self.assertIn("CANCELLED", err)
 
+    async def test_cancel_while_output_is_flowing(self) -> None:
+        cmd = [sys.executable, "-c", "import time\nwhile True:\n    print('tick', flush=True)\n    time.sleep(0.001)"]
+        cancel_event = asyncio.Event()
+        client = StreamingClient(cancel_event=cancel_event)
+        received = 0
+        with self.assertRaises(StreamCancelled):
+            async for _ in client.stream_exec(cmd, input_text=None, timeout=10):
+                received += 1
+                if received == 5:
+                    cancel_event.set()
+        self.assertGreaterEqual(received, 5)
+
+
+@unittest.skipUnless(os.environ.get("MULTI_AGENT_BENCH"), "Benchmark: MULTI_AGENT_BENCH=1 setzen")
+class StreamingBenchmark(unittest.IsolatedAsyncioTestCase):
+    async def _lines_per_sec(self, cancel_event: asyncio.Event | None) -> float:
+        lines = 200_000
+        cmd = [sys.executable, "-c", f"import sys\nfor i in range({lines}):\n    print('line', i)"]
+        client = StreamingClient(cancel_event=cancel_event, read_chunk_bytes=512)
+        started = time.perf_counter()
+        received = 0
+        async for chunk in client.stream_exec(cmd, input_text=None, timeout=120):
+            received += chunk.text.count("\n")
+        self.assertEqual(received, lines)
+        return lines / (time.perf_counter() - started)
+
+    async def test_lines_per_sec_with_and_without_cancel_event(self) -> None:
+        plain = await self._lines_per_sec(None)
+        watched = await self._lines_per_sec(asyncio.Event())
+        print(f"\nlines/sec ohne cancel_event: {plain:,.0f}, mit cancel_event: {watched:,.0f}")
+
 
 if __name__ == "__main__":
     unittest.main()
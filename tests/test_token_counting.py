@@ -0,0 +1,180 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from multi_agent.models import RoleConfig
+from multi_agent.pipeline import Pipeline
+from multi_agent.prompt_template import PromptTemplate
+from multi_agent.task_split import needs_split
+from multi_agent.token_counting import (
+    TOKENIZER_BACKENDS,
+    FragmentTokenCounter,
+    IncrementalTokenCounter,
+    build_token_counter,
+    get_encoder,
+    get_token_counter,
+    register_tokenizer_backend,
+    resolve_tokenizer,
+    _tiktoken_backend,
+    _tokenizer_file_backend,
+)
+
+
+def _register_words_backend(test: unittest.TestCase, resolved: list | None = None) -> None:
+    def backend(model, tokenizer_file):
+        if resolved is not None:
+            resolved.append((model, tokenizer_file))
+        return str.split
+
+    register_tokenizer_backend("words", backend)
+
+    def cleanup() -> None:
+        TOKENIZER_BACKENDS.pop("words", None)
+        get_encoder.cache_clear()
+
+    test.addCleanup(cleanup)
+
+
+def _role(template: str, max_prompt_tokens: int) -> RoleConfig:
+    return RoleConfig(
+        id="impl",
+        name="Implementer",
+        role="implementer",
+        prompt_template=template,
+        apply_diff=False,
+        instances=1,
+        depends_on=[],
+        timeout_sec=None,
+        retries=0,
+        max_prompt_chars=None,
+        max_prompt_tokens=max_prompt_tokens,
+        max_output_chars=None,
+        expected_sections=[],
+        run_if_review_critical=False,
+        model="m",
+    )
+
+
+class TokenCounterRegistryTest(unittest.TestCase):
+    def test_counters_are_shared_per_mode_model_and_token_chars(self) -> None:
+        first = get_token_counter("heuristic", "gpt-4o", 4)
+        self.assertIs(first, get_token_counter("heuristic", "gpt-4o", 4))
+        self.assertIsNot(first, get_token_counter("heuristic", "gpt-4o", 3))
+        self.assertEqual(first("x" * 9), 3)
+        self.assertIsNone(get_encoder("heuristic", "gpt-4o"))
+
+    def test_encoder_is_resolved_once(self) -> None:
+        resolved = []
+        _register_words_backend(self, resolved)
+        for _ in range(3):
+            counter = build_token_counter("words", token_chars=4, model="m")
+            self.assertIsInstance(counter, IncrementalTokenCounter)
+        self.assertEqual(get_token_counter("words", "m")("a b c"), 3)
+        self.assertEqual(resolved, [("m", None)])
+
+    def test_unknown_or_unavailable_backend_falls_back_to_heuristic(self) -> None:
+        self.assertIsNone(get_encoder("no-such-backend"))
+        self.assertIsNone(get_encoder("tokenizer_file", None, "/does/not/exist.json"))
+        self.assertEqual(get_token_counter("tokenizer_file", None, 4, "/does/not/exist.json")("x" * 8), 2)
+
+    def test_failing_tokenizer_load_falls_back_to_heuristic(self) -> None:
+        def fail(*args, **kwargs):
+            raise OSError("no network")
+
+        fake_tiktoken = SimpleNamespace(encoding_for_model=fail, get_encoding=fail)
+        fake_tokenizers = SimpleNamespace(Tokenizer=SimpleNamespace(from_file=fail))
+        with tempfile.TemporaryDirectory() as tmp:
+            tokenizer_file = Path(tmp) / "tokenizer.json"
+            tokenizer_file.write_text("{}", encoding="utf-8")
+            with mock.patch.dict(sys.modules, {"tiktoken": fake_tiktoken, "tokenizers": fake_tokenizers}):
+                self.assertIsNone(_tiktoken_backend("gpt-4", None))
+                self.assertIsNone(_tokenizer_file_backend(None, str(tokenizer_file)))
+
+    def test_resolve_tokenizer_prefers_model_file(self) -> None:
+        limits = {
+            "token_counting": "tokenizer_file",
+            "tokenizer_file": "global.json",
+            "model_tokenizer_files": {"m": "m.json"},
+        }
+        self.assertEqual(resolve_tokenizer(limits, "m"), ("tokenizer_file", "m.json"))
+        self.assertEqual(resolve_tokenizer(limits, "other"), ("tokenizer_file", "global.json"))
+        self.assertEqual(resolve_tokenizer({}, None), ("auto", None))
+
+
+class FragmentTokenCounterTest(unittest.TestCase):
+    def test_fragments_are_tokenized_once(self) -> None:
+        calls = []
+
+        def count(text: str) -> int:
+            calls.append(text)
+            return len(text.split())
+
+        counter = FragmentTokenCounter(count)
+        template = PromptTemplate("Task: {task}\nSnapshot: {snapshot}\n")
+        context = {"task": "do the thing", "snapshot": "a b c d"}
+        self.assertEqual(counter.count_prompt("RULES\n\n", template, context), 1 + 1 + 1 + 3 + 4)
+        calls.clear()
+        counter.count_prompt("RULES\n\n", template, {"task": "do the thing", "snapshot": "a b"})
+        self.assertEqual(calls, ["a b"])
+
+    def test_memo_does_not_keep_fragment_text(self) -> None:
+        counter = FragmentTokenCounter(lambda text: len(text.split()))
+        snapshot = "word " * 10_000
+        self.assertEqual(counter.count(snapshot), 10_000)
+        self.assertEqual(counter.count(snapshot), 10_000)
+        self.assertNotIn(snapshot, counter._memo)
+        self.assertTrue(all(len(key) <= 16 for key in counter._memo))
+
+
+class ExactPromptBudgetTest(unittest.TestCase):
+    def test_build_prompt_fits_exact_token_budget(self) -> None:
+        _register_words_backend(self)
+        cfg = SimpleNamespace(
+            system_rules="RULES",
+            role_defaults={},
+            prompt_limits={"token_chars": 4, "token_counting": "words"},
+            messages={"error_prompt_missing_key": "missing {key} in {role_id}"},
+            summary_max_chars=100,
+        )
+        # Short words: the chars/4 heuristic would allow far more than 300 tokens.
+        context = {"task": "mach es", "snapshot": "ab " * 2_000}
+        prompt, _, truncated, tokens, max_tokens = Pipeline(None, None)._build_prompt(
+            _role("T: {task}\nS: {snapshot}{repair_note}", 300), context, cfg
+        )
+        self.assertTrue(truncated)
+        self.assertEqual(max_tokens, 300)
+        self.assertLessEqual(tokens, 300)
+        self.assertLessEqual(len(prompt.split()), 300)
+        self.assertGreater(len(prompt.split()), 200)
+        self.assertIn("T: mach es", prompt)
+
+    def test_needs_split_uses_token_counter(self) -> None:
+        text = "a " * 500
+        cfg = {"heuristic_max_chars": 0, "heuristic_max_tokens": 400}
+        self.assertFalse(needs_split(text, cfg))
+        self.assertTrue(needs_split(text, cfg, token_counter=lambda value: len(value.split())))
+
+
+class IncrementalTokenCounterTest(unittest.TestCase):
+    def test_batches_encode_calls_and_ends_exact(self) -> None:
+        calls = []
+
+        def encode(text: str) -> list:
+            calls.append(text)
+            return text.split()
+
+        counter = IncrementalTokenCounter(encode, token_chars=4, flush_chars=100)
+        lines = [f"word{idx} and more words\n" for idx in range(50)]
+        total = sum(counter(line) for line in lines)
+        total += counter("partial line without newline")
+        total += counter.flush()
+        self.assertEqual(total, len("".join(lines).split()) + 4)
+        self.assertLess(len(calls), 20)
+        self.assertTrue(all(text.endswith("\n") for text in calls[:-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
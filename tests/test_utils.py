@@ -1,6 +1,8 @@
+import tempfile
 import unittest
+from pathlib import Path
 
-from multi_agent.utils import format_prompt
+from multi_agent.utils import MMAP_THRESHOLD_BYTES, format_prompt, read_text_safe, read_text_sniffed
 
 
 class UtilsTest(unittest.TestCase):
@@ -9,6 +11,28 @@ class UtilsTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             format_prompt("Hello {name}", {"task": "x"}, "role", messages)
 
+    def test_read_text_sniffed_detects_binary(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "blob.dat"
+            path.write_bytes(b"ELF\x00\x01\x02" + b"x" * 100)
+            self.assertEqual(read_text_sniffed(path, 1000), ("", True))
+            self.assertEqual(read_text_safe(path, 1000), "")
+
+    def test_read_text_sniffed_bounded_large_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "big.txt"
+            path.write_bytes(b"a" * (MMAP_THRESHOLD_BYTES + 10))
+            text, binary = read_text_sniffed(path, 100)
+            self.assertFalse(binary)
+            self.assertEqual(text, "a" * 100)
+
+    def test_read_text_sniffed_drops_split_character(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "umlaut.txt"
+            path.write_bytes("ab\u00e4".encode("utf-8"))
+            self.assertEqual(read_text_sniffed(path, 3), ("ab", False))
+            self.assertEqual(read_text_sniffed(path, 10), ("ab\u00e4", False))
+
 
 if __name__ == "__main__":
     unittest.main()
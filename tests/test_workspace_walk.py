@@ -0,0 +1,121 @@
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from multi_agent.workspace_walk import GitIgnore, walk_workspace
+
+
+def _rglob_listing(root: Path, skip_dirs: set[str]) -> dict[Path, tuple[int, int]]:
+    # Previous rglob-based walker, kept as benchmark baseline.
+    listing: dict[Path, tuple[int, int]] = {}
+    for p in root.rglob("*"):
+        if set(p.relative_to(root).parts) & skip_dirs:
+            continue
+        st = p.stat()
+        if stat.S_ISREG(st.st_mode):
+            listing[p] = (st.st_mtime_ns, st.st_size)
+    return listing
+
+
+class WorkspaceWalkTest(unittest.TestCase):
+    def test_prunes_skip_dirs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "src").mkdir()
+            (root / "src" / "main.py").write_text("x", encoding="utf-8")
+            (root / "node_modules" / "pkg").mkdir(parents=True)
+            (root / "node_modules" / "pkg" / "index.js").write_text("y", encoding="utf-8")
+            listing = walk_workspace(root, {"node_modules"}, respect_gitignore=False)
+            self.assertEqual([p.relative_to(root).as_posix() for p in listing], ["src/main.py"])
+            self.assertEqual(listing[root / "src" / "main.py"][1], 1)
+
+    def test_gitignore_rules(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / ".gitignore").write_text("*.log\nbuild/\n!keep.log\n", encoding="utf-8")
+            (root / "a.log").write_text("a", encoding="utf-8")
+            (root / "keep.log").write_text("k", encoding="utf-8")
+            (root / "build").mkdir()
+            (root / "build" / "out.txt").write_text("o", encoding="utf-8")
+            (root / "pkg").mkdir()
+            (root / "pkg" / ".gitignore").write_text("/local.txt\n", encoding="utf-8")
+            (root / "pkg" / "local.txt").write_text("l", encoding="utf-8")
+            (root / "pkg" / "mod.py").write_text("m", encoding="utf-8")
+            rels = sorted(p.relative_to(root).as_posix() for p in walk_workspace(root, set()))
+            self.assertEqual(rels, [".gitignore", "keep.log", "pkg/.gitignore", "pkg/mod.py"])
+
+    def test_gitignore_matcher(self) -> None:
+        ignore = GitIgnore()
+        ignore.add_lines(["docs/**/*.tmp", "cache/", "# comment"])
+        self.assertTrue(ignore.is_ignored("docs/a/b/x.tmp", is_dir=False))
+        self.assertTrue(ignore.is_ignored("docs/x.tmp", is_dir=False))
+        self.assertFalse(ignore.is_ignored("src/x.tmp", is_dir=False))
+        self.assertTrue(ignore.is_ignored("lib/cache", is_dir=True))
+        self.assertFalse(ignore.is_ignored("lib/cache", is_dir=False))
+
+    def test_excludes_paths(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "a.txt").write_text("a", encoding="utf-8")
+            (root / "cache.json").write_text("{}", encoding="utf-8")
+            listing = walk_workspace(root, set(), exclude={root / "cache.json"})
+            self.assertEqual(list(listing), [root / "a.txt"])
+
+    @unittest.skipUnless(shutil.which("git"), "git nicht verfuegbar")
+    def test_git_ls_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            subprocess.run(["git", "init", "-q", str(root)], check=True)
+            (root / ".gitignore").write_text("ignored.txt\n", encoding="utf-8")
+            (root / "ignored.txt").write_text("i", encoding="utf-8")
+            (root / "vendor").mkdir()
+            (root / "vendor" / "lib.py").write_text("v", encoding="utf-8")
+            (root / "main.py").write_text("m", encoding="utf-8")
+            listing = walk_workspace(root, {"vendor"}, use_git=True)
+            rels = sorted(p.relative_to(root).as_posix() for p in listing)
+            self.assertEqual(rels, [".gitignore", "main.py"])
+
+    def test_git_fallback_outside_repo(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "a.txt").write_text("a", encoding="utf-8")
+            listing = walk_workspace(root, set(), use_git=True)
+            self.assertIn(root / "a.txt", listing)
+
+
+@unittest.skipUnless(os.environ.get("MULTI_AGENT_BENCH"), "Benchmark: MULTI_AGENT_BENCH=1 setzen")
+class WorkspaceWalkBenchmark(unittest.TestCase):
+    def test_pruned_walk_vs_rglob(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for pkg in range(50):
+                src = root / "src" / f"pkg{pkg}"
+                src.mkdir(parents=True)
+                for idx in range(20):
+                    (src / f"mod{idx}.py").write_text("x", encoding="utf-8")
+                vendored = root / "node_modules" / f"dep{pkg}" / "lib"
+                vendored.mkdir(parents=True)
+                for idx in range(200):
+                    (vendored / f"f{idx}.js").write_text("y", encoding="utf-8")
+            skip = {"node_modules"}
+
+            started = time.perf_counter()
+            baseline = _rglob_listing(root, skip)
+            rglob_sec = time.perf_counter() - started
+
+            started = time.perf_counter()
+            pruned = walk_workspace(root, skip, respect_gitignore=False)
+            scandir_sec = time.perf_counter() - started
+
+            self.assertEqual(set(baseline), set(pruned))
+            print(f"\nrglob: {rglob_sec:.3f}s, scandir (pruned): {scandir_sec:.3f}s, files: {len(pruned)}")
+            self.assertLess(scandir_sec, rglob_sec)
+
+
+if __name__ == "__main__":
+    unittest.main()